@@ -0,0 +1,93 @@
+#!/usr/bin/python
+"""
+Micro-benchmark for local variable lookups of DwarfData.
+
+Generates DWARF-heavy debug data (many subprograms with many local variables)
+and compares decoding the variables on every query, as DwarfData did before,
+with the tables precomputed at load time.
+
+Usage: bench_local_vars.py [--subprograms N] [--variables N] [--rounds N]
+"""
+import argparse
+import re
+import time
+from fparser import dwarf
+
+
+def make_data(nSubs, nVars):
+    """Returns dwarf data in the format of the 'Data' object of a dwarf json file."""
+    dies = [{'Offset': 1, 'ParentOffset': 0, 'Tag': 'DW_TAG_compile_unit',
+             'Attributes': {'DW_AT_name': 'bench.c', 'DW_AT_comp_dir': '/tmp'}},
+            {'Offset': 2, 'ParentOffset': 1, 'Tag': 'DW_TAG_base_type',
+             'Attributes': {'DW_AT_name': 'int', 'DW_AT_byte_size': 'S_2_U_2'}}]
+    offset = 3
+    for s in xrange(nSubs):
+        subOffset = offset
+        dies.append({'Offset': subOffset, 'ParentOffset': 1, 'Tag': 'DW_TAG_subprogram',
+                     'Attributes': {'DW_AT_name': 'f{}'.format(s), 'DW_AT_low_pc': str(s * 64),
+                                    'DW_AT_high_pc': str(s * 64 + 63)}})
+        offset += 1
+        for v in xrange(nVars):
+            dies.append({'Offset': offset, 'ParentOffset': subOffset, 'Tag': 'DW_TAG_variable',
+                         'Attributes': {'DW_AT_name': 'v{}'.format(v), 'DW_AT_type': '2',
+                                        'DW_AT_location': '[DW_OP_breg28:{},];'.format(2 * v)}})
+            offset += 1
+    return {'DIEs': dies, 'LineInfoEntries': {}, 'LineInfoMap': {}}
+
+
+def decode_per_call(dwData, subDieOffset):
+    """Decodes local variables of a subprogram on each call (previous implementation)."""
+    tree = dwData._dieTree
+    localVars = {}
+    for s in tree.get_children(subDieOffset):
+        if tree.get_tag(s) != 'DW_TAG_variable':
+            continue
+        attrs = tree.get_attrs(s)
+        locs = re.compile(r'\[([^\]]+)\];').findall(attrs['DW_AT_location'])
+        if len(locs) != 1:
+            continue
+        ops = locs[0].split(',')[:-1]
+        if len(ops) != 1:
+            continue
+        o = ops[0].split(':')
+        if len(o) != 2 or o[0] != 'DW_OP_breg28':
+            continue
+        typeAttrs = tree.get_attrs(int(attrs['DW_AT_type']))
+        m = re.search(r'S_([+\-0-9]+)_U_([+\-0-9]+)', typeAttrs['DW_AT_byte_size'])
+        localVars[o[1]] = {'name': attrs['DW_AT_name'], 'byteSize': int(m.group(2))}
+    return localVars
+
+
+def bench(name, fn, subDies, rounds):
+    t = time.time()
+    for _ in xrange(rounds):
+        for s in subDies:
+            fn(s)
+    dt = time.time() - t
+    print "{:<24} {:8.3f} s ({:.2f} us/query)".format(name, dt, 1e6 * dt / (rounds * len(subDies)))
+    return dt
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--subprograms', type=int, default=2000)
+    parser.add_argument('--variables', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    data = make_data(args.subprograms, args.variables)
+    nDies = len(data['DIEs'])
+    t = time.time()
+    dwData = dwarf.DwarfData(None, data=data)
+    print "Loaded {} DIEs in {:.3f} s".format(nDies, time.time() - t)
+
+    subDies = dwData._subDies
+    assert all(dwData.get_local_variables(s) == decode_per_call(dwData, s) for s in subDies)
+
+    tOld = bench("decode per query", lambda s: decode_per_call(dwData, s), subDies, args.rounds)
+    tNew = bench("precomputed table", dwData.get_local_variable_table, subDies, args.rounds)
+    print "Speedup: {:.1f}x".format(tOld / tNew)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+import logging
+from array import array
+import networkx as nx
+
+
+log = logging.getLogger(__name__)
+
+
+class CsrGraph(object):
+    """
+    Immutable compressed sparse row (CSR) snapshot of a directed graph.
+
+    Nodes are numbered densely (index 0..n-1, in node order of the source
+    graph). Successors of index i are succ[succOffs[i]:succOffs[i+1]], in
+    adjacency order of the source graph; predecessors likewise, ordered as
+    the successors of nx.DiGraph.reverse(), so that analyses of the reversed
+    graph visit nodes in the same order as on networkx.
+
+    Besides the index level interface, it offers the read-only subset of the
+    nx.DiGraph interface that the flow analyses need (successors,
+    predecessors, nodes, edges, has_node, ...), keyed by node id.
+
+    Args:
+        digraph: nx.DiGraph. Only its structure and graph attributes are
+                 copied, node and edge attributes are left out.
+    """
+
+    def __init__(self, digraph):
+        assert isinstance(digraph, nx.DiGraph)
+        # --
+        self.graph = dict(digraph.graph)
+        self._ids = list(digraph.nodes)
+        self._index = {n: i for i, n in enumerate(self._ids)}
+
+        index = self._index
+        self._succOffs = array('l', [0])
+        self._succ = array('l')
+        predLists = [[] for _ in self._ids]
+        for u in self._ids:
+            i = index[u]
+            for v in digraph.successors(u):
+                j = index[v]
+                self._succ.append(j)
+                predLists[j].append(i)
+            self._succOffs.append(len(self._succ))
+
+        self._predOffs = array('l', [0])
+        self._pred = array('l')
+        for preds in predLists:
+            # nx.DiGraph.reverse() adds the reversed edges to a dict per node
+            adj = {}
+            for i in preds:
+                adj[self._ids[i]] = i
+            self._pred.extend(adj.itervalues())
+            self._predOffs.append(len(self._pred))
+
+    @property
+    def name(self):
+        return self.graph.get('name', '')
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, n):
+        return n in self._index
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def reverse(self):
+        """Returns the graph with all edges reversed, sharing the arrays of this one."""
+        rev = CsrGraph.__new__(CsrGraph)
+        rev.graph = self.graph
+        rev._ids = self._ids
+        rev._index = self._index
+        rev._succOffs, rev._succ = self._predOffs, self._pred
+        rev._predOffs, rev._pred = self._succOffs, self._succ
+        return rev
+
+    # Index level interface
+
+    def index(self, n):
+        """Returns the dense index of node n."""
+        return self._index[n]
+
+    def node_id(self, i):
+        """Returns the node at dense index i."""
+        return self._ids[i]
+
+    def succ_indices(self, i):
+        return self._succ[self._succOffs[i]:self._succOffs[i + 1]]
+
+    def pred_indices(self, i):
+        return self._pred[self._predOffs[i]:self._predOffs[i + 1]]
+
+    def dfs_postorder(self, start):
+        """
+        Returns the indices reachable from index start in DFS postorder, visiting
+        successors in adjacency order (as nx.dfs_postorder_nodes).
+        """
+        succ, succOffs = self._succ, self._succOffs
+        visited = array('b', [0]) * len(self._ids)
+        visited[start] = 1
+        order = []
+        stack = [(start, succOffs[start])]
+        while stack:
+            u, k = stack[-1]
+            if k < succOffs[u + 1]:
+                stack[-1] = (u, k + 1)
+                v = succ[k]
+                if not visited[v]:
+                    visited[v] = 1
+                    stack.append((v, succOffs[v]))
+            else:
+                stack.pop()
+                order.append(u)
+        return order
+
+    # nx.DiGraph interface, by node id
+
+    @property
+    def nodes(self):
+        return self._ids
+
+    @property
+    def edges(self):
+        ids, succ, succOffs = self._ids, self._succ, self._succOffs
+        return [(ids[i], ids[succ[k]]) for i in xrange(len(ids))
+                for k in xrange(succOffs[i], succOffs[i + 1])]
+
+    def has_node(self, n):
+        return n in self._index
+
+    def successors(self, n):
+        ids = self._ids
+        return (ids[j] for j in self.succ_indices(self._index[n]))
+
+    def predecessors(self, n):
+        ids = self._ids
+        return (ids[j] for j in self.pred_indices(self._index[n]))
+
+    def out_degree(self, n):
+        i = self._index[n]
+        return self._succOffs[i + 1] - self._succOffs[i]
+
+    def in_degree(self, n):
+        i = self._index[n]
+        return self._predOffs[i + 1] - self._predOffs[i]
+
+
+def immediate_dominators(graph, start):
+    """
+    Returns the immediate dominators of all nodes reachable from start, as
+    dict {node: idom}, where start dominates itself. Works on dense indices,
+    with the algorithm of Cooper, Harvey and Kennedy ("A simple, fast
+    dominance algorithm", 2001), like nx.immediate_dominators, and yields
+    the same dict (including its order).
+
+    Args:
+        graph: CsrGraph.
+        start: Id of the start node.
+    """
+    assert isinstance(graph, CsrGraph)
+    assert start in graph, "start is not in graph"
+    # --
+    s = graph.index(start)
+    order = graph.dfs_postorder(s)
+    dfn = array('l', [-1]) * len(graph)
+    for k, u in enumerate(order):
+        dfn[u] = k
+    order.pop()
+    order.reverse()
+
+    idom = array('l', [-1]) * len(graph)
+    idom[s] = s
+
+    def intersect(u, v):
+        while u != v:
+            while dfn[u] < dfn[v]:
+                u = idom[u]
+            while dfn[u] > dfn[v]:
+                v = idom[v]
+        return u
+
+    changed = True
+    while changed:
+        changed = False
+        for u in order:
+            newIdom = -1
+            for v in graph.pred_indices(u):
+                if idom[v] == -1:
+                    continue
+                newIdom = v if newIdom == -1 else intersect(v, newIdom)
+            if idom[u] != newIdom:
+                idom[u] = newIdom
+                changed = True
+
+    ids = graph.nodes
+    result = {start: start}
+    for u in order:
+        result[ids[u]] = ids[idom[u]]
+    return result
@@ -1,5 +1,6 @@
 import logging
 import networkx as nx
+from csr import CsrGraph, immediate_dominators
 
 
 log = logging.getLogger(__name__)
@@ -13,25 +14,29 @@ class AbstractDominatorTree(object):
 
     Dominance (a dom b) can be tested by calling test_dominance(a, b).
 
+    Note:
+        The graph is either a CsrGraph or a nx.DiGraph, of which a CsrGraph is
+        made. Immediate dominators are computed on the CsrGraph.
+
     FIXME: Fails for trivial graphs. Need to correct _build_dom_tree and _mark_dfs_preorder_number.
     """
-    def __init__(self, digraph, entryId, exitId):
-        assert isinstance(digraph, nx.DiGraph)
-        assert entryId in digraph.nodes
+    def __init__(self, graph, entryId, exitId):
+        assert isinstance(graph, CsrGraph)
+        assert entryId in graph
         assert entryId is not None  # exit might be None, we don't care
         # --
         self._domTree = nx.DiGraph()
         self._rootId = entryId
         self._exitId = exitId
-        self._build_dom_tree(digraph, self._rootId)
+        self._build_dom_tree(graph, self._rootId)
         self._mark_dfs_preorder_number()
 
-    def _build_dom_tree(self, digraph, entry):
-        if len(digraph.nodes) == 1:
+    def _build_dom_tree(self, graph, entry):
+        if len(graph) == 1:
             self._domTree.add_node(entry)
             return
-        # Code below assumes digraph has more then one node
-        idom_list = nx.immediate_dominators(digraph, entry).items()
+        # Code below assumes graph has more then one node
+        idom_list = immediate_dominators(graph, entry).items()
         for tup in idom_list:
             if tup[0] == entry:
                 continue
@@ -272,9 +277,10 @@ class PreDominatorTree(AbstractDominatorTree):
     given flow graph of type fparser.control_flow.ControlFlow.
     Dominance (a dom b) can be tested by calling test_dominance(a, b).
     """
-    def __init__(self, digraph, entryId, exitId=None):
-        assert isinstance(digraph, nx.DiGraph)
-        super(PreDominatorTree, self).__init__(digraph, entryId=entryId, exitId=exitId)
+    def __init__(self, graph, entryId, exitId=None):
+        if isinstance(graph, nx.DiGraph):
+            graph = CsrGraph(graph)
+        super(PreDominatorTree, self).__init__(graph, entryId=entryId, exitId=exitId)
 
 
 class PostDominatorTree(AbstractDominatorTree):
@@ -283,6 +289,7 @@ class PostDominatorTree(AbstractDominatorTree):
     given flow graph of type fparser.control_flow.ControlFlow.
     Dominance (a dom b) can be tested by calling test_dominance(a, b).
     """
-    def __init__(self, digraph, exitId, entryId=None):
-        assert isinstance(digraph, nx.DiGraph)
-        super(PostDominatorTree, self).__init__(digraph.reverse(), entryId=exitId, exitId=entryId)
+    def __init__(self, graph, exitId, entryId=None):
+        if isinstance(graph, nx.DiGraph):
+            graph = CsrGraph(graph)
+        super(PostDominatorTree, self).__init__(graph.reverse(), entryId=exitId, exitId=entryId)
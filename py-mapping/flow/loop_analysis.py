@@ -1,6 +1,7 @@
 import logging
 import copy
 import networkx as nx
+from csr import CsrGraph
 
 
 log = logging.getLogger(__name__)
@@ -9,10 +10,11 @@ log = logging.getLogger(__name__)
 class DfsTree:
     def __init__(self, graph, checkTree=True, entryID=None):
         """
-        Note: If an entryID is not specified, it is assumed that the graph
-              contains an attribute labeled as 'entryID'.
+        Note: - If an entryID is not specified, it is assumed that the graph
+                contains an attribute labeled as 'entryID'.
+              - graph is a nx.DiGraph or a CsrGraph.
         """
-        assert isinstance(graph, nx.DiGraph)
+        assert isinstance(graph, (nx.DiGraph, CsrGraph))
         
         # Mark the entry id
         if entryID is None:
@@ -105,10 +107,11 @@ def analyze_loops(graph, entryID=None):
     Note: - Node type is in ['nonheader', 'reducible', 'irreducible', 'self'].
           - Nodes in DFS tree are keyed by their original index, not DFS preorder
             number.
+          - graph is a nx.DiGraph or a CsrGraph.
 
     TODO: 1. Fix (split) irreducible loop headers (as in Havlak's paper).
     """
-    assert isinstance(graph, nx.DiGraph)
+    assert isinstance(graph, (nx.DiGraph, CsrGraph))
     if entryID is not None:
         assert graph.has_node(entryID)
     else:
@@ -1,14 +1,31 @@
 import logging
 import json
 import os.path
+import hashlib
+import struct
+import tempfile
+import cPickle as pickle
 from collections import namedtuple
 import control_flow as cf
 import disassembly as da
 import dwarf as dw
+import elf_frontend
+import columnar
+import otawaflows
+from jsonio import open_input, iter_json_objs, read_json_span, read_spans, select_chunks, \
+    load_flow_index, load_debug_index, load_csv_index, index_csv_objs, SpanReader
 
 
 log = logging.getLogger(__name__)
 
+# Raw per-function records, kept until a flow is actually built
+BinaryFlowRecord = namedtuple('BinaryFlowRecord', 'name file jsonObj dieOffset')
+SourceFlowRecord = namedtuple('SourceFlowRecord', 'name file csvObj')
+Pair = namedtuple('Pair', 'binIdx srcIdx')
+
+# Bump whenever the pickled layout of Executable (or anything it holds) changes
+CACHE_VERSION = 13
+
 
 class Executable(object):
     """
@@ -17,40 +34,169 @@ class Executable(object):
 
     Params:
       - binaryJsonPath : Json file containing binary flows and instructions.
-      - debugJsonPath  : Json file containing dwarf information.
+      - debugJsonPath  : Json file containing dwarf information. May be None
+                         if elfPath or otawaXmlPath is given.
       - sourcecsvPath  : CSV file containing source flows.
       - jsonSplit      : Split string for separate JSON objects.
+      - lazy           : Only keep raw per-function records and build each flow
+                         pair right before it is yielded by get_flow_pairs().
+                         Timing info of a binary flow is checked then, too.
+                         Otherwise all flow pairs are built while loading.
+                         Either way, flows without a partner are never built
+                         (nor are the DIEs of their CUs decoded).
+      - functions      : Optional collection of function names. If given, only
+                         these flows (and the debug info of their CUs) are
+                         decoded, using byte-offset indices of the json files.
+      - elfPath        : Optional ELF file. If given, symbols and dwarf data are
+                         read from it (see elf_frontend) instead of the json
+                         files, debugJsonPath is ignored.
+      - lineCacheSize  : Number of line info queries cached per binary flow,
+                         see control_flow.BinaryControlFlow.
+      - columnarPath   : Optional columnar file (see columnar). If given,
+                         instructions and line tables are mapped from it
+                         instead of being decoded from the json files. It is
+                         (re)written from the json files if missing or
+                         outdated.
+      - otawaXmlPath   : Optional cfg.xml of OTAWA's dumpcfg. If given and
+                         there is neither debugJsonPath nor elfPath, the
+                         file/line annotations of its instructions are used
+                         as debug data (dwarf.LineDebugData: line info only,
+                         no variables, no inlining).
+      - incremental    : Keep the json objects of the binary flows, so that
+                         flow pairs can be fingerprinted (see
+                         get_flow_pair_fingerprint()).
+
+    Json and csv inputs may be compressed, see jsonio.open_input().
 
     FIXME: - Move instruction map from binary json file.
            - Remove symbols_i.
     """
 
     def __init__(self, binaryJsonPath, debugJsonPath, sourceCsvPath, optimeCsvPath, simplify=False,
-                 jsonSplit='\n\n'):
+                 jsonSplit='\n\n', lazy=False, functions=None, elfPath=None,
+                 columnarPath=None, lineCacheSize=cf.LINE_CACHE_SIZE, otawaXmlPath=None,
+                 incremental=False):
 
-        self.bFlowGraphs = []
-        self.sFlowGraphs = []
+        self.bFlowGraphs = {}  # by index of record, paired flows only
+        self.sFlowGraphs = {}
+        self.bFlowRecords = []
+        self.sFlowRecords = []
         self.flowPairs = []
         self.instructions = None
         self.symbols = None
         self.symbols_i = None
         self.dwarfData = None
+        self.csvCols = None
+        self.optimeCsvPath = optimeCsvPath
+        self.opTiming = da.OpTimingTable(optimeCsvPath)
+        self.simplify = simplify
+        self.lazy = lazy
+        self.functions = set(functions) if functions is not None else None
+        self.elfPath = elfPath
+        self.columnarPath = columnarPath
+        self.lineCacheSize = lineCacheSize
+        self.otawaXmlPath = otawaXmlPath
+        self.incremental = incremental
+        self._pairDigests = {}
+
+        lineTable = None
+        if columnarPath is not None:
+            assert elfPath is None, "Columnar tables cannot be used with an ELF file."
+            assert debugJsonPath is not None, "Columnar tables require a dwarf json file."
+            cfile = self._open_columnar(columnarPath, binaryJsonPath, debugJsonPath, jsonSplit)
+            self.instructions = columnar.MappedInstructions(cfile, timing=self.opTiming)
+            lineTable = columnar.MappedLineTable(cfile)
 
-        self.dwarfData = dw.DwarfData(debugJsonPath) if debugJsonPath is not None else None
-        self._load_binary_flows(binaryJsonPath, jsonSplit, optimeCsvPath, simplify)
-        self._load_source_flows(sourceCsvPath, simplify)
+        # With an ELF file, dwarf data is read once instructions are known
+        if elfPath is None and debugJsonPath is not None:
+            self.dwarfData = dw.DwarfData(debugJsonPath, functions=self.functions,
+                                          lineTable=lineTable)
+        elif elfPath is None and otawaXmlPath is not None:
+            log.info("Reading line info from {}".format(otawaXmlPath))
+            self.dwarfData = otawaflows.CFGReader(filename=otawaXmlPath).get_debug_data()
+        assert self.dwarfData is not None or elfPath is not None, "No debug data given."
+        if self.functions is None and columnarPath is None:
+            self._load_binary_flows(iter_json_objs(binaryJsonPath, jsonSplit))
+        else:
+            self._load_binary_flows(self._iter_indexed_json_objs(binaryJsonPath, jsonSplit))
+        self._load_source_flows(sourceCsvPath)
         self._map_flow_pairs()
+        if not self.lazy:
+            self._build_flow_pairs()
 
     def get_flow_pairs(self):
         """ Returns a flow pair (bin, src) """
-        for pair in self.flowPairs:
-            yield self.bFlowGraphs[pair.binIdx], self.sFlowGraphs[pair.srcIdx]
+        for i in xrange(len(self.flowPairs)):
+            yield self.get_flow_pair(i)
+
+    def get_flow_pair(self, i):
+        """
+        Returns the i-th flow pair (bin, src). In lazy mode both flows are
+        built from their records on each call and are not retained.
+        """
+        pair = self.flowPairs[i]
+        if self.lazy:
+            bRecord = self.bFlowRecords[pair.binIdx]
+            self._check_op_times([bRecord])
+            return (self._build_binary_flow(bRecord),
+                    self._build_source_flow(self.sFlowRecords[pair.srcIdx]))
+        return self.bFlowGraphs[pair.binIdx], self.sFlowGraphs[pair.srcIdx]
+
+    def get_flow_pair_name(self, i):
+        """Returns the name of the i-th flow pair, without building it."""
+        return self.bFlowRecords[self.flowPairs[i].binIdx].name
+
+    def get_flow_pair_fingerprint(self, i, options=None):
+        """
+        Returns a fingerprint (hex digest) of the i-th flow pair, without
+        building it. Requires incremental (or lazy) mode.
+
+        It covers the binary flow structure and address ranges, instructions
+        and their timing, the dwarf line entries and variables of the
+        function, the source csv object, simplification and the given
+        options (json serializable, e.g. mapper options).
+
+        Note:
+            The digest of the flow pair is computed on first request only.
+        """
+        digest = self._pairDigests.get(i, None)
+        if digest is None:
+            pair = self.flowPairs[i]
+            bRecord = self.bFlowRecords[pair.binIdx]
+            assert bRecord.jsonObj is not None, "Fingerprints require incremental mode."
+            h = hashlib.sha1()
+            h.update(self._digest_binary_flow(bRecord))
+            h.update(hashlib.sha1(self.sFlowRecords[pair.srcIdx].csvObj).hexdigest())
+            digest = self._pairDigests[i] = h.hexdigest()
+
+        h = hashlib.sha1()
+        h.update(digest)
+        h.update(json.dumps([self.simplify, options], sort_keys=True))
+        return h.hexdigest()
+
+    def _digest_binary_flow(self, record):
+        """Returns a digest of everything a binary flow is built from."""
+        ranges = get_json_flow_ranges(record.jsonObj)
+        insns = []
+        for r in ranges:
+            for addr, i in self.instructions.iter_instructions(r):
+                callees = [self.symbols.get(t, None) for t in i['Target']]
+                insns.append((addr, i['Mnem'], i['Operands'], callees,
+                              self.opTiming.maxTimes[i['MnemId']]))
+
+        h = hashlib.sha1()
+        h.update(json.dumps([record.jsonObj, record.file, insns,
+                             self.dwarfData.get_dw_lines(ranges),
+                             self.dwarfData.get_local_variables(record.dieOffset),
+                             self.dwarfData.get_inlined_subroutines(record.dieOffset)],
+                            sort_keys=True))
+        return h.hexdigest()
 
     def _map_flow_pairs(self):
         File = namedtuple('File', 'bSubs sSubs')
         files = {}
 
-        for i, bf in enumerate(self.bFlowGraphs):
+        for i, bf in enumerate(self.bFlowRecords):
             fbase = os.path.basename(bf.file)
             f = files.get(fbase, None)
             if f is None:
@@ -58,14 +204,13 @@ class Executable(object):
             else:
                 f.bSubs[bf.name] = i
     
-        for i, sf in enumerate(self.sFlowGraphs):
+        for i, sf in enumerate(self.sFlowRecords):
             f = files.get(sf.file)
             if f is None:
                 files[sf.file] = File({}, {sf.name: i})
             else:
                 f.sSubs[sf.name] = i
 
-        Pair = namedtuple('Pair', 'binIdx srcIdx')
         for _, f in files.iteritems():
             cmn = set(f.bSubs.keys()).intersection(f.sSubs.keys())
             self.flowPairs += [Pair(f.bSubs[name], f.sSubs[name]) for name in cmn]
@@ -73,10 +218,73 @@ class Executable(object):
             if len(cmn) != len(f.bSubs):
                 log.error("Could not find all flow pairs in file: {}".format(_))
 
-    def _load_binary_flows(self, bjPath, jSplit, optimeCsv, simplify):
-        # Load binary graphs and instructions
+    def _build_flow_pairs(self):
+        """Builds the flows of all pairs, after checking timing info of all binary flows."""
+        self._check_op_times([self.bFlowRecords[pair.binIdx] for pair in self.flowPairs])
+        for pair in self.flowPairs:
+            self.bFlowGraphs[pair.binIdx] = self._build_binary_flow(self.bFlowRecords[pair.binIdx])
+        for pair in self.flowPairs:
+            self.sFlowGraphs[pair.srcIdx] = self._build_source_flow(self.sFlowRecords[pair.srcIdx])
+        if not self.incremental:
+            # Not needed anymore
+            self.bFlowRecords = [r._replace(jsonObj=None) for r in self.bFlowRecords]
+
+    def _build_binary_flow(self, record):
+        log.info("Parsing binary flow graph: {}".format(record.name))
+        return cf.BinaryControlFlow(record.jsonObj, self.dwarfData, self.instructions,
+                                    self.symbols, record.dieOffset, self.opTiming,
+                                    simplify=self.simplify, lineCacheSize=self.lineCacheSize)
+
+    def _build_source_flow(self, record):
+        return cf.SourceControlFlow(record.csvObj, simplify=self.simplify, hCols=self.csvCols)
+
+    def _iter_indexed_json_objs(self, bjPath, jSplit):
+        """
+        Yields symbol map, the requested flow objects only (all flows if no
+        functions were requested) and the instruction map. Of the latter,
+        only the index chunks covering the requested flows (and their
+        neighbours) are decoded. It is skipped if instructions are already
+        loaded.
+
+        Note:
+            Symbol map and flows are yielded in file order, and all objects
+            are read through one handle, so that a compressed file is not
+            decompressed once per object.
+        """
+        index = load_flow_index(bjPath, jSplit)
+        if self.functions is None:
+            names = index['Flows'].keys()
+        else:
+            names = sorted(self.functions)
+        spans = [index['SymbolMap']] if index['SymbolMap'] is not None else []
+        for name in names:
+            span = index['Flows'].get(name, None)
+            if span is None:
+                log.error("Could not find binary flow graph: {}".format(name))
+                continue
+            spans.append(span)
+
+        with SpanReader(bjPath) as reader:
+            ranges = []
+            for _, text in reader.iter_spans(spans):
+                jObj = json.loads(text)
+                if jObj.get('Type', None) == 'Flow':
+                    ranges += get_json_flow_ranges(jObj)
+                yield jObj
+
+            if self.instructions is not None or index['InsnMap'] is None:
+                return
+            if self.functions is None:
+                yield reader.read_json(index['InsnMap'])
+            else:
+                spans = select_chunks(index['InsnChunks'], ranges, neighbours=1)
+                yield {'Type': 'InsnMap', 'Section': index['InsnSection'],
+                       'Instructions': reader.read_json_chunks(spans)}
+
+    def _load_binary_flows(self, jObjs):
+        # Load binary graphs and instructions, one json object at a time
         jFlowObjs = []
-        for jObj in load_json_objs(bjPath, jSplit):
+        for jObj in jObjs:
             # Load flows
             if 'Type' in jObj.keys() and jObj['Type'] == 'Flow':
                 jFlowObjs.append(jObj)
@@ -86,7 +294,7 @@ class Executable(object):
                     "Invalid instruction map in json file."
                 assert jObj['Section'] == '.text'
 
-                self.instructions = da.Instructions(jObj['Instructions'])
+                self.instructions = da.Instructions(jObj['Instructions'], timing=self.opTiming)
             elif 'Type' in jObj.keys() and jObj['Type'] == 'SymbolMap':
                 assert {'Symbols', 'Section'} < set(jObj.keys()), \
                     "Invalid symbol map in json file."
@@ -99,12 +307,15 @@ class Executable(object):
                 continue
 
         assert self.instructions is not None
+        if self.elfPath is not None:
+            self._load_elf(self.elfPath)
         assert self.symbols is not None
         assert len(jFlowObjs) > 0, "Could not find binary flows."
 
         # Only add flows that have debug info
         dwSubs = self.dwarfData.get_subprograms()  # FIXME: add ALL, incl lib functions
 
+        records = []
         for jObj in jFlowObjs:
             assert 'Name' in jObj.keys(), "Invalid flow object."
             assert jObj['Name'] != '', "Invalid flow name."
@@ -119,42 +330,217 @@ class Executable(object):
             if entryAddr not in dwSubs.keys():
                 log.warning("Skipping binary flow graph (no debug info): {}".format(jObj['Name']))
                 continue
-            
-            log.info("Parsing binary flow graph: {}".format(jObj['Name']))
+
             dieOffset = dwSubs[entryAddr]['dieOffset']
-            self.bFlowGraphs.append(cf.BinaryControlFlow(jObj, self.dwarfData,
-                                                         self.instructions, self.symbols,
-                                                         dieOffset, optimeCsv, simplify=simplify))
+            comp_dir, name = self.dwarfData.get_subprogram_file(dieOffset)
+            records.append(BinaryFlowRecord(jObj['Name'], os.path.join(comp_dir, name), jObj,
+                                            dieOffset))
+
+        self.bFlowRecords += records
+
+    def share_tables(self, path):
+        """
+        Writes instructions and line tables to a columnar file at path and
+        maps them from there, dropping the decoded tables. Processes forked
+        afterwards then share the mapped (read-only, file-backed) pages instead
+        of each copying the tables as soon as they touch them.
+
+        Note:
+            Nothing is done if the tables are already mapped (columnarPath).
+        """
+        if isinstance(self.instructions, columnar.MappedInstructions):
+            return
 
-    def _load_source_flows(self, csvPath, simplify):
+        log.info("Moving instruction and line tables to {}".format(path))
+        addrs = self.instructions.get_addresses()
+        insns = [{'Addr': a, 'Mnem': i['Mnem'], 'Op': i['Operands'], 'Target': i['Target']}
+                 for a, i in self.instructions.iter_instructions((addrs[0], addrs[-1]))]
+        columnar.write(path, insns, self.dwarfData.get_line_table())
+        del insns
+
+        cfile = columnar.ColumnarFile(path)
+        self.instructions = columnar.MappedInstructions(cfile, timing=self.opTiming)
+        self.dwarfData.set_line_table(columnar.MappedLineTable(cfile))
+        for bFlow in self.bFlowGraphs.itervalues():
+            bFlow._insns = self.instructions
+
+    def _open_columnar(self, path, bjPath, djPath, jSplit):
+        """
+        Returns the mapped columnar file at path, writing it from the json
+        files first if it is missing or was generated from other inputs.
+        """
+        stamp = json.dumps([[os.path.abspath(p), os.path.getsize(p), os.path.getmtime(p)]
+                            for p in (bjPath, djPath)])
+        try:
+            cfile = columnar.ColumnarFile(path)
+            if cfile.get_stamp() == stamp:
+                log.info("Mapped columnar tables {}".format(path))
+                return cfile
+            cfile.close()
+            log.info("Columnar tables {} are outdated, rebuilding.".format(path))
+        except (IOError, ValueError, AssertionError, struct.error):
+            pass
+
+        index = load_flow_index(bjPath, jSplit)
+        assert index['InsnMap'] is not None, "No instruction map in json file."
+        jObj = read_json_span(bjPath, index['InsnMap'])
+        assert {'Instructions', 'Section'} < set(jObj.keys()), \
+            "Invalid instruction map in json file."
+        assert jObj['Section'] == '.text'
+
+        dIndex = load_debug_index(djPath)
+        with SpanReader(djPath) as reader:
+            entries, lineMap = reader.read([dIndex['LineInfoEntries'], dIndex['LineInfoMap']])
+        lineTable = dw.LineTable(json.loads(entries), json.loads(lineMap))
+        columnar.write(path, jObj['Instructions'], lineTable, stamp)
+        return columnar.ColumnarFile(path)
+
+    def _load_elf(self, elfPath):
+        """Reads symbols and dwarf data from the ELF file, replacing those of the json files."""
+        log.info("Reading symbols and debug info from {}".format(elfPath))
+        elf = elf_frontend.ElfFile(elfPath)
+        sym = da.Symbols(elf.get_symbols())
+        self.symbols = sym.symbols
+        self.symbols_i = sym.symbols_i
+        dwData = elf.get_debug_data(self.instructions.get_addresses())
+        self.dwarfData = dw.DwarfData(None, data=dwData)
+
+    def _check_op_times(self, records):
+        """
+        Checks that timing info is available for all instructions of the given
+        binary flows, before any of them is built. Missing mnemonics of all
+        flows are reported at once (in lazy mode, those of one flow).
+        """
+        mnemIds = set()
+        for record in records:
+            for r in get_json_flow_ranges(record.jsonObj):
+                mnemIds.update(self.instructions.iter_mnemonic_ids(r))
+
+        missing = self.opTiming.get_missing(mnemIds)
+        if missing:
+            fullpath = da.write_missing_times(missing)
+            assert False, "Time missing for mnemonics {}. See file {}".format(", ".join(missing),
+                                                                             fullpath)
+
+    def _load_source_flows(self, csvPath, objSplit='\n\n'):
+        """
+        Loads the source flows that can be paired with a binary flow. The csv
+        file is indexed by (File, Subprogram) first, and only the objects of
+        paired subprograms are parsed. All objects must share the same header,
+        which is validated once. If functions were requested, the index is
+        kept as sidecar file (see jsonio.load_csv_index) and only the paired
+        objects are read from the file.
+        """
         log.info("Parsing source flow graphs")
-        self.sFlowGraphs = [cf.SourceControlFlow(co, simplify=simplify)
-                            for co in load_csv_objs(csvPath, '\n\n') if co != '']
+
+        def get_key(hLine, lastLine):
+            if self.csvCols is None:
+                self.csvCols = cf.SourceControlFlow.parse_csv_header(hLine)
+            name, fil = cf.SourceControlFlow.peek_csv_line(lastLine, self.csvCols)
+            return fil, name
+
+        if self.functions is None:
+            with open_input(csvPath) as fpCsv:
+                text = fpCsv.read()
+            hLine, objs = index_csv_objs(text, objSplit, get_key)
+        else:
+            index = load_csv_index(csvPath, objSplit, get_key)
+            hLine, objs = index['Header'], index['Objects']
+        if hLine is not None:
+            self.csvCols = cf.SourceControlFlow.parse_csv_header(hLine)
+
+        # Keys as used by _map_flow_pairs
+        wanted = {(os.path.basename(r.file), r.name) for r in self.bFlowRecords}
+        spans = {}
+        for fil, name, begin, end in objs:
+            if (fil, name) in wanted:
+                spans[(fil, name)] = (begin, end)  # last one wins, as in _map_flow_pairs
+
+        keys = sorted(spans, key=spans.get)
+        if self.functions is None:
+            csvObjs = [text[spans[k][0]:spans[k][1]] for k in keys]
+        else:
+            csvObjs = read_spans(csvPath, [spans[k] for k in keys])
+        for (fil, name), co in zip(keys, csvObjs):
+            self.sFlowRecords.append(SourceFlowRecord(name, fil, co))
 
 
 #################
 # Helper methods
 #################
 
-def load_json_objs(jsonPath, jsonSplit):
-    jsonObjs = []
-    with open(jsonPath, 'r') as fpJson:
-        jsonLines = fpJson.read().split(jsonSplit)
-        for jsonLine in jsonLines:
-            if jsonLine == '':
-                continue
+def load_executable(cacheDir, binaryJsonPath, debugJsonPath, sourceCsvPath, optimeCsvPath,
+                    **kwargs):
+    """
+    Returns an Executable, reusing a pickled one from cacheDir if available.
 
-            try:
-                jsonObjs.append(json.loads(jsonLine))
-            except ValueError:
-                log.error("Encountered an invalid json object.")
-                continue
-        
-    return jsonObjs
+    Cache entries are keyed by a hash of the contents of all input files, the
+    keyword arguments of Executable (e.g. simplify) and CACHE_VERSION, hence
+    they are invalidated automatically when any input changes. Stale entries
+    are not removed.
+
+    Args:
+        cacheDir: Cache directory, or None to disable caching.
+        Others:   See Executable.
+    """
+    args = (binaryJsonPath, debugJsonPath, sourceCsvPath, optimeCsvPath)
+    if cacheDir is None:
+        return Executable(*args, **kwargs)
+
+    h = hashlib.sha1()
+    h.update(repr((CACHE_VERSION, sorted(kwargs.iteritems()))))
+    for path in args + (kwargs.get('elfPath', None), kwargs.get('otawaXmlPath', None)):
+        h.update('\0')
+        if path is None:
+            continue
+        with open(path, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), ''):
+                h.update(chunk)
+    cachePath = os.path.join(cacheDir, 'exe_{}.pickle'.format(h.hexdigest()))
+
+    if os.path.isfile(cachePath):
+        try:
+            with open(cachePath, 'rb') as fp:
+                exe = pickle.load(fp)
+            log.info("Loaded executable from cache: {}".format(cachePath))
+            return exe
+        except Exception:
+            log.warning("Invalid cache entry {}, rebuilding.".format(cachePath), exc_info=True)
+
+    exe = Executable(*args, **kwargs)
+
+    # Write to a temporary file first, so that concurrent runs never see partial entries
+    tmpPath = None
+    try:
+        fd, tmpPath = tempfile.mkstemp(dir=cacheDir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fp:
+            pickle.dump(exe, fp, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmpPath, cachePath)
+        log.info("Saved executable to cache: {}".format(cachePath))
+    except (IOError, OSError, pickle.PicklingError):
+        log.warning("Could not write cache entry {}.".format(cachePath), exc_info=True)
+        if tmpPath is not None and os.path.exists(tmpPath):
+            os.remove(tmpPath)
+    return exe
+
+
+def get_json_flow_ranges(jsonObj):
+    """Returns the address ranges (tuples) of all regular blocks of a json flow object."""
+    ranges = []
+    for block in jsonObj['BasicBlocks']:
+        if block['BlockType'].lower() in ('entry', 'exit') or not block['AddrRanges']:
+            continue
+        ar = block['AddrRanges']
+        ranges += [(r[0], r[1]) for r in (ar if isinstance(ar[0], list) else [ar])]
+    return ranges
+
+
+def load_json_objs(jsonPath, jsonSplit):
+    return list(iter_json_objs(jsonPath, jsonSplit))
 
 
 def load_csv_objs(csvPath, objSplit):
-    with open(csvPath, 'r') as fpCsv:
+    with open_input(csvPath) as fpCsv:
         csvObjs = fpCsv.read().split(objSplit)
     # --
     return csvObjs
@@ -0,0 +1,263 @@
+#
+# Compact, memory-mappable columnar container for instruction and line tables.
+#
+# Layout (little endian):
+#   Header    : magic 'VCOL', version (u32), column count (u32)
+#   Directory : per column: name (16 bytes, NUL padded), typecode (1 byte),
+#               3 bytes padding, offset (u64), count (u64)
+#   Columns   : fixed-width arrays, each aligned to 8 bytes
+#
+# Columns (typecodes as in module struct):
+#   insn.addr   I  instruction address, ascending
+#   insn.mnem   I  mnemonic (string id)
+#   insn.ops    I  operands joined by OP_SEP (string id)
+#   insn.target I  branch/call targets joined by ',' (string id)
+#   line.low    I  low pc of line entry, ascending
+#   line.high   I  high pc of line entry
+#   line.line   I  line number
+#   line.col    I  column
+#   line.disc   I  discriminator
+#   line.cu     I  CU offset
+#   map.addr    I  instruction address with line info, ascending
+#   map.line    I  index of its line entry in line.*
+#   str.offs    I  string table, begin offsets of strings (+ end offset)
+#   str.data    c  string table, concatenated strings
+#   stamp       c  opaque stamp of the inputs the file was generated from
+#
+import logging
+import mmap
+import os
+import struct
+import disassembly as da
+import dwarf as dw
+
+
+log = logging.getLogger(__name__)
+
+MAGIC = 'VCOL'
+VERSION = 1
+HEADER = struct.Struct('<4sII')
+DIR_ENTRY = struct.Struct('<16sc3xQQ')
+OP_SEP = '\x1f'
+
+
+class MappedColumn(object):
+    """Read-only sequence view of a fixed-width column in a mapped buffer."""
+
+    def __init__(self, buf, offset, count, typecode):
+        self._buf = buf
+        self._offset = offset
+        self._count = count
+        self._typecode = typecode
+        self._item = struct.Struct('<' + typecode)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self._count)
+            if step != 1:
+                return [self[j] for j in xrange(start, stop, step)]
+            n = max(0, stop - start)
+            return list(struct.unpack_from('<{}{}'.format(n, self._typecode), self._buf,
+                                           self._offset + start * self._item.size))
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("Column index out of range.")
+        return self._item.unpack_from(self._buf, self._offset + i * self._item.size)[0]
+
+    def __iter__(self):
+        for i in xrange(self._count):
+            yield self[i]
+
+    def tobytes(self):
+        """Returns the raw bytes of a 'c' column."""
+        return self._buf[self._offset:self._offset + self._count * self._item.size]
+
+
+class ColumnarFile(object):
+    """
+    Maps a columnar container file.
+
+    Args:
+        path: Container file, see write().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as fp:
+            self._buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count = HEADER.unpack_from(self._buf, 0)
+        assert magic == MAGIC, "Not a columnar file: {}".format(path)
+        assert version == VERSION, "Unsupported columnar file version: {}".format(version)
+
+        self.columns = {}
+        for i in xrange(count):
+            name, typecode, offset, n = DIR_ENTRY.unpack_from(self._buf,
+                                                              HEADER.size + i * DIR_ENTRY.size)
+            self.columns[name.rstrip('\0')] = MappedColumn(self._buf, offset, n, typecode)
+
+        self._strOffs = self.columns['str.offs']
+        self._strData = self.columns['str.data']
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def get_string(self, strId):
+        offs = self._strOffs[strId:strId + 2]
+        return self._buf[self._strData._offset + offs[0]:self._strData._offset + offs[1]]
+
+    def get_stamp(self):
+        return self.columns['stamp'].tobytes()
+
+    def close(self):
+        self._buf.close()
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+
+class MappedInstructions(da.Instructions):
+    """
+    Instructions backed by a columnar file, see disassembly.Instructions.
+    Only the per-index accessors differ, strings are decoded on access.
+
+    Args:
+        cfile:  ColumnarFile.
+        timing: Optional OpTimingTable, mnemonic ids ('MnemId') then refer to it.
+    """
+
+    def __init__(self, cfile, timing=None):
+        self.timing = timing
+        self._cfile = cfile
+        self._addrs = cfile['insn.addr']
+        self._mnems = cfile['insn.mnem']
+        self._ops = cfile['insn.ops']
+        self._targets = cfile['insn.target']
+        self._strCache = {}
+        self._mnemIds = {}
+        self._stackOffs = None
+        self._stackWrites = None
+
+    def __getstate__(self):
+        return {'cfile': self._cfile, 'timing': self.timing}
+
+    def __setstate__(self, state):
+        self.__init__(state['cfile'], state['timing'])
+
+    def _get_string(self, strId):
+        s = self._strCache.get(strId, None)
+        if s is None:
+            s = self._strCache[strId] = self._cfile.get_string(strId)
+        return s
+
+    def _get_mnem(self, i):
+        return self._get_string(self._mnems[i])
+
+    def _get_mnem_id(self, i):
+        strId = self._mnems[i]
+        mnemId = self._mnemIds.get(strId, None)
+        if mnemId is None:
+            mnemId = self._mnemIds[strId] = self.timing.intern(self._get_string(strId))
+        return mnemId
+
+    def _get_operands(self, i):
+        return [o for o in self._get_string(self._ops[i]).split(OP_SEP) if o != '']
+
+    def _get_targets(self, i):
+        return [int(t) for t in self._get_string(self._targets[i]).split(',') if t != '']
+
+
+class MappedLineTable(dw.LineTable):
+    """DWARF line table backed by a columnar file, see dwarf.LineTable."""
+
+    def __init__(self, cfile):
+        self._cfile = cfile
+        self._low = cfile['line.low']
+        self._high = cfile['line.high']
+        self._line = cfile['line.line']
+        self._col = cfile['line.col']
+        self._disc = cfile['line.disc']
+        self._cu = cfile['line.cu']
+        self._mapAddr = cfile['map.addr']
+        self._mapLine = cfile['map.line']
+
+    def __getstate__(self):
+        return {'cfile': self._cfile}
+
+    def __setstate__(self, state):
+        self.__init__(state['cfile'])
+
+
+def write(path, insns, lineTable, stamp=''):
+    """
+    Writes a columnar file.
+
+    Args:
+        insns:     Instructions as in the InsnMap of a flow file, list of
+                   dicts {Addr, Mnem, Op, Target}.
+        lineTable: dwarf.LineTable.
+        stamp:     Opaque string identifying the inputs.
+    """
+    strings = []
+    strIds = {}
+
+    def intern(s):
+        strId = strIds.get(s, None)
+        if strId is None:
+            strId = strIds[s] = len(strings)
+            strings.append(s)
+        return strId
+
+    insns = sorted(insns, key=lambda i: i['Addr'])
+    lines = lineTable.get_arrays()
+
+    columns = [
+        ('insn.addr', 'I', [i['Addr'] for i in insns]),
+        ('insn.mnem', 'I', [intern(i['Mnem'].encode('utf-8')) for i in insns]),
+        ('insn.ops', 'I', [intern(OP_SEP.join(i['Op']).encode('utf-8')) for i in insns]),
+        ('insn.target', 'I', [intern(','.join(str(t) for t in i['Target'])) for i in insns]),
+        ('line.low', 'I', lines['low']),
+        ('line.high', 'I', lines['high']),
+        ('line.line', 'I', lines['line']),
+        ('line.col', 'I', lines['col']),
+        ('line.disc', 'I', lines['disc']),
+        ('line.cu', 'I', lines['cu']),
+        ('map.addr', 'I', lines['mapAddr']),
+        ('map.line', 'I', lines['mapLine']),
+    ]
+    offs = [0]
+    for s in strings:
+        offs.append(offs[-1] + len(s))
+    columns += [
+        ('str.offs', 'I', offs),
+        ('str.data', 'c', ''.join(strings)),
+        ('stamp', 'c', stamp)
+    ]
+
+    tmpPath = path + '.tmp'
+    with open(tmpPath, 'wb') as fp:
+        offset = HEADER.size + len(columns) * DIR_ENTRY.size
+        directory = []
+        for name, typecode, values in columns:
+            offset = (offset + 7) & ~7
+            directory.append((name, typecode, offset, len(values)))
+            offset += len(values) * struct.calcsize('<' + typecode)
+
+        fp.write(HEADER.pack(MAGIC, VERSION, len(columns)))
+        for entry in directory:
+            fp.write(DIR_ENTRY.pack(*entry))
+        for (name, typecode, values), (_, _, offset, count) in zip(columns, directory):
+            fp.write('\0' * (offset - fp.tell()))
+            if typecode == 'c':
+                fp.write(values)
+            else:
+                fp.write(struct.pack('<{}{}'.format(count, typecode), *values))
+    os.rename(tmpPath, path)
+    log.info("Wrote columnar tables to {}".format(path))
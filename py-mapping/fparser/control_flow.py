@@ -1,20 +1,98 @@
 import logging
 import os.path
 import copy
-import datetime
 import networkx as nx
+from collections import OrderedDict
 from abc import ABCMeta, abstractmethod
 from sortedcontainers import SortedDict, SortedSet
-from flow import loop_analysis, dominator
+from flow import loop_analysis, dominator, csr
+import disassembly as da
 
 
 log = logging.getLogger(__name__)
 
+# Default number of cached line info queries per binary flow
+LINE_CACHE_SIZE = 512
+
+# Mnemonics of instructions that can defy static analysis
+BLACKLIST = ('spm',)  # self-modifying code
+
+
+class LruCache(object):
+    """
+    Bounded least-recently-used cache, counting hits and misses.
+
+    Args:
+        maxSize: Maximum number of entries, 0 disables caching.
+    """
+
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, compute):
+        """Returns the value cached for key, calling compute() on a miss."""
+        try:
+            value = self._entries.pop(key)
+            self.hits += 1
+        except KeyError:
+            self.misses += 1
+            value = compute()
+        self._put(key, value)
+        return value
+
+    def get_many(self, keys, compute):
+        """
+        Returns dict key -> value for the given keys, calling compute() once
+        with the list of keys that missed, which returns a dict of their values.
+        """
+        values = {}
+        missing = []
+        for key in set(keys):
+            try:
+                values[key] = self._entries.pop(key)
+                self.hits += 1
+                self._entries[key] = values[key]
+            except KeyError:
+                missing.append(key)
+        if missing:
+            self.misses += len(missing)
+            computed = compute(missing)
+            for key in missing:
+                values[key] = computed[key]
+                self._put(key, values[key])
+        return values
+
+    def _put(self, key, value):
+        if self.maxSize <= 0:
+            return
+        if key not in self._entries and len(self._entries) >= self.maxSize:
+            self._entries.popitem(last=False)
+        self._entries[key] = value  # most recently used last
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def hit_rate(self):
+        """Returns the fraction of hits among all lookups, None if there were none."""
+        n = self.hits + self.misses
+        return float(self.hits) / n if n > 0 else None
+
 
 class ControlFlow(object):
     """Generic control flow"""
     __metaclass__ = ABCMeta
 
+    attrMergers = {}  # block attribute -> function merging its values (list, in flow order)
+
     def __init__(self, name, filename, simplify=False):
         self.name = name
         self.file = filename
@@ -29,6 +107,7 @@ class ControlFlow(object):
         self._loopInfo = None
         self._maxId = None
         self._ctrldep = None
+        self._csr = None
 
     def __len__(self):
         return len(self.digraph)
@@ -45,6 +124,7 @@ class ControlFlow(object):
     def _graph_changed(self):
         self._tree_postdom = self._tree_predom = None
         self._ctrldep = None
+        self._csr = None
 
     def _post_init(self):
         if self.simplify:
@@ -135,6 +215,106 @@ class ControlFlow(object):
         self._graph_changed()
         self.digraph.add_edge(e[0], e[1])
 
+    def _merge_attrs(self, attrsList):
+        """
+        Merges the attributes of adjacent blocks (in flow order) into a new
+        dict, using self.attrMergers for the attributes of all but the first
+        block.
+
+        Return:
+            Merged attributes, or None if an attribute has no merger (or is
+            missing in the first block).
+        """
+        dst = dict(attrsList[0])
+        for a in dst:
+            if a in self.attrMergers and any(a in attrs for attrs in attrsList[1:]):
+                dst[a] = self.attrMergers[a]([attrs[a] for attrs in attrsList if a in attrs])
+        for attrs in attrsList[1:]:
+            if not self._attrs_mergeable(dst, attrs):
+                return None
+        return dst
+
+    def _attrs_mergeable(self, dst, src):
+        """Returns True if the attributes src can be merged into those of dst."""
+        return all(a in self.attrMergers and a in dst for a in src)
+
+    def _contract_chains(self, is_chainable):
+        """
+        Contracts all maximal chains u1 -> u2 -> ... -> uk of blocks for which
+        is_chainable(u) holds, where each block but the last has a single
+        successor and each but the first a single predecessor. Chains are
+        found in one pass over the graph and each is merged into its first
+        block at once (see _merge_chain), hence this is linear in the size of
+        the graph.
+
+        Note:
+            - The entry block is never merged with the exit block.
+            - A chain is split at blocks whose attributes cannot be merged.
+
+        Return:
+            Number of merged (removed) blocks.
+        """
+        g = self.digraph
+        succ = {}
+        for u in g.nodes:
+            # noinspection PyCallingNonCallable
+            if g.out_degree(u) != 1 or not is_chainable(u):
+                continue
+            v = next(g.successors(u))
+            # noinspection PyCallingNonCallable
+            if v == u or g.in_degree(v) != 1 or not is_chainable(v):
+                continue
+            if u == self._entryId and v == self._exitId:
+                continue  # must stay distinct, since all other algos downstream do fail
+            succ[u] = v
+
+        # Chains without a head are cycles, which are unreachable anyway
+        tails = set(succ.itervalues())
+        heads = [u for u in g.nodes if u in succ and u not in tails]
+        merges = 0
+        for head in heads:
+            chain = [head]
+            while chain[-1] in succ:
+                v = succ[chain[-1]]
+                if not self._attrs_mergeable(self.get_block_attrs(head),
+                                             self.get_block_attrs(v)):
+                    merges += self._merge_chain(chain)
+                    head = v
+                    chain = []
+                chain.append(v)
+            merges += self._merge_chain(chain)
+        return merges
+
+    def _merge_chain(self, chain):
+        """
+        Merges a chain u1 -> ... -> uk of blocks (see _contract_chains) into
+        u1 in one step. If uk is the exit block, u1 becomes the exit block.
+
+        Return:
+            Number of merged (removed) blocks, 0 if merging is not possible.
+        """
+        if len(chain) < 2:
+            return 0
+        head, tail = chain[0], chain[-1]
+
+        attrs = self._merge_attrs([self.get_block_attrs(b) for b in chain])
+        if attrs is None:
+            log.error("Cannot merge BBs {}: no merger for attributes known".format(chain))
+            return 0
+        self.digraph.nodes[head]['attrs'] = attrs
+
+        suc = list(self.digraph.successors(tail))
+        self._graph_changed()
+        self.digraph.remove_nodes_from(chain[1:])
+        for s in suc:
+            self._add_edge((head, s))
+
+        # correct exit, if we deleted that one.
+        if self._exitId == tail:
+            self._exitId = head
+            self.digraph.nodes[head]['type'] = 'Exit'
+        return len(chain) - 1
+
     def _validate_graph(self):
         """Validates the given graph, returns False if validation failed."""
         status = False
@@ -160,7 +340,7 @@ class ControlFlow(object):
 
     def _analyze_loops(self):
         """Perform loop analysis, save result."""
-        self._loopInfo = loop_analysis.LoopInfo(self.digraph, self._entryId)
+        self._loopInfo = loop_analysis.LoopInfo(self.get_csr(), self._entryId)
 
     ##################
     # Public methods #
@@ -181,10 +361,20 @@ class ControlFlow(object):
     def get_max_id(self):
         return self._maxId
 
+    def get_csr(self):
+        """
+        Returns an immutable CSR snapshot (flow.csr.CsrGraph) of the graph
+        structure, on which dominators, loops and control dependencies are
+        computed. self.digraph remains the place for block attributes.
+        """
+        if self._csr is None:
+            self._csr = csr.CsrGraph(self.digraph)
+        return self._csr
+
     def predom_tree(self):
         """Get dominator tree of CFG"""
         if self._tree_predom is None:
-            self._tree_predom = dominator.PreDominatorTree(self.digraph,
+            self._tree_predom = dominator.PreDominatorTree(self.get_csr(),
                                                            entryId=self._entryId,
                                                            exitId=self._exitId)
         # --
@@ -193,7 +383,7 @@ class ControlFlow(object):
     def postdom_tree(self):
         """Get post-dominator tree of CFG"""
         if self._tree_postdom is None:
-            self._tree_postdom = dominator.PostDominatorTree(self.digraph,
+            self._tree_postdom = dominator.PostDominatorTree(self.get_csr(),
                                                              entryId=self._entryId,
                                                              exitId=self._exitId)
         # --
@@ -209,7 +399,7 @@ class ControlFlow(object):
             self._ctrldep = dict()
             tp = self.postdom_tree()
             g = tp.get_tree()
-            for u, v in self.digraph.edges:
+            for u, v in self.get_csr().edges:
                 if not tp.test_dominance(v, u):
                     log.debug("{}: {} is a ctrl edge".format(self.name, (u, v)))
                     lca = tp.nearest_common_dominator({v, u})
@@ -288,18 +478,31 @@ class BinaryControlFlow(ControlFlow):
     """Parses a json object to generate a binary ControlFlow object."""
 
     attrKeys = {'AddrRanges'}  # keys guaranteed to be there in regular BBs
+    attrMergers = {'AddrRanges': lambda values: [r for v in values for r in v]}
 
-    def __init__(self, jsonObj, dwData, insns, symbs, dieOffset, opCodeTiming, simplify=False):
+    def __init__(self, jsonObj, dwData, insns, symbs, dieOffset, opCodeTiming, simplify=False,
+                 lineCacheSize=LINE_CACHE_SIZE):
+        """
+        Args:
+            opCodeTiming:  Shared OpTimingTable, or path of an opcode timing CSV.
+            lineCacheSize: Number of line info and dwarf line queries cached
+                           each, keyed by address ranges (0 disables caching).
+        """
         # Hold a reference to dwarf data and instructions
         self._dwData = dwData
         self._insns = insns
         self._symbs = symbs
         self._dieOffset = dieOffset
+        self._lineInfoCache = LruCache(lineCacheSize)
+        self._dwLinesCache = LruCache(lineCacheSize)
 
         self._funcCalls = None
         self._varAccesses = None
         self._varNames = None
-        self._opTimes = None
+        self._blockSummaries = None
+        self._blockTimes = None
+        self._blockMinTimes = None
+        self._opTiming = None
         self._inlSubs = {}
         self._colls = {}
 
@@ -320,88 +523,83 @@ class BinaryControlFlow(ControlFlow):
         # Finish initialization of base class
         super(BinaryControlFlow, self)._post_init()
 
-        # warn about some insns that can defy static analysis
-        self._check_unsupported_instructions()
-
-        # Attribute timing info to all basic blocks
-        self._opTimes = self._parse_op_time_csv(opCodeTiming)
-        self._attr_block_time()
+        # Timing, unsupported insns and variables of all blocks, in one pass
+        if isinstance(opCodeTiming, da.OpTimingTable):
+            self._opTiming = opCodeTiming
+        else:
+            self._opTiming = da.OpTimingTable(opCodeTiming)
+        self._summarize_blocks()
+        log.debug("VarAccesses: {}".format(self._varAccesses))
 
         # Locate function calls
         self._find_func_calls()
 
-        # Locate variables
-        self._find_variables()
-        log.debug("VarAccesses: {}".format(self._varAccesses))
-
         # Collapse inlined subroutines
         self._collapse_inlined_subroutines()
 
-    def _parse_op_time_csv(self, op_time_csv):
-        """Read instruction/opcode timing CSV
-        FIXME: sanitize/check input
+    def _summarize_blocks(self):
         """
-        opTimes = dict()
-
-        with open(op_time_csv, 'r') as fp:
-            for line in fp:
-                if line[0] == '#':
-                    continue
-                lCols = line.split(';')
-                assert len(lCols) == 3, "Invalid csv structure."
-                opTimes[lCols[0]] = (int(lCols[1]), int(lCols[2]))
+        Visits each instruction of all blocks once (see
+        Instructions.summarize_blocks()) and keeps the results per block in
+        self._blockSummaries. Checks for unsupported instructions (that can
+        defy static analysis) and missing timing info, attributes min/max
+        times (self._blockTimes, self._blockMinTimes) and variable accesses.
 
-        return opTimes
-
-    def _check_unsupported_instructions(self):
-        BLACKLIST = list()
-        BLACKLIST.append('spm')  # self-modifying code
-        BLACKLIST.sort()
-        for b in self.get_blocks():
-            for addr, inst in self.instructions(b):
-                mnem = inst['Mnem']
-                assert mnem not in BLACKLIST, "Unsupported mnemonic: {}".format(mnem)
+        Note:
+            - self._varAccesses is keyed by block id, with values having
+              following form: ([varRead offset key], [varWrite offset key]).
+            - Variable names are stored in self._varNames dict, keyed by the
+              starting offset of the variable.
+        """
+        localVars = self._dwData.get_local_variable_table(self._dieOffset)
+        self._varNames = {v.offset: v.name for v in localVars}
+        frameVars = da.FrameVariables({v.offset: v.byteSize for v in localVars})
 
-    def _attr_block_time(self):
-        self._blockTimes = dict()
+        self._blockSummaries = self._insns.summarize_blocks(
+            {b: self.get_addr_ranges(b) for b in self.get_blocks()}, frameVars,
+            timing=self._opTiming, blacklist=BLACKLIST)
 
         timeMissing = set()
-        for b in self.get_blocks():
-            totalSum = 0
-            for addr, inst in self.instructions(b):
-                mnem = inst['Mnem']
-                try:
-                    # Add max time (second element in opTime tuple)
-                    maxTime = self._opTimes[mnem][1]
-                    totalSum += maxTime
-                except KeyError:
-                    timeMissing.add(mnem)
-
-            self._blockTimes[b] = totalSum
-
+        for b, summary in self._blockSummaries.iteritems():
+            assert not summary.blacklisted, \
+                "Unsupported mnemonic: {}".format(summary.blacklisted[0])
+            timeMissing |= summary.missingTimes
         if timeMissing:
-            file_missing = 'missing-times-opcodes.csv'
-            with open(file_missing, 'a') as f:
-                f.write("# {}:\n".format(datetime.datetime.now()))
-                for missing_mnemo in timeMissing:
-                    f.write("{};1;1\n".format(missing_mnemo))
-            fullpath = os.path.join(os.getcwd(), file_missing)
+            fullpath = da.write_missing_times(self._opTiming.get_missing(timeMissing))
             assert False, "Time missing for some mnemonics in {}. See file {}".format(self.name,
                                                                                       fullpath)
 
+        self._blockTimes = {b: s.maxTime for b, s in self._blockSummaries.iteritems()}
+        self._blockMinTimes = {b: s.minTime for b, s in self._blockSummaries.iteritems()}
+        self._varAccesses = {b: (s.varReads, s.varWrites)
+                             for b, s in self._blockSummaries.iteritems()}
         log.debug("Block times = {}".format(self._blockTimes))
 
+    def get_block_summary(self, blockId):
+        """Returns the da.BlockSummary of the given block."""
+        return self._blockSummaries[blockId]
+
+    def iter_insn_addresses(self, blockId):
+        """Yields the instruction addresses of the given block, in range order."""
+        addrs = self._insns.get_addresses()
+        for lo, hi in self._blockSummaries[blockId].insnSpans:
+            for a in addrs[lo:hi]:
+                yield a
+
     def instructions(self, blockId):
         """iterates over instructions of basic block"""
         ranges = self.get_addr_ranges(blockId)
         for r in ranges:
-            insns = self._insns.get_instructions(r)
-            for addr, inst in insns:
+            for addr, inst in self._insns.iter_instructions(r):
                 yield addr, inst
 
     def get_block_time(self, blockId):
         return self._blockTimes[blockId]
 
+    def get_block_min_time(self, blockId):
+        """Returns the sum of the min times of the instructions of the block (BCET)."""
+        return self._blockMinTimes[blockId]
+
     def get_var_accesses(self, blockId):
         """
         Returns accessed variables in order for the given block id.
@@ -426,6 +624,7 @@ class BinaryControlFlow(ControlFlow):
         if discr is not None:
             oldinfo[which]['d'] = discr
         self._corrected_line_info[blockId] = oldinfo
+        self._invalidate_line_caches(blockId)
 
     def get_line_info(self, blockId):
         """
@@ -444,6 +643,9 @@ class BinaryControlFlow(ControlFlow):
                 - d : discriminator
 
           * Returns None if blockId is entry or exit.
+
+        Note:
+            Results are cached, the returned dicts must not be modified.
         """
         if blockId in self._corrected_line_info:
             return self._corrected_line_info[blockId]
@@ -451,7 +653,42 @@ class BinaryControlFlow(ControlFlow):
         ranges = self.get_addr_ranges(blockId)
         if len(ranges) == 0:
             return None
-        return self._dwData.get_line_info(ranges)
+        return self._lineInfoCache.get(tuple(ranges),
+                                       lambda: self._dwData.get_line_info(ranges))
+
+    def get_dw_lines(self, blockId):
+        """
+        Returns the dwarf line entries of the given block, see
+        DwarfData.get_dw_lines().
+
+        Note:
+            Results are cached, the returned dict must not be modified.
+        """
+        ranges = self.get_addr_ranges(blockId)
+        return self._dwLinesCache.get(tuple(ranges),
+                                      lambda: self._dwData.get_dw_lines(ranges))
+
+    def get_line_cache_stats(self):
+        """
+        Returns statistics of the line info caches as dict keyed by
+        'lineInfo' and 'dwLines', with values (hits, misses).
+        """
+        return {'lineInfo': (self._lineInfoCache.hits, self._lineInfoCache.misses),
+                'dwLines': (self._dwLinesCache.hits, self._dwLinesCache.misses)}
+
+    def get_inlined_subroutine(self, address):
+        """
+        Returns the inlined subroutine instance {dieOffset, low_pc, high_pc}
+        covering the given address, or None if the address is not part of
+        an inlined subroutine.
+        """
+        return self._dwData.find_inlined_subroutine(self._dieOffset, address)
+
+    def _invalidate_line_caches(self, blockId):
+        """Drops cached line info of the given block, before its ranges change."""
+        key = tuple(self.get_addr_ranges(blockId))
+        self._lineInfoCache.discard(key)
+        self._dwLinesCache.discard(key)
 
     def get_addr_ranges(self, blockId):
         """
@@ -472,31 +709,42 @@ class BinaryControlFlow(ControlFlow):
         else:
             return [f]
 
+    def resolve_dw_lines(self, blockIds):
+        """
+        Returns the dwarf lines of the given blocks, see get_dw_lines(). The
+        blocks missing in the line cache are resolved in one pass, see
+        DwarfData.resolve_dw_lines().
+
+        Return:
+            Tuple (blockLines, lineBlocks), dicts block -> {key: dw line}
+            and dw line key -> set of blocks.
+
+        Note:
+            Results are cached, the returned dicts of blockLines must not be
+            modified.
+        """
+        keys = {b: tuple(self.get_addr_ranges(b)) for b in blockIds}
+        dwLines = self._dwLinesCache.get_many(
+            keys.itervalues(),
+            lambda missing: self._dwData.resolve_dw_lines({k: list(k) for k in missing})[0])
+
+        blockLines = {}
+        lineBlocks = {}
+        for b, key in keys.iteritems():
+            blockLines[b] = dwLines[key]
+            for ref in dwLines[key]:
+                lineBlocks.setdefault(ref, set()).add(b)
+        return blockLines, lineBlocks
+
     def get_unique_dw_lines(self, blockIds):
         """
         BBs can be subdivided into chunks, whereas each has an individual dbg info (dwarf line).
         Multiple BBs can map to the same dwarf line, i.e, to same dbg info.
         This function returns those dwarf lines for each given BB, which exclusively map to it.
         :returns dict(dw line -> BB)
-        FIXME: not elegant.
         """
-        dwLines_unq = dict()
-        # 1. count how many BBs map to the same dwarf line
-        for b in blockIds:
-            dwLines = self._dwData.get_dw_lines(self.get_addr_ranges(b))
-            for dw_i in dwLines.keys():
-                if dw_i not in dwLines_unq:
-                    dwLines_unq[dw_i] = (1, b)
-                else:
-                    dwLines_unq[dw_i] = (2, b)  # > 1
-        # remove those where multiple BBs map to the same
-        del_keys = [k for k, v in dwLines_unq.items() if v[0] != 1]
-        for k in del_keys:
-            del dwLines_unq[k]
-        # unpack tuple
-        for k, v in dwLines_unq.items():
-            dwLines_unq[k] = v[1]
-        return dwLines_unq
+        _, lineBlocks = self.resolve_dw_lines(blockIds)
+        return {k: next(iter(bs)) for k, bs in lineBlocks.iteritems() if len(bs) == 1}
 
     def _collapse_inlined_subroutines(self):
 
@@ -672,46 +920,16 @@ class BinaryControlFlow(ControlFlow):
         assert self.digraph.out_degree(blockId1) == 1 and self.digraph.in_degree(blockId2) == 1
         # --
 
-        def merge_ranges(r1, r2):
-            return r1 + r2  # type: list
-
-        HANDLERS = {'AddrRanges': merge_ranges}
-
-        def merge_attrs():
-            attr_dst = copy.deepcopy(self.get_block_attrs(blockId1))
-            attr_src = self.get_block_attrs(blockId2)
-            for a, v in attr_src.iteritems():
-                try:
-                    attr_dst[a] = HANDLERS[a](attr_dst[a], v)
-                except KeyError:
-                    log.error("Cannot merge BBs {} and {}: no merger for attr {} known".format
-                              (blockId1, blockId1, a))
-                    return None
-            return attr_dst
-
         # first see if merging is supported
-        if self._exitId == blockId2 and self._entryId == blockId1:
-            return False  # must stay distinct, since all other algos downstream do fail
-
         if self._entryId == blockId1:
-            return False
+            return False  # must stay distinct, since all other algos downstream do fail
 
-        new_attrs = merge_attrs()
-        if new_attrs is None:
-            return False
-        self.digraph.nodes[blockId1]['attrs'] = new_attrs
+        return self._merge_chain([blockId1, blockId2]) > 0
 
-        # then do it
-        _, suc = self._remove_block(blockId2)
-        for s in suc:
-            self._add_edge((blockId1, s))
-
-        # correct exit, if we deleted that one.
-        if self._exitId == blockId2:
-            self._exitId = blockId1
-            self.digraph.nodes[blockId1]['type'] = 'Exit'
-        # --
-        return True
+    def _merge_chain(self, chain):
+        for b in chain:
+            self._invalidate_line_caches(b)
+        return super(BinaryControlFlow, self)._merge_chain(chain)
 
     def split_block(self, blockId, addr):
         """
@@ -782,6 +1000,7 @@ class BinaryControlFlow(ControlFlow):
         assert len(attrs) == 1 and 'AddrRanges' in attrs, "FIXME."
         
         # Remove block
+        self._invalidate_line_caches(blockId)
         pre, suc = self._remove_block(blockId)
 
         # Handle ranges
@@ -833,25 +1052,6 @@ class BinaryControlFlow(ControlFlow):
 
         return ar
 
-    def _find_variables(self):
-        """
-        Scans each basic block for variable access (r/w), updates self._varAccesses.
-
-        Note:
-            - self._varAccesses is keyed by block id, with values having
-              following form: ([varRead offset key], [varWrite offset key]).
-            - Variable names are stored in self._varNames dict, keyed by the
-              starting offset of the variable.
-        """
-        self._varAccesses = {}
-        localVars = self._dwData.get_local_variables(self._dieOffset)
-        self._varNames = {int(k): localVars[k]['name'] for k in localVars.keys()}
-        offsets = {int(k): localVars[k]['byteSize'] for k in localVars.keys()}
-
-        for block in self.digraph.nodes:
-            ar = self.get_addr_ranges(block)
-            self._varAccesses.update({block: self._insns.get_var_accesses(ar, offsets)})
-    
     def _find_func_calls(self):
         """
         Finds function calls, updates _funcCalls: {blockId:funcName}
@@ -878,7 +1078,7 @@ class BinaryControlFlow(ControlFlow):
                     log.warning("Control flow that was read does not resolve function calls; "
                                 "please re-run or update flow parser. Trying a workaround...")
                     log.warning("Resolving callee of {}.{}...".format(self.name, block))
-                    insn = self._insns._insnMap[addrRanges[0][0]]
+                    insn = self._insns.get_instruction(addrRanges[0][0])
                     assert len(insn['Target']) == 1, "Invalid call instruction"
                     callee = self._symbs[insn['Target'][0]]
                 if isinstance(callee, (list, set)):
@@ -943,31 +1143,24 @@ class BinaryControlFlow(ControlFlow):
         return BinaryControlFlow.attrKeys
 
     def _contract_straight_paths(self):
-        # FIXME: there must be an algo? this is higly inefficient
         # TODO: check whether inlining stuff still works.
 
-        def is_function_call(u):
-            return self.digraph.nodes[u].get('type', None) == 'FunctionCall'
+        def is_chainable(u):
+            return u != self._entryId and \
+                self.digraph.nodes[u].get('type', None) != 'FunctionCall'
 
-        merges = 0
-        changed = True
-        while changed:
-            changed = False
-            for n in self.digraph.nodes():
-                # noinspection PyCallingNonCallable
-                if self.digraph.out_degree(n) == 1 and not is_function_call(n):
-                    s = next(self.digraph.successors(n))
-                    # noinspection PyCallingNonCallable
-                    if self.digraph.in_degree(s) == 1 and not is_function_call(s):
-                        changed = self._merge_blocks(n, s)
-                        if changed:
-                            log.debug("Merged {}::{}->{} into {}".format(self.name, n, s, n))
-                            merges += 1
-                            break
+        merges = self._contract_chains(is_chainable)
         if merges:
             log.debug("Contracted {} single edges in binary flow '{}'".format(merges, self.name))
 
 
+def merge_begin(b1, b2):
+    """Returns the earlier of two source locations 'line:col'."""
+    def lc(b):
+        return [int(p) for p in b.split(":")]
+    return "{}:{}".format(*min(lc(b1), lc(b2)))
+
+
 class SourceControlFlow(ControlFlow):
     """
     FIXME: - Make self._csvBlocks a dict keyed by node id.
@@ -975,15 +1168,22 @@ class SourceControlFlow(ControlFlow):
     """
 
     attrKeys = {'begin'}
+    attrMergers = {'begin': lambda values: reduce(merge_begin, values)}
 
     def __init__(self, csvObj, delimiterChar=';',
-                 headerStartChar='#', headerDelimiterChar=';', simplify=False):
+                 headerStartChar='#', headerDelimiterChar=';', simplify=False, hCols=None):
+        """
+        Args:
+            hCols: Optional header columns (see parse_csv_header) that were
+                   already validated, e.g. once for all objects of a file.
+        """
         self._funcCalls = {}
         self._blockIndices = {}
 
         # Validate csv object columns, get a list of csv blocks (lines)
         self._csvBlocks, self._hCols = self._validate_csv_obj(csvObj, delimiterChar,
-                                                              headerStartChar, headerDelimiterChar)
+                                                              headerStartChar, headerDelimiterChar,
+                                                              hCols)
 
         # Initialize base class
         name = self._csvBlocks[-1][self._hCols['Subprogram']]
@@ -1001,6 +1201,42 @@ class SourceControlFlow(ControlFlow):
         # Finish initialization
         super(SourceControlFlow, self)._post_init()
 
+    @staticmethod
+    def parse_csv_header(hLine, headerStartChar='#', headerDelimiterChar=';'):
+        """
+        Validates a csv header line.
+
+        Return:
+            Dict of header columns, keyed by column name with column index as value.
+        """
+        assert hLine[0] == headerStartChar, "Csv object must begin with a header line."
+
+        hCols = {}
+        hIdx = 0
+        for c in hLine[1:].split(headerDelimiterChar):
+            hCols.update({c: hIdx})
+            hIdx += 1
+
+        validCols = 'BB.index;BB.type;BB.label;File;Subprogram;' + \
+                    'Line.Begin;Col.Begin;Line.End;Col.End;' + \
+                    'Exec.Count;Exec.Time.Per;function.call.type;' + \
+                    'function.call.callees;Successors;Code'
+
+        # VarWrite/VarRead not always present in *_allflows.csv file
+        # validCols += ';VarWrite;VarRead'
+        if 'VarRead' in hCols:
+            validCols += ';VarWrite;VarRead'
+        validCols = set(validCols.split(';'))
+
+        assert set(hCols.keys()) == validCols, "Invalid columns."
+        return hCols
+
+    @staticmethod
+    def peek_csv_line(line, hCols, delimiterChar=';'):
+        """Returns (name, file) of a csv block line, given the header columns."""
+        lEntries = line[:line.find('"')].split(delimiterChar)
+        return lEntries[hCols['Subprogram']], lEntries[hCols['File']]
+
     def get_var_accesses(self, blockId):
         raise NotImplementedError
 
@@ -1191,31 +1427,12 @@ class SourceControlFlow(ControlFlow):
                 if s != '':
                     super(SourceControlFlow, self)._add_edge((id, int(s)))
 
-    def _validate_csv_obj(self, csvObj, dl, h, hdl):
+    def _validate_csv_obj(self, csvObj, dl, h, hdl, hCols=None):
         csvLines = csvObj.split('\n')
         assert len(csvLines) > 1, "Csv object is empty."
 
-        hCols = {}
-        hLine = csvLines[0]
-        assert hLine[0] == h, "Csv object must begin with a header line."
-
-        hIdx = 0
-        for c in hLine[1:].split(hdl):
-            hCols.update({c: hIdx})
-            hIdx += 1
-        
-        validCols = 'BB.index;BB.type;BB.label;File;Subprogram;' + \
-                    'Line.Begin;Col.Begin;Line.End;Col.End;' + \
-                    'Exec.Count;Exec.Time.Per;function.call.type;' + \
-                    'function.call.callees;Successors;Code'
-
-        # VarWrite/VarRead not always present in *_allflows.csv file
-        # validCols += ';VarWrite;VarRead'
-        if 'VarRead' in hCols:
-            validCols += ';VarWrite;VarRead'
-        validCols = set(validCols.split(';'))
-
-        assert set(hCols.keys()) == validCols, "Invalid columns."
+        if hCols is None:
+            hCols = SourceControlFlow.parse_csv_header(csvLines[0], h, hdl)
 
         csvBlocks = []
         for line in csvLines[1:]:
@@ -1242,54 +1459,11 @@ class SourceControlFlow(ControlFlow):
         assert self.digraph.out_degree(blockId1) == 1 and self.digraph.in_degree(blockId2) == 1
         # --
 
-        def merge_begin(b1, b2):
-            def lc(b):
-                return [int(p) for p in b.split(":")]
-            l1, c1 = lc(b1)
-            l2, c2 = lc(b2)
-            ml = min(l1, l2)
-            if l1 < l2:
-                mc = c1
-            elif l1 == l2:
-                mc = min(c1, c2)
-            else:
-                mc = c2
-            return "{}:{}".format(ml, mc)
-
-        HANDLERS = dict(begin=merge_begin)
-
-        def merge_attrs():
-            attr_dst = copy.deepcopy(self.get_block_attrs(blockId1))
-            attr_src = self.get_block_attrs(blockId2)
-            for a, v in attr_src.iteritems():
-                try:
-                    attr_dst[a] = HANDLERS[a](attr_dst[a], v)
-                except KeyError:
-                    log.error("Cannot merge BBs {} and {}: no merger for attr {} known".format
-                              (blockId1, blockId2, a))
-                    return None
-            return attr_dst
-
         # first see if merging is supported
         if self._exitId == blockId2 and self._entryId == blockId1:
             return False  # must stay distinct, since all other algos downstream do fail
 
-        new_attrs = merge_attrs()
-        if new_attrs is None:
-            return False
-        self.digraph.nodes[blockId1]['attrs'] = new_attrs
-
-        # then do it
-        _, suc = self._remove_block(blockId2)
-        for s in suc:
-            self._add_edge((blockId1, s))
-
-        # correct exit, if we deleted that one.
-        if self._exitId == blockId2:
-            self._exitId = blockId1
-            self.digraph.nodes[blockId1]['type'] = 'Exit'
-        # --
-        return True
+        return self._merge_chain([blockId1, blockId2]) > 0
 
     def _calc_discriminators(self):
         """
@@ -1347,4 +1521,66 @@ class SourceControlFlow(ControlFlow):
         return SourceControlFlow.attrKeys
 
     def _contract_straight_paths(self):
-        pass
+        def is_chainable(u):
+            return u not in (self._entryId, self._exitId) and \
+                not self.get_func_calls(u) and not self.is_virtual_node(u)
+
+        merges = self._contract_chains(is_chainable)
+        if merges:
+            # merged blocks no longer begin or end on the lines of the absorbed ones
+            self._calc_discriminators()
+            log.debug("Contracted {} single edges in source flow '{}'".format(merges, self.name))
+
+    def _merge_chain(self, chain):
+        csvBlocks = [self._get_csv_block(b) for b in chain]
+        merges = super(SourceControlFlow, self)._merge_chain(chain)
+        if merges == 0:
+            return 0
+
+        head = chain[0]
+        self._csvBlocks[self._blockIndices[head]] = self._merge_csv_blocks(csvBlocks)
+        calls = [c for b in chain for c in self._funcCalls.pop(b, [])]
+        if calls:
+            self._funcCalls[head] = calls
+        for b in chain[1:]:
+            del self._blockIndices[b]
+        return merges
+
+    def _merge_csv_blocks(self, csvBlocks):
+        """
+        Merges the csv lines of a chain of blocks (in flow order) into the
+        line of the first one.
+
+        Note:
+            - The merged block spans from the earliest begin to the latest end
+              location, except for a trailing exit block, whose location (the
+              closing brace) is not part of the code of the chain.
+            - Exec.Count and Exec.Time.Per are taken from the first block.
+
+        Return:
+            The merged csv line (list of entries).
+        """
+        hc = self._hCols
+        merged = list(csvBlocks[0])
+        tail = csvBlocks[-1]
+        if tail[hc['BB.type']] == 'exit':
+            csvBlocks = csvBlocks[:-1]
+
+        def loc(block, which):
+            return int(block[hc['Line.' + which]]), int(block[hc['Col.' + which]])
+
+        begin = min(loc(b, 'Begin') for b in csvBlocks)
+        end = max(loc(b, 'End') for b in csvBlocks)
+        merged[hc['Line.Begin']], merged[hc['Col.Begin']] = str(begin[0]), str(begin[1])
+        merged[hc['Line.End']], merged[hc['Col.End']] = str(end[0]), str(end[1])
+
+        def join(col):
+            return ','.join(b[hc[col]] for b in csvBlocks if b[hc[col]] != '')
+
+        merged[hc['function.call.callees']] = join('function.call.callees')
+        if 'VarRead' in hc:
+            merged[hc['VarWrite']] = join('VarWrite')
+            merged[hc['VarRead']] = join('VarRead')
+        merged[hc['Code']] = '"{}"'.format(''.join(b[hc['Code']].strip('"') for b in csvBlocks))
+        merged[hc['Successors']] = tail[hc['Successors']]
+        return merged
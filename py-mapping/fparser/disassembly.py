@@ -1,40 +1,246 @@
 import logging
+import os
 import re
-from sortedcontainers import SortedDict
+import datetime
+from array import array
+from collections import namedtuple
+from bisect import bisect_left, bisect_right
+from jsonio import open_input
 
 
 log = logging.getLogger(__name__)
 
+MISSING_TIMES_FILE = 'missing-times-opcodes.csv'
+
+# No frame-relative operand, see Instructions._get_stack_operands()
+STACK_NONE = -1
+
+# Everything the passes over the instructions of a block need, see
+# Instructions.summarize_blocks():
+#   minTime, maxTime : sums of min/max times of the instructions with timing info
+#   missingTimes     : set of mnemonic ids without timing info
+#   blacklisted      : unsupported mnemonics found, in order
+#   varReads         : start offsets of the variables read, in order
+#   varWrites        : start offsets of the variables written, in order
+#   addrSpan         : (first, last) instruction address, None if there are none;
+#                      the block touches the cache lines of this span
+#   insnSpans        : index spans (lo, hi) of the instructions of each address range
+BlockSummary = namedtuple('BlockSummary', 'minTime maxTime missingTimes blacklisted '
+                                          'varReads varWrites addrSpan insnSpans')
+
+
+class OpTimingTable(object):
+    """
+    Instruction timing table, parsed once from an opcode timing CSV with lines
+    of the form 'mnemonic;min;max'.
+
+    Mnemonics are interned to integer ids (see intern()). Timings are held in
+    the arrays minTimes and maxTimes indexed by mnemonic id, where MISSING
+    denotes a mnemonic without timing info.
+    """
+
+    MISSING = -1
+
+    def __init__(self, csvPath):
+        self._mnemIds = {}
+        self.mnemonics = []
+        self.minTimes = array('l')
+        self.maxTimes = array('l')
+
+        self._parse_csv(csvPath)
+
+    def intern(self, mnem):
+        """Returns the id of the given mnemonic, adding it if it is not known yet."""
+        mnemId = self._mnemIds.get(mnem, None)
+        if mnemId is None:
+            mnemId = len(self.mnemonics)
+            self._mnemIds[mnem] = mnemId
+            self.mnemonics.append(mnem)
+            self.minTimes.append(OpTimingTable.MISSING)
+            self.maxTimes.append(OpTimingTable.MISSING)
+        return mnemId
+
+    def get_missing(self, mnemIds):
+        """Returns the sorted list of mnemonics without timing info among mnemIds."""
+        return sorted({self.mnemonics[i] for i in mnemIds
+                       if self.maxTimes[i] == OpTimingTable.MISSING})
+
+    def _parse_csv(self, csvPath):
+        """FIXME: sanitize/check input"""
+        with open_input(csvPath) as fp:
+            for line in fp:
+                if line[0] == '#':
+                    continue
+                lCols = line.split(';')
+                assert len(lCols) == 3, "Invalid csv structure."
+                mnemId = self.intern(lCols[0])
+                self.minTimes[mnemId] = int(lCols[1])
+                self.maxTimes[mnemId] = int(lCols[2])
+
+
+def write_missing_times(mnems):
+    """
+    Appends mnemonics without timing info to MISSING_TIMES_FILE (in the cwd),
+    using the format of the timing CSV with dummy times.
+
+    Return:
+        Full path of the written file.
+    """
+    with open(MISSING_TIMES_FILE, 'a') as f:
+        f.write("# {}:\n".format(datetime.datetime.now()))
+        for mnem in mnems:
+            f.write("{};1;1\n".format(mnem))
+    return os.path.join(os.getcwd(), MISSING_TIMES_FILE)
+
+
+class InsnView(object):
+    """
+    Read-only view of one instruction of Instructions, indexable like an
+    instruction dict with keys 'Mnem', 'MnemId' (if a timing table was
+    given), 'Operands' and 'Target'. Values are looked up on access.
+    """
+    __slots__ = ('_insns', '_i')
+
+    def __init__(self, insns, i):
+        self._insns = insns
+        self._i = i
+
+    def __getitem__(self, key):
+        if key == 'Mnem':
+            return self._insns._get_mnem(self._i)
+        if key == 'MnemId' and self._insns.timing is not None:
+            return self._insns._get_mnem_id(self._i)
+        if key == 'Operands':
+            return self._insns._get_operands(self._i)
+        if key == 'Target':
+            return self._insns._get_targets(self._i)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
 
 class Instructions(object):
+    """
+    Instructions of the .text section, as parallel arrays sorted by address:
+    mnemonic ids (interned), begin offsets into a table of (interned) operand
+    strings and begin offsets into a flat array of branch/call targets.
+
+    Range queries bisect the addresses and yield InsnView objects, or index
+    spans (lo, hi) for the per-index accessors.
 
-    def __init__(self, insns):
+    If a timing table is given, mnemonics are interned in that table, so each
+    instruction carries the id of its mnemonic ('MnemId') in it.
+    """
+
+    def __init__(self, insns, timing=None):
         assert len(insns) > 0, "Empty instruction list."
 
-        self._insnMap = SortedDict({i['Addr']:
-                                    {
-                                        'Mnem': i['Mnem'],
-                                        'Operands': i['Op'],
-                                        'Target': i['Target']
-                                    } for i in insns})
+        self.timing = timing
+        self._stackOffs = None
+        self._stackWrites = None
+        self._mnemonics = timing.mnemonics if timing is not None else []
+        self._operands = []
+
+        mnemIds = {}
+        opIds = {}
+
+        def intern(s, ids, strings):
+            i = ids.get(s, None)
+            if i is None:
+                i = ids[s] = len(strings)
+                strings.append(s)
+            return i
+
+        def intern_mnem(mnem):
+            if timing is not None:
+                return timing.intern(mnem)
+            return intern(mnem, mnemIds, self._mnemonics)
+
+        byAddr = {i['Addr']: i for i in insns}
+        self._addrs = array('l', sorted(byAddr))
+        self._mnemIds = array('l')
+        self._opOffs = array('l', [0])
+        self._opIds = array('l')
+        self._targetOffs = array('l', [0])
+        self._targets = array('l')
+        for a in self._addrs:
+            i = byAddr[a]
+            self._mnemIds.append(intern_mnem(i['Mnem']))
+            self._opIds.extend(intern(o, opIds, self._operands) for o in i['Op'])
+            self._opOffs.append(len(self._opIds))
+            self._targets.extend(i['Target'])
+            self._targetOffs.append(len(self._targets))
+
+    def __len__(self):
+        return len(self._addrs)
+
+    def _get_mnem(self, i):
+        return self._mnemonics[self._mnemIds[i]]
+
+    def _get_mnem_id(self, i):
+        return self._mnemIds[i]
+
+    def _get_operands(self, i):
+        return [self._operands[k] for k in self._opIds[self._opOffs[i]:self._opOffs[i + 1]]]
+
+    def _get_targets(self, i):
+        return list(self._targets[self._targetOffs[i]:self._targetOffs[i + 1]])
+
+    def _index(self, addr):
+        """Returns the index of the instruction at addr, raises KeyError if there is none."""
+        i = bisect_left(self._addrs, addr)
+        if i == len(self._addrs) or self._addrs[i] != addr:
+            raise KeyError(addr)
+        return i
+
+    def get_span(self, addr_range):
+        """Returns the index span (lo, hi) of the instructions in the given address range."""
+        assert isinstance(addr_range, tuple), "Invalid address range: {}".format(addr_range)
+        lo = bisect_left(self._addrs, addr_range[0])
+        return lo, bisect_right(self._addrs, addr_range[1], lo)
+
+    def iter_instructions(self, addr_range):
+        """Yields (address, InsnView) of the instructions in the given address range."""
+        lo, hi = self.get_span(addr_range)
+        for k, a in enumerate(self._addrs[lo:hi]):
+            yield a, InsnView(self, lo + k)
 
     def get_instructions(self, addr_range):
         """
         Returns a list of instructions contained in the given address range.
         
         Note:
-            - Each insn is a dict, possible keys:  'Mnem','Operands','Target'
+            - Each insn is an InsnView, possible keys:  'Mnem','MnemId','Operands','Target'
         """
-        assert isinstance(addr_range, tuple), "Invalid address range: {}".format(addr_range)
-        ar_begin = addr_range[0]
-        ar_end = addr_range[1]
+        return list(self.iter_instructions(addr_range))
 
-        insnRange = self._insnMap.irange(minimum=ar_begin, maximum=ar_end)
-        # for k,v in self._insnMap.items():
-        #    log.debug("{}: {}".format(k,v))
-        # log.debug("insnRange: {}".format(list(insnRange)))
-    
-        return [(i_addr, self._insnMap[i_addr]) for i_addr in insnRange]
+    def iter_mnemonics(self, addr_range):
+        """Yields the mnemonics of the instructions in the given address range."""
+        lo, hi = self.get_span(addr_range)
+        for i in xrange(lo, hi):
+            yield self._get_mnem(i)
+
+    def iter_mnemonic_ids(self, addr_range):
+        """
+        Yields the mnemonic ids (in the timing table) of the instructions in
+        the given address range.
+        """
+        assert self.timing is not None, "Mnemonic ids require a timing table."
+        lo, hi = self.get_span(addr_range)
+        for i in xrange(lo, hi):
+            yield self._get_mnem_id(i)
+
+    def get_addresses(self):
+        """Returns all instruction addresses in ascending order."""
+        return self._addrs
+
+    def get_instruction(self, addr):
+        """Returns the instruction (InsnView) at addr, raises KeyError if there is none."""
+        return InsnView(self, self._index(addr))
 
     def get_next_insn_address(self, addr):
         """
@@ -50,16 +256,12 @@ class Instructions(object):
             Returns the next valid address, or None if addr is the very last
             address.
         """
-        i = self._insnMap.bisect_left(addr)
-        c_key = self._insnMap.iloc[i]
-        # assert c_key == addr, "Address not in map."
-
-        if i == len(self._insnMap) - 1:
+        i = bisect_right(self._addrs, addr)
+        if i == len(self._addrs):
             return None
-
-        return self._insnMap.values()[i+1]
+        return self._addrs[i]
     
-    def get_prev_insn_addres(self, addr):
+    def get_prev_insn_address(self, addr):
         """
         Returns the previous valid instruction address.
 
@@ -73,9 +275,41 @@ class Instructions(object):
             Returns the previous valid address, or None if add is the very first
             address.
         """
-        i = self._insnMap.bisect_left(addr)
-        c_key = self._insnMap.iloc[i]
-        # FIXME: possibly incomplete
+        i = bisect_left(self._addrs, addr)
+        if i == 0:
+            return None
+        return self._addrs[i - 1]
+
+    def _get_stack_operands(self):
+        """
+        Returns the frame-relative (Y+d) operand of every instruction as
+        arrays (offsets, writes), decoded on first use: offsets holds d or
+        STACK_NONE, writes is 1 if the operand is the destination.
+
+        Note:
+            Only instructions with two operands are considered, a
+            destination operand takes precedence over a source operand.
+        """
+        if self._stackOffs is None:
+            srx = re.compile(r'Y\+(\d+)')
+            offs = array('l')
+            writes = array('b')
+            for i in xrange(len(self)):
+                o, w = STACK_NONE, 0
+                ops = self._get_operands(i)
+                if len(ops) == 2:
+                    m = srx.search(ops[0])
+                    if m is not None:
+                        o, w = int(m.group(1)), 1
+                    else:
+                        m = srx.search(ops[1])
+                        if m is not None:
+                            o = int(m.group(1))
+                offs.append(o)
+                writes.append(w)
+            self._stackOffs = offs
+            self._stackWrites = writes
+        return self._stackOffs, self._stackWrites
 
     def get_var_accesses(self, addrRanges, stackOffsets):
         """
@@ -83,93 +317,205 @@ class Instructions(object):
         addrRanges @ the given stack frame offsets.
 
         param: - stackOffsets {offset:length}
+        """
+        return self.get_block_var_accesses({None: addrRanges},
+                                           FrameVariables(stackOffsets))[None]
 
-        FIXME: Move validOffsets from here.
-        """
-
-        varReads = []
-        varWrites = []
-        varReadOffsets = []
-        varWriteOffsets = []
-        srx = re.compile(r'Y\+(\d+)')
-
-        validOffsets = {}
-        for key in stackOffsets.keys():
-            validOffsets.update({
-                o: key for o in xrange(key, key+stackOffsets[key])
-            })
-
-        def check_var_rw(addr):
-            i = self._insnMap[addr]
-            if len(i['Operands']) != 2:
-                return
-            # Write
-            m = srx.search(i['Operands'][0])
-            if m is not None:
-                o = int(m.group(1))
-                if o in validOffsets:
-                    varWriteOffsets.append(o)
-                else:
-                    varWriteOffsets.append(None)
-                return
-            # Read
-            m = srx.search(i['Operands'][1])
-            if m is not None:
-                o = int(m.group(1))
-                if o in validOffsets:
-                    varReadOffsets.append(o)
+    def get_block_var_accesses(self, blockRanges, frameVars):
+        """
+        Returns the variable accesses of many blocks, in one sweep over their
+        address-sorted ranges, see get_var_accesses() and summarize_blocks().
+
+        Args:
+            blockRanges: Dict block id -> list of address ranges.
+            frameVars:   FrameVariables of the stack frame.
+
+        Return:
+            Dict block id -> tuple (varReads, varWrites) of lists of variable
+            start offsets, in order of access.
+        """
+        return {b: (s.varReads, s.varWrites)
+                for b, s in self.summarize_blocks(blockRanges, frameVars).iteritems()}
+
+    def _iter_block_spans(self, blockRanges):
+        """
+        Yields (block, range index, lo, hi) with the index span [lo, hi) of
+        each address range of the given blocks, sweeping the ranges in
+        address order.
+        """
+        addrs = self._addrs
+        i = 0
+        for lo, hi, b, k in sorted((r[0], r[1], b, k) for b, rs in blockRanges.iteritems()
+                                   for k, r in enumerate(rs)):
+            # Continue after the previous range, unless they overlap
+            if i > 0 and addrs[i - 1] >= lo:
+                i = 0
+            i = bisect_left(addrs, lo, i)
+            j = bisect_right(addrs, hi, i)
+            yield b, k, i, j
+            i = j
+
+    def summarize_blocks(self, blockRanges, frameVars, timing=None, blacklist=()):
+        """
+        Visits each instruction of the given blocks exactly once and returns
+        everything the block passes of a binary flow need, see BlockSummary.
+
+        Args:
+            blockRanges: Dict block id -> list of address ranges.
+            frameVars:   FrameVariables of the stack frame.
+            timing:      Optional OpTimingTable, for minTime and maxTime.
+            blacklist:   Unsupported mnemonics.
+
+        Return:
+            Dict block id -> BlockSummary.
+        """
+        offs, writes = self._get_stack_operands()
+        addrs = self._addrs
+        useIds = timing is not None and self.timing is timing
+        blacklist = set(blacklist)
+
+        # Partial results keyed by (block, range index), combined in range order below
+        parts = {}
+        for b, k, i, j in self._iter_block_spans(blockRanges):
+            minTime = maxTime = 0
+            missing = set()
+            hits = []
+            reads = []
+            rangeWrites = []
+            for n in xrange(i, j):
+                mnem = None
+                if blacklist:
+                    mnem = self._get_mnem(n)
+                    if mnem in blacklist:
+                        hits.append(mnem)
+                if timing is not None:
+                    if useIds:
+                        mnemId = self._get_mnem_id(n)
+                    else:
+                        mnemId = timing.intern(mnem if mnem is not None else self._get_mnem(n))
+                    t = timing.maxTimes[mnemId]
+                    if t == OpTimingTable.MISSING:
+                        missing.add(mnemId)
+                    else:
+                        minTime += timing.minTimes[mnemId]
+                        maxTime += t
+                o = offs[n]
+                if o == STACK_NONE or frameVars.lookup(o) is None:
+                    continue
+                if writes[n]:
+                    rangeWrites.append(o)
                 else:
-                    varReadOffsets.append(None)
-                return
-
-        for ar in addrRanges:
-            insnRange = self._insnMap.irange(minimum=ar[0], maximum=ar[1])
-            for i in insnRange:
-                check_var_rw(i)
-            pass
-
-        # Filter None values
-        varWriteOffsets = filter(lambda a: a is not None, varWriteOffsets)
-        varReadOffsets = filter(lambda a: a is not None, varReadOffsets)
-        
-        def count_consecutive_occurrences(i, offsets):
-            assert i < len(offsets)
-            status = False
+                    reads.append(o)
+            span = (addrs[i], addrs[j - 1]) if j > i else None
+            parts[b, k] = minTime, maxTime, missing, hits, reads, rangeWrites, span, (i, j)
+
+        summaries = {}
+        for b, rs in blockRanges.iteritems():
+            minTime = maxTime = 0
+            missing = set()
+            hits = []
+            reads = []
+            rangeWrites = []
+            addrSpan = None
+            insnSpans = []
+            for k in xrange(len(rs)):
+                p = parts[b, k]
+                minTime += p[0]
+                maxTime += p[1]
+                missing |= p[2]
+                hits += p[3]
+                reads += p[4]
+                rangeWrites += p[5]
+                if p[6] is not None:
+                    addrSpan = p[6] if addrSpan is None else \
+                        (min(addrSpan[0], p[6][0]), max(addrSpan[1], p[6][1]))
+                insnSpans.append(p[7])
+            summaries[b] = BlockSummary(minTime, maxTime, missing, hits,
+                                        frameVars.group(reads, partialOk=True),
+                                        frameVars.group(rangeWrites, partialOk=False),
+                                        addrSpan, insnSpans)
+        return summaries
+
+
+class FrameVariables(object):
+    """
+    Offset -> variable interval table of a stack frame, built once per
+    function.
+
+    The frame is cut into segments at the bounds of all variables. Each
+    segment belongs to the variable with the greatest start offset among
+    those covering it, so if variables overlap, a byte is attributed to the
+    innermost one (as the former byte map, which was filled in ascending
+    offset order, each variable overwriting the bytes of the previous ones).
+
+    Args:
+        stackOffsets: Dict {offset: length} of the variables.
+    """
+
+    def __init__(self, stackOffsets):
+        self.lengths = dict(stackOffsets)
+        starts = sorted(self.lengths)
+        bounds = sorted(set(starts) | {o + l for o, l in self.lengths.iteritems()})
+        self._segStarts = array('l', bounds)
+        self._segOwners = array('l')
+        for lo in bounds[:-1]:
+            owner = -1
+            for k in xrange(bisect_right(starts, lo) - 1, -1, -1):
+                if lo < starts[k] + self.lengths[starts[k]]:
+                    owner = starts[k]
+                    break
+            self._segOwners.append(owner)
 
-            initOff = validOffsets[offsets[i]]
-            length = stackOffsets[initOff]
+    def __len__(self):
+        return len(self.lengths)
+
+    def lookup(self, offset):
+        """Returns the start offset of the variable containing offset, or None."""
+        i = bisect_right(self._segStarts, offset) - 1
+        if i < 0 or i >= len(self._segOwners) or self._segOwners[i] < 0:
+            return None
+        return self._segOwners[i]
+
+    def group(self, offsets, partialOk):
+        """
+        Groups consecutive accesses to the bytes of a variable into one access.
+
+        Args:
+            offsets:   Accessed offsets (valid ones only), in order of access.
+            partialOk: If False, accessing only some bytes of a variable fails.
+
+        Return:
+            List of variable start offsets.
+        """
+        def count_consecutive_occurrences(i):
+            initOff = self.lookup(offsets[i])
+            length = self.lengths[initOff]
 
             if i + length > len(offsets):
-                # Partial read for last variable in offsets.
+                # Partial access for last variable in offsets.
                 return i+length, initOff, False
-                
+
             count = 0
             for j in xrange(i, i+length):
-                if validOffsets[offsets[j]] == initOff:  # + length:
+                if self.lookup(offsets[j]) == initOff:
                     count += 1
                 else:
                     break
             if count == length:
-                status = True
-                return i+length, initOff, status
+                return i+length, initOff, True
             else:
-                return i+1, initOff, status
+                return i+1, initOff, False
 
+        varOffsets = []
         i = 0
-        while i < len(varReadOffsets):
-            i, initOff, status = count_consecutive_occurrences(i, varReadOffsets)
-            # Byte operations (e.g. var & 0xEF)
+        while i < len(offsets):
+            i, initOff, status = count_consecutive_occurrences(i)
             if status is False:
+                # Byte operations (e.g. var & 0xEF)
+                assert partialOk, "Partial write."
                 log.debug("Partial read for variable starting @ offset: {}".format(initOff))
-            varReads.append(initOff)
-
-        i = 0
-        while i < len(varWriteOffsets):
-            i, initOff, status = count_consecutive_occurrences(i, varWriteOffsets)
-            assert status, "Partial write."
-            varWrites.append(initOff)
-
-        return varReads, varWrites
+            varOffsets.append(initOff)
+        return varOffsets
 
 
 class Symbols:
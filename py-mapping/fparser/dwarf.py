@@ -1,47 +1,286 @@
-import logging
 import json
+import logging
+import os
 import re
 import networkx as nx
-from sortedcontainers import SortedDict
+from array import array
+from collections import namedtuple
+from bisect import bisect_left, bisect_right
+from jsonio import load_debug_index, select_chunks, SpanReader
 
 
 log = logging.getLogger(__name__)
 SUBROUTINE = ('DW_TAG_inlined_subroutine', 'DW_TAG_subprogram')
 
+# Local variable of a subprogram at the given offset in its stack frame
+LocalVariable = namedtuple('LocalVariable', 'offset byteSize name')
+
 
-class DwarfData(object):
+class LineTable(object):
     """
-    Loads dwarf data from the given file.
+    DWARF line table as parallel typed arrays.
 
-    Data:
-        - DIEs: Apart from attributes, it also contains DIE offset as well as
-                parent DIE offset in order to build a tree. 
-        - LineInfoMap: Instruction address to LineInfoEntry
-        - LineInfoEntries: Map of entries containing line info
+    Line entries (low, high, line, col, disc, cu) are sorted by low pc, which
+    also serves as reference to an entry (as the keys of LineInfoEntries).
+    Instructions are mapped to their line entry by mapAddr (sorted) and
+    mapLine (index into the entry arrays), as in LineInfoMap. Range queries
+    bisect mapAddr and only scan the instructions in range.
 
-    TODO: - Include DW_TAG_formal_parameter?
+    Args:
+        lineEntries: LineInfoEntries of the dwarf file.
+        lineMap:     LineInfoMap of the dwarf file.
     """
 
-    def __init__(self, path):
-        self._dwData = None
-        self._dieTree = None
-        self._subDies = None
-        self._subprograms = None
-        self._inlSubroutines = {}
-        self._dwLineMap = None
+    def __init__(self, lineEntries, lineMap):
+        lows = sorted(int(k) for k in lineEntries.iterkeys())
+        entries = [lineEntries[str(low)] for low in lows]
+        lowIdx = {low: i for i, low in enumerate(lows)}
+        mapAddrs = sorted(int(k) for k in lineMap.iterkeys())
+
+        self._low = array('l', lows)
+        self._high = array('l', [int(e['HighPc']) for e in entries])
+        self._line = array('l', [int(e['LineNumber']) for e in entries])
+        self._col = array('l', [int(e['LineOffset']) for e in entries])
+        self._disc = array('l', [int(e['Discriminator']) for e in entries])
+        self._cu = array('l', [int(e['CU']) for e in entries])
+        self._mapAddr = array('l', mapAddrs)
+        self._mapLine = array('l', [lowIdx[int(lineMap[str(a)])] for a in mapAddrs])
+
+    def get_arrays(self):
+        """Returns the arrays of the table by name (see class description)."""
+        return {'low': self._low, 'high': self._high, 'line': self._line, 'col': self._col,
+                'disc': self._disc, 'cu': self._cu, 'mapAddr': self._mapAddr,
+                'mapLine': self._mapLine}
+
+    def _find(self, addr):
+        """Returns the index of addr in mapAddr, raises KeyError if there is none."""
+        i = bisect_left(self._mapAddr, addr)
+        if i == len(self._mapAddr) or self._mapAddr[i] != addr:
+            raise KeyError(addr)
+        return i
+
+    def get_refs(self, lo, hi):
+        """Returns line entry refs of all instructions in [lo, hi], in address order."""
+        i = bisect_left(self._mapAddr, lo)
+        j = bisect_right(self._mapAddr, hi)
+        low = self._low
+        return [low[k] for k in self._mapLine[i:j]]
+
+    def resolve_refs(self, rangesByKey):
+        """
+        Returns line entry refs of all instructions in the address ranges of
+        many keys (e.g., blocks), in one sweep over the address-sorted ranges.
 
-        # Read dwarf data.
-        self._read_data(path)
-        assert self._validate_data(), "Invalid dwarf data."
+        Args:
+            rangesByKey: Dict key -> list of address ranges (lo, hi).
+
+        Return:
+            Dict key -> set of line entry refs.
+        """
+        mapAddr, mapLine, low = self._mapAddr, self._mapLine, self._low
+        refs = {k: set() for k in rangesByKey}
+        i = 0
+        for lo, hi, k in sorted((r[0], r[1], k) for k, rs in rangesByKey.iteritems() for r in rs):
+            # Continue after the previous range, unless they overlap
+            if i > 0 and mapAddr[i - 1] >= lo:
+                i = 0
+            i = bisect_left(mapAddr, lo, i)
+            j = bisect_right(mapAddr, hi, i)
+            refs[k].update(low[m] for m in mapLine[i:j])
+            i = j
+        return refs
+
+    def get_ref(self, addr):
+        """Returns the line entry ref of the instruction at addr, raises KeyError if none."""
+        return self._low[self._mapLine[self._find(addr)]]
+
+    def get_lcds(self, lo, hi):
+        """
+        Returns (line, column, discriminator) of all instructions in [lo, hi],
+        in address order.
+        """
+        i = bisect_left(self._mapAddr, lo)
+        j = bisect_right(self._mapAddr, hi)
+        line, col, disc = self._line, self._col, self._disc
+        return [(line[k], col[k], disc[k]) for k in self._mapLine[i:j]]
+
+    def get_lcd(self, addr):
+        """Returns (line, column, discriminator) of the instruction at addr."""
+        k = self._mapLine[self._find(addr)]
+        return self._line[k], self._col[k], self._disc[k]
+
+    def get_entry(self, ref):
+        """Returns the line entry (as in LineInfoEntries) for the given ref, or None."""
+        i = bisect_left(self._low, ref)
+        if i == len(self._low) or self._low[i] != ref:
+            return None
+        return {
+            'CU': self._cu[i],
+            'LowPc': ref,
+            'HighPc': self._high[i],
+            'LineNumber': self._line[i],
+            'LineOffset': self._col[i],
+            'Discriminator': self._disc[i]
+        }
+
+
+class DieTree(object):
+    """
+    DIE tree stored as parallel arrays (parent, first child, next sibling),
+    indexed by node number, plus an index of nodes by tag. The root node has
+    offset 0 and tag 'root', its children are the CU DIEs.
+
+    All methods take and return DIE offsets. Children are kept in the order
+    in which their DIEs were added.
+
+    Args:
+        dies: List of DIEs as in the dwarf file, dicts {Offset, ParentOffset,
+              Tag, Attributes}.
+    """
+    NONE = -1
+
+    def __init__(self, dies=()):
+        self._offsets = array('l', [0])
+        self._tags = ['root']
+        self._attrs = [{}]
+        self._nodes = {0: 0}  # offset -> node
+        self._parent = array('l', [DieTree.NONE])
+        self._firstChild = array('l', [DieTree.NONE])
+        self._nextSibling = array('l', [DieTree.NONE])
+        self._lastChild = array('l', [DieTree.NONE])
+        self._tagIndex = {'root': [0]}
+        self.add_dies(dies)
+
+    def add_dies(self, dies):
+        """
+        Adds DIEs to the tree. Their parents must either be in the tree or be
+        added by the same call. DIEs already in the tree are skipped, but get
+        the given attributes (e.g. to complete a partially loaded DIE).
+        """
+        first = len(self._offsets)
+        parentOffsets = []
+        for die in dies:
+            i = self._nodes.get(die['Offset'], None)
+            if i is not None:
+                assert i < first and self._tags[i] == die['Tag'], "Invalid DIE."
+                self._attrs[i] = die['Attributes']
+                continue
+            self._nodes[die['Offset']] = len(self._offsets)
+            self._offsets.append(die['Offset'])
+            self._tags.append(die['Tag'])
+            self._attrs.append(die['Attributes'])
+            parentOffsets.append(die['ParentOffset'])
+
+        n = len(self._offsets) - first
+        for a in (self._parent, self._firstChild, self._nextSibling, self._lastChild):
+            a.extend(array('l', [DieTree.NONE]) * n)
+
+        roots = []
+        for i, pOffset in enumerate(parentOffsets, first):
+            p = self._nodes.get(pOffset, None)
+            assert p is not None, "Invalid DIE tree."
+            self._parent[i] = p
+            if self._lastChild[p] == DieTree.NONE:
+                self._firstChild[p] = i
+            else:
+                self._nextSibling[self._lastChild[p]] = i
+            self._lastChild[p] = i
+            if p < first:
+                roots.append(i)
+            self._tagIndex.setdefault(self._tags[i], []).append(i)
+
+        # Each new node has one parent, so the tree stays a tree iff all new
+        # nodes are reachable from nodes that were already in the tree.
+        assert sum(1 for r in roots for _ in self._iter_subtree(r)) == n, "Invalid DIE tree."
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __contains__(self, offset):
+        return offset in self._nodes
+
+    def _iter_children(self, i):
+        c = self._firstChild[i]
+        while c != DieTree.NONE:
+            yield c
+            c = self._nextSibling[c]
+
+    def _iter_subtree(self, i):
+        """Yields the nodes of the subtree rooted by node i in preorder."""
+        stack = [i]
+        while stack:
+            i = stack.pop()
+            yield i
+            c = self._firstChild[i]
+            children = []
+            while c != DieTree.NONE:
+                children.append(c)
+                c = self._nextSibling[c]
+            stack.extend(reversed(children))
+
+    def get_tag(self, offset):
+        return self._tags[self._nodes[offset]]
+
+    def get_attrs(self, offset):
+        return self._attrs[self._nodes[offset]]
+
+    def get_parent(self, offset):
+        """Returns the parent DIE offset, or None for the root."""
+        p = self._parent[self._nodes[offset]]
+        return self._offsets[p] if p != DieTree.NONE else None
+
+    def get_children(self, offset):
+        """Returns the offsets of the child DIEs."""
+        return [self._offsets[c] for c in self._iter_children(self._nodes[offset])]
+
+    def get_descendants(self, offset):
+        """Returns the offsets of all DIEs below the given one, in preorder."""
+        nodes = self._iter_subtree(self._nodes[offset])
+        next(nodes)  # skip offset itself
+        return [self._offsets[i] for i in nodes]
+
+    def get_dies_with_tag(self, tag):
+        """Returns the offsets of all DIEs with the given tag."""
+        return [self._offsets[i] for i in self._tagIndex.get(tag, [])]
+
+    def to_digraph(self):
+        """
+        Returns the tree as nx.DiGraph keyed by DIE offset, with node
+        attributes 'tag' and 'attrs' (e.g. for rendering).
+        """
+        dieTree = nx.DiGraph()
+        for i, offset in enumerate(self._offsets):
+            dieTree.add_node(offset, tag=self._tags[i], attrs=self._attrs[i])
+            if self._parent[i] != DieTree.NONE:
+                dieTree.add_edge(self._offsets[self._parent[i]], offset)
+        return dieTree
 
-        # Process dwarf data.
-        self._build_die_tree()
-        self._find_subprograms()
-        self._find_inlined_subroutines()
 
-        # Save LineInfoMap as SortedDict
-        self._dwLineMap = SortedDict({int(k): int(v)
-                                      for k, v in self._dwData['LineInfoMap'].iteritems()})
+class LineData(object):
+    """
+    Line info queries on a LineTable, shared by DwarfData and LineDebugData.
+
+    Args:
+        lineTable: LineTable.
+    """
+
+    def __init__(self, lineTable=None):
+        self._lineTable = lineTable
+
+    def get_line_entry(self, ref):
+        """
+        Returns the line entry (as in LineInfoEntries) for the given ref, or
+        None if there is no such entry.
+        """
+        return self._lineTable.get_entry(ref)
+
+    def get_line_table(self):
+        """Returns the line table (LineTable)."""
+        return self._lineTable
+
+    def set_line_table(self, lineTable):
+        """Answers all further line queries from lineTable (e.g. columnar.MappedLineTable)."""
+        self._lineTable = lineTable
 
     def get_dw_lines(self, ranges):
         """
@@ -54,12 +293,38 @@ class DwarfData(object):
         """
         dwLineIndices = []
         for r in ranges:
-            for dwl_i in self._dwLineMap.irange(minimum=r[0], maximum=r[1]):
-                dwLineIndices.append(self._dwLineMap[dwl_i])
+            dwLineIndices += self._lineTable.get_refs(r[0], r[1])
 
-        dwLines = {i: self._dwData['LineInfoEntries'][str(i)] for i in set(dwLineIndices)}
+        dwLines = {i: self.get_line_entry(i) for i in set(dwLineIndices)}
         return dwLines
 
+    def resolve_dw_lines(self, blockRanges):
+        """
+        Resolves the dwarf lines of many blocks at once, see get_dw_lines().
+
+        Args:
+            blockRanges: Dict block id -> list of address ranges.
+
+        Return:
+            Tuple (blockLines, lineBlocks) where
+                - blockLines : Dict block id -> dict of DwarfLine entries
+                               referenced by the block (as get_dw_lines())
+                - lineBlocks : Dict DwarfLine key -> set of block ids
+                               referencing it
+        """
+        blockLines = {}
+        lineBlocks = {}
+        entries = {}
+        for b, refs in self._lineTable.resolve_refs(blockRanges).iteritems():
+            dwLines = blockLines[b] = {}
+            for ref in refs:
+                entry = entries.get(ref, None)
+                if entry is None:
+                    entry = entries[ref] = self.get_line_entry(ref)
+                dwLines[ref] = entry
+                lineBlocks.setdefault(ref, set()).add(b)
+        return blockLines, lineBlocks
+
     def get_line_info(self, ranges):
         """
         Returns line info for the given address ranges.
@@ -83,62 +348,89 @@ class DwarfData(object):
         """
         assert isinstance(ranges, list)
 
+        def as_dict(lcd):
+            return {'l': lcd[0], 'c': lcd[1], 'd': lcd[2]}
+
         l_info = {
-            'begin': {},
-            'end': {},
-            'max': {},
-            'min': {}
+            'begin': as_dict(self._lineTable.get_lcd(ranges[0][0])),
+            'end': as_dict(self._lineTable.get_lcd(ranges[-1][-1])),
+            'max': None,
+            'min': None
         }
 
-        def get_lcd(dwlIndex):
-            dwl = self._dwData['LineInfoEntries'].get(str(dwlIndex), None)
-            if dwl is None:
-                assert False, "Invalid dwLine index."
-            return {
-                'l': int(dwl['LineNumber']),
-                'c': int(dwl['LineOffset']),
-                'd': int(dwl['Discriminator'])
-            }
+        # Tuples compare by line, then column, then discriminator
+        lcds = []
+        for r in ranges:
+            lcds += self._lineTable.get_lcds(r[0], r[1])
+        if lcds:
+            l_info['max'] = as_dict(max(lcds))
+            l_info['min'] = as_dict(min(lcds))
 
-        l_info['begin'] = get_lcd(self._dwLineMap[ranges[0][0]])
-        l_info['end'] = get_lcd(self._dwLineMap[ranges[-1][-1]])
+        return l_info
 
-        minLine = None
-        maxLine = None
-        for r in ranges:
-            for dwl_i in self._dwLineMap.irange(minimum=r[0], maximum=r[1]):
-                dwlIndex = self._dwLineMap[dwl_i]
-                lcd = get_lcd(dwlIndex)
-                if minLine is None and maxLine is None:
-                    minLine = lcd
-                    maxLine = lcd
-                    continue
 
-                # Max
-                if lcd['l'] > maxLine['l']:
-                    maxLine = lcd
-                elif lcd['l'] == maxLine['l']:
-                    if lcd['c'] > maxLine['c']:
-                        maxLine = lcd
-                    elif lcd['c'] == maxLine['c']:
-                        if lcd['d'] > maxLine['d']:
-                            maxLine = lcd
-
-                # Same for min...
-                if lcd['l'] < minLine['l']:
-                    minLine = lcd
-                elif lcd['l'] == minLine['l']:
-                    if lcd['c'] < minLine['c']:
-                        minLine = lcd
-                    elif lcd['c'] == minLine['c']:
-                        if lcd['d'] < minLine['d']:
-                            minLine = lcd
-
-        # Update min/max
-        l_info['max'] = maxLine
-        l_info['min'] = minLine
+class DwarfData(LineData):
+    """
+    Loads dwarf data from the given file.
 
-        return l_info
+    Data:
+        - DIEs: Apart from attributes, it also contains DIE offset as well as
+                parent DIE offset in order to build a tree. 
+        - LineInfoMap: Instruction address to LineInfoEntry
+        - LineInfoEntries: Map of entries containing line info
+
+    DIEs are loaded lazily per compilation unit, using the byte-offset index
+    of the dwarf file: initially only the CU DIEs and their subprogram DIEs
+    are decoded (enough to find subprograms), the remaining DIEs of a CU are
+    decoded when one of its subprograms is queried. If functions (collection
+    of subprogram names) is given, only CUs containing one of them are
+    considered for subprograms.
+
+    Alternatively, data can be given directly in the format of the 'Data' object
+    of the dwarf file (e.g. by elf_frontend), in which case path is ignored.
+
+    Line info is kept as LineTable. If lineTable (e.g. columnar.MappedLineTable)
+    is given, it is used instead and the LineInfoEntries/LineInfoMap objects of
+    the file are not decoded.
+
+    TODO: - Include DW_TAG_formal_parameter?
+    """
+
+    def __init__(self, path, functions=None, data=None, lineTable=None):
+        self._reader = None  # reader of the file while CUs are left to load
+        self._dwData = None
+        self._dieTree = None
+        self._cuSpans = None  # spans of CUs not loaded yet, None if all are loaded
+        self._cuOffsets = None
+        self._subDies = None
+        self._subprograms = None
+        self._inlSubroutines = {}
+        self._inlIndex = {}
+        self._subOrigins = {}
+        self._localVars = {}
+        self._byteSizes = {}
+        super(DwarfData, self).__init__(lineTable)
+
+        # Read dwarf data.
+        if data is not None:
+            self._dwData = {'Type': 'DebugInfo', 'Data': data}
+        else:
+            self._read_data(path, functions, withLines=lineTable is None)
+        assert self._validate_data(), "Invalid dwarf data."
+
+        # Process dwarf data.
+        self._build_die_tree()
+        self._find_subprograms()
+        if self._cuSpans is None:
+            self._find_inlined_subroutines(self._subDies)
+            self._find_local_variables(self._subDies)
+
+        # Convert line info to LineTable, drop the decoded objects
+        if self._lineTable is None:
+            self._lineTable = LineTable(self._dwData['LineInfoEntries'],
+                                        self._dwData['LineInfoMap'])
+        self._dwData['LineInfoEntries'] = {}
+        self._dwData['LineInfoMap'] = {}
 
     def get_subprograms(self):
         """
@@ -168,15 +460,14 @@ class DwarfData(object):
         assert dieOffset in self._subDies, "Invalid subprogram DIE offset."
 
         # Get parent DIE (CU)
-        cuDie = list(self._dieTree.predecessors(dieOffset))
-        assert len(cuDie) == 1, "Invalid DIE tree."
-        cuDie = cuDie[0]
+        cuDie = self._dieTree.get_parent(dieOffset)
+        assert cuDie is not None, "Invalid DIE tree."
 
         # Get the source file table associated with this CU. Use DW_AT_decl_file
         # index for retrieving the actual file.
 
         # FIXME: Return the actual file.
-        cuDieAttrs = self._dieTree.nodes[cuDie]['attrs']
+        cuDieAttrs = self._dieTree.get_attrs(cuDie)
         return cuDieAttrs['DW_AT_comp_dir'], cuDieAttrs['DW_AT_name']
 
     def get_inlined_subroutines(self, subDieOffset):
@@ -195,80 +486,134 @@ class DwarfData(object):
             subroutines.
         """
         assert subDieOffset in self._subDies
+        self._load_cu(subDieOffset)
         return self._inlSubroutines.get(subDieOffset, [])
 
+    def find_inlined_subroutine(self, subDieOffset, address):
+        """
+        Returns the inlined subroutine of the given subprogram that covers
+        address, or None.
+
+        Args:
+            subDieOffset: Valid subprogram DIE offset.
+            address:      Instruction address.
+
+        Note:
+          ** high_pc points at first byte after last instruction
+
+        Return:
+            Inlined subroutine of the form {dieOffset, low_pc, high_pc}, as in
+            get_inlined_subroutines().
+        """
+        assert subDieOffset in self._subDies
+        self._load_cu(subDieOffset)
+        if subDieOffset not in self._inlIndex:
+            return None
+        lows, inls = self._inlIndex[subDieOffset]
+        i = bisect_right(lows, address) - 1
+        if i < 0 or address >= inls[i]['high_pc']:
+            return None
+        return inls[i]
+
     def get_local_variables(self, subDieOffset):
         """
         Returns local variables given a subroutine DIE offset. The subroutine DIE
         may be a normal subroutine or an abstract instance root entry (part of 
         self._subDies).
         
-        Note:
-            SP register hardcoded for avr (fbreg28).
-        
         Args:
             subDieOffset: Offset of subprogram DIE containing variables.
         
         Return:
-            A dict keyed by variable offset in stack, with values of the form
-            {name, byteSize}.
+            A dict keyed by variable offset in stack (string), with values of
+            the form {name, byteSize}.
         """
+        return {str(v.offset): {'name': v.name, 'byteSize': v.byteSize}
+                for v in self.get_local_variable_table(subDieOffset)}
 
-        def get_locs(chDie):
+    def get_local_variable_table(self, subDieOffset):
+        """
+        Returns local variables given a subroutine DIE offset, see
+        get_local_variables().
+
+        Return:
+            List of LocalVariable, sorted by offset.
+        """
+        localVars = self._localVars.get(subDieOffset, None)
+        if localVars is None:
+            assert subDieOffset in self._subDies, \
+                "Invalid subprogram DIE offset."
+            self._load_cu(subDieOffset)
+            localVars = self._localVars[subDieOffset]
+        return localVars
+
+    def _find_local_variables(self, subDies):
+        """
+        Decodes the local variables of the given subprogram DIEs (of
+        self._subDies) once, into self._localVars keyed by subprogram DIE
+        offset (see get_local_variable_table).
+
+        Note:
+            SP register hardcoded for avr (fbreg28).
+        """
+
+        def get_locs(chAttrs):
             rx = re.compile(r'\[([^\]]+)\];')
-            return rx.findall(chDie['attrs']['DW_AT_location'])
+            return rx.findall(chAttrs['DW_AT_location'])
 
         def get_ops(loc):
             assert loc[-1] == ','
             return loc.split(',')[:-1]
 
-        assert subDieOffset in self._subDies, \
-            "Invalid subprogram DIE offset."
+        for subDieOffset in subDies:
+            localVars = {}
+
+            for s in self._dieTree.get_children(subDieOffset):
+                if self._dieTree.get_tag(s) != 'DW_TAG_variable':
+                    continue
+                chAttrs = self._dieTree.get_attrs(s)
+                if not {'DW_AT_name', 'DW_AT_location', 'DW_AT_type'} <= set(chAttrs.keys()):
+                    continue
+
+                locs = get_locs(chAttrs)
+                name = chAttrs['DW_AT_name']
 
-        localVars = {}
+                if len(locs) == 1:
+                    ops = get_ops(locs[0])
+                    if len(ops) == 1:
+                        o = ops[0].split(':')
+                        if len(o) == 2:
+                            k = o[0]
+                            v = o[1]
+                        else:
+                            continue
 
-        for s in self._dieTree.successors(subDieOffset):
-            chDie = self._dieTree.nodes[s]
-            if chDie['tag'] != 'DW_TAG_variable':
-                continue
-            if not {'DW_AT_name', 'DW_AT_location', 'DW_AT_type'} <= set(chDie['attrs'].keys()):
-                continue
+                        if k != 'DW_OP_breg28':
+                            continue
 
-            locs = get_locs(chDie)
-            name = chDie['attrs']['DW_AT_name']
-
-            if len(locs) == 1:
-                ops = get_ops(locs[0])
-                if len(ops) == 1:
-                    o = ops[0].split(':')
-                    if len(o) == 2:
-                        k = o[0]
-                        v = o[1]
-                    else:
-                        continue
-
-                    if k != 'DW_OP_breg28':
-                        continue
-
-                    # Get base type
-                    typeDieOffset = int(chDie['attrs']['DW_AT_type'])
-                    if not self._dieTree.has_node(typeDieOffset):
-                        continue
-                    bs = self._get_type_byte_size(typeDieOffset)
-                    localVars[v] = {'name': name, 'byteSize': bs}
+                        # Get base type
+                        typeDieOffset = int(chAttrs['DW_AT_type'])
+                        self._load_cu(typeDieOffset)
+                        if typeDieOffset not in self._dieTree:
+                            continue
+                        bs = self._get_type_byte_size(typeDieOffset)
+                        localVars[int(v)] = LocalVariable(int(v), bs, name)
 
-        return localVars
+            self._localVars[subDieOffset] = [localVars[o] for o in sorted(localVars)]
 
     def _get_type_byte_size(self, die):
-        """Decodes byte size for a DIE with tag DW_TAG_base_type."""
-        if not self._dieTree.has_node(die):
+        """Decodes byte size for a DIE with tag DW_TAG_base_type (once per DIE)."""
+        if die in self._byteSizes:
+            return self._byteSizes[die]
+        if die not in self._dieTree:
             assert False, "Invalid DIE offset."
 
-        die = self._dieTree.nodes[die]
-        assert die['tag'] == 'DW_TAG_base_type'
-        assert 'DW_AT_byte_size' in die['attrs'].keys()
+        assert self._dieTree.get_tag(die) == 'DW_TAG_base_type'
+        attrs = self._dieTree.get_attrs(die)
+        assert 'DW_AT_byte_size' in attrs.keys()
 
-        return self._decode_dwarf_constant(die['attrs']['DW_AT_byte_size'])[1]
+        bs = self._byteSizes[die] = self._decode_dwarf_constant(attrs['DW_AT_byte_size'])[1]
+        return bs
 
     def _decode_dwarf_constant(self, attr):
         """
@@ -288,130 +633,127 @@ class DwarfData(object):
         assert u >= 0
         return s, u
 
-    def _find_inlined_subroutines(self):
+    def _find_inlined_subroutines(self, subDies):
         """
-        Scans subtrees with roots in self._subDies for DIEs with tag 
+        Scans subtrees with roots in subDies (of self._subDies) for DIEs with tag 
         'DW_AT_inlined_subroutine'. Only inlined subroutines which
         have low_pc, high_pc are processed here. Nested inlining is not
         supported.
+
+        The subtrees are walked in one pre-order pass, carrying the surrounding
+        subroutine of each DIE on the stack.
         
         Note:
             Inlined subroutine DIEs are marked in self._inlSubroutines. This
             dict is keyed by subprogram DIE offset, where each value is a list 
             of inlined subroutines of the form {dieOffset, low_pc, high_pc}.
+            self._inlIndex holds the same entries sorted by low_pc, see
+            find_inlined_subroutine().
         
         Return:
             Void
         """
+        tree = self._dieTree
+        for s in subDies:
+            inls = []
+            # (die, surrounding subroutine), children in reverse to keep pre-order
+            stack = [(c, s) for c in reversed(tree.get_children(s))]
+            while stack:
+                die, inlined_into = stack.pop()
+                tag = tree.get_tag(die)
+                if tag == 'DW_TAG_inlined_subroutine':
+                    inls.append(self._get_inlined_subroutine_entry(die, inlined_into))
+                children = tree.get_children(die)
+                if children:
+                    sub = die if tag in SUBROUTINE else inlined_into
+                    stack.extend((c, sub) for c in reversed(children))
+
+            if inls:
+                self._inlSubroutines[s] = inls
+                inls = sorted(inls, key=lambda i: i['low_pc'])
+                self._inlIndex[s] = (array('l', [i['low_pc'] for i in inls]), inls)
+        if any(s in self._inlSubroutines for s in subDies):
+            log.warning("Support for inlining is experimental!")
 
-        def add_inl(die, node, subp):
-            """
-            Add the inlined subroutine to self._inlSubroutines. 'Decode' high_pc
-            if it represents an offset.
-            
-            Args:
-                die:  Die offset.
-                node: Die node is self._dieTree.
-                subp: Offset of subprogram DIE containing inlined node.
-            
-            Return:
-                Void.
-            """
-            assert subp in self._subDies
-
-            # Get range
-            lo_pc = int(node['attrs']['DW_AT_low_pc'])
-
-            if node['attrs']['DW_AT_high_pc'][0] == 'S':
-                # Decode dwarf constant
-                _, off = self._decode_dwarf_constant(node['attrs']['DW_AT_high_pc'])
-                hi_pc = lo_pc + off
+    def _get_inlined_subroutine_entry(self, die, inlined_into):
+        """
+        Checks an inlined subroutine DIE and returns its entry for
+        self._inlSubroutines. 'Decodes' high_pc if it represents an offset.
+
+        Note:
+            - Nested inlining not supported.
+            - DW_AT_ranges not supported.
+
+        Args:
+            die:          Inlined subroutine DIE offset.
+            inlined_into: Offset of the subroutine DIE surrounding die. Not
+                          necessarily the parent, there may be lexical scopes.
+
+        Return:
+            Dict {dieOffset, low_pc, high_pc}.
+        """
+        dAttrs = self._dieTree.get_attrs(die)
+        sub_into = self._get_subroutine_origin(inlined_into)
+        sub_myself = self._get_subroutine_origin(int(dAttrs['DW_AT_abstract_origin']))
+        log.info("Sub '{}' (die +{:x}) was inlined into '{}' (die +{:x})".format
+                 (sub_myself['DW_AT_name'], die, sub_into['DW_AT_name'], inlined_into))
+
+        if self._dieTree.get_tag(inlined_into) == 'DW_TAG_inlined_subroutine':
+            raise NotImplementedError("nested inlining @die offset {:x}".format(die))
+
+        # Check if it contains DW_AT_ranges
+        if 'DW_AT_ranges' in dAttrs:
+            raise NotImplementedError("Inlined subroutine not in contiguous range.")
+
+        assert {'DW_AT_low_pc', 'DW_AT_high_pc'} <= set(dAttrs.keys()), \
+            "Incorrect inlined subroutine DIE @0d{}".format(die)
+
+        lo_pc, hi_pc = self._get_pc_range(dAttrs)
+        return {
+            'dieOffset': die,
+            'low_pc': lo_pc,
+            'high_pc': hi_pc
+        }
+
+    def _get_pc_range(self, attrs):
+        """
+        Returns (low_pc, high_pc) of a DIE with the given attributes, 'decoding'
+        high_pc if it represents an offset.
+        """
+        lo_pc = int(attrs['DW_AT_low_pc'])
+        if attrs['DW_AT_high_pc'][0] == 'S':
+            # Decode dwarf constant
+            _, off = self._decode_dwarf_constant(attrs['DW_AT_high_pc'])
+            return lo_pc, lo_pc + off
+        return lo_pc, int(attrs['DW_AT_high_pc'])
+
+    def _get_subroutine_origin(self, offset):
+        """
+        Returns the attributes of the subroutine DIE at offset or, if it is
+        inlined, of its abstract origin. Resolved origins are memoized in
+        self._subOrigins.
+        """
+        attrs = self._subOrigins.get(offset, None)
+        if attrs is not None:
+            return attrs
+
+        chain = []
+        while attrs is None:
+            # Origin may be in another CU
+            self._load_cu(offset)
+            assert offset in self._dieTree, "DWARF data incomplete"
+            tag = self._dieTree.get_tag(offset)
+            assert tag in SUBROUTINE, "not a subprogram"
+            chain.append(offset)
+            if tag == 'DW_TAG_inlined_subroutine':
+                offset = int(self._dieTree.get_attrs(offset)['DW_AT_abstract_origin'])
+                attrs = self._subOrigins.get(offset, None)
             else:
-                hi_pc = int(node['attrs']['DW_AT_high_pc'])
-
-            # Update self._inlSubroutines
-            if subp not in self._inlSubroutines:
-                self._inlSubroutines[subp] = []
-
-            self._inlSubroutines[subp].append({
-                'dieOffset': die,
-                'low_pc': lo_pc,
-                'high_pc': hi_pc
-            })
-
-        def get_surrounding_sub(dnode):
-            """Walk up the tree and return next surrounding subroutine
-            Not necessarily the direct parent. There may be lexical scopes and other stuff.
-            """
-            n = dnode
-            try:
-                while n:
-                    n = next(iter(self._dieTree.predecessors(n)))
-                    dd = self._dieTree.nodes[n]
-                    if 'tag' in dd and dd['tag'] in SUBROUTINE:
-                        return n
-            except StopIteration:
-                pass
-            return None
+                attrs = self._dieTree.get_attrs(offset)
 
-        def get_sub_details(doff):
-            """Return dict with details of subroutine. If die is inlined, go to abstract origin"""
-            assert int(doff) in self._dieTree.nodes, "DWARF data incomplete"
-            # --
-            dd = self._dieTree.nodes[int(doff)]
-            assert dd['tag'] in SUBROUTINE, "not a subprogram"
-            if dd['tag'] == "DW_TAG_inlined_subroutine":
-                return get_sub_details(dd['attrs']['DW_AT_abstract_origin'])
-            return dd['attrs']
-
-        def test_die(die, subp):
-            """
-            Test if die is an inlined node, add it to self._inlSubroutines.
-
-            Note:
-                - Nested inlining not supported.
-                - DW_AT_ranges not supported.
-
-            Args:
-                die:  Die offset.
-                subp: Subprogram die offset.
-
-            Returns:
-                Void.
-            """
-            dNode = self._dieTree.nodes[die]
-            if dNode['tag'] == 'DW_TAG_inlined_subroutine':
-                inlined_into = int(get_surrounding_sub(die))
-                abstract_orig = int(dNode['attrs']['DW_AT_abstract_origin'])
-                assert inlined_into is not None, "Inlined sub without surrounding sub"
-                sub_into = get_sub_details(inlined_into)
-                sub_myself = get_sub_details(abstract_orig)
-                log.info("Sub '{}' (die +{:x}) was inlined into '{}' (die +{:x})".format
-                         (sub_myself['DW_AT_name'], die, sub_into['DW_AT_name'], inlined_into))
-
-                if self._dieTree.node[inlined_into]['tag'] == 'DW_TAG_inlined_subroutine':
-                    raise NotImplementedError("nested inlining @die offset {:x}".format(die))
-
-                # Check if it contains DW_AT_ranges
-                if 'DW_AT_ranges' in dNode['attrs']:
-                    raise NotImplementedError("Inlined subroutine not in contiguous range.")
-
-                assert {'DW_AT_low_pc', 'DW_AT_high_pc'} <= set(dNode['attrs'].keys()), \
-                    "Incorrect inlined subroutine DIE @0d{}".format(die)
-
-                # Add inlined subroutine
-                add_inl(die, dNode, subp)
-
-        def find_children(subt, root):
-            """Search the subtree rooted by subp recursively."""
-            for ch in self._dieTree.successors(subt):
-                test_die(ch, root)
-                find_children(ch, root)
-
-        for s in self._subDies:
-            find_children(s, s)
-        if self._inlSubroutines:
-            log.warning("Support for inlining is experimental!")
+        for o in chain:
+            self._subOrigins[o] = attrs
+        return attrs
 
     def _find_subprograms(self):
         """
@@ -453,75 +795,132 @@ class DwarfData(object):
         # DW_AT_name attributes.
         #
         # FIXME: Process all CU's after fixing self.get_subprogram_file()
-        cuDies = self._dieTree.successors(0)
+        cuDies = self._dieTree.get_children(0)
         for cu in cuDies:
-            cuAttrs = self._dieTree.nodes[cu]['attrs']
+            cuAttrs = self._dieTree.get_attrs(cu)
             if not {'DW_AT_name', 'DW_AT_comp_dir'} <= set(cuAttrs.keys()):
                 continue
 
             # Find subprogram DIE's that are children of current CU DIE
-            for s in self._dieTree.successors(cu):
-                die = self._dieTree.nodes[s]
-
-                if die['tag'] != 'DW_TAG_subprogram':
+            for s in self._dieTree.get_children(cu):
+                if self._dieTree.get_tag(s) != 'DW_TAG_subprogram':
                     continue
+                attrs = self._dieTree.get_attrs(s)
 
                 # Check if it has an abstract origin attribute -> concrete 
                 # out of line instance.
-                if 'DW_AT_abstract_origin' in die['attrs']:
+                if 'DW_AT_abstract_origin' in attrs:
                     # log.debug("Skipping subprog DIE @0d{}, concrete out-of-line
                     # instance".format(s))
                     continue
 
                 # Don't process abstract instance root entries here but note 
                 # them in self._subDies.
-                if 'DW_AT_inline' in die['attrs']:
+                if 'DW_AT_inline' in attrs:
                     log.debug("Subprog DIE @0d{} is an abstract instance root entry.".format(s))
                     self._subDies.append(s)
                     continue
 
-                if not {'DW_AT_low_pc'} <= set(die['attrs'].keys()):
+                if not {'DW_AT_low_pc'} <= set(attrs.keys()):
                     # a declaration
                     continue
 
-                if 'DW_AT_ranges' in die['attrs']:
+                if 'DW_AT_ranges' in attrs:
                     log.error("Skipping subprogram DIE @0d{}, contains DW_AT_ranges.".format(s))
                     continue
 
-                self._subprograms.update({int(die['attrs']['DW_AT_low_pc']):
-                                          {'name': die['attrs']['DW_AT_name'], 'dieOffset': s}})
+                self._subprograms.update({int(attrs['DW_AT_low_pc']):
+                                          {'name': attrs['DW_AT_name'], 'dieOffset': s}})
                 self._subDies.append(s)
 
     def _build_die_tree(self):
         """
-        Builds the die tree as nx.DiGraph. Children of the root node are 
-        Compilation Unit DIE's found in .debug_info section. Each node has
-        the following attributes:
-            - tag   : DW_TAG_*
-            - attrs : DW_AT_*
+        Builds the die tree (DieTree). Children of the root node are
+        Compilation Unit DIE's found in .debug_info section.
 
         Note:
             Nodes are keyed by DIE offset, the root node having offset 0.
         """
+        self._dieTree = DieTree(self._dwData['DIEs'])
+        self._dwData['DIEs'] = []  # now referenced by the tree
 
-        dieTree = nx.DiGraph()
-        dieTree.add_node(0, tag='root')
-
-        for die in self._dwData['DIEs']:
-            assert die['Offset'] != 0, "Invalid DIE."
-            # Add node
-            dieTree.add_node(die['Offset'], tag=die['Tag'], attrs=die['Attributes'])
-            # Add edge to parent
-            dieTree.add_edge(die['ParentOffset'], die['Offset'])
-
-        # Check if graph is indeed a tree, raise an error if not.
-        assert nx.is_tree(dieTree), "Invalid DIE tree."
-
-        self._dieTree = dieTree
+    def _load_cu(self, offset):
+        """
+        Decodes the remaining DIEs of the CU containing the DIE at offset (if
+        not done yet) and finds the inlined subroutines of its subprograms.
 
-    def _read_data(self, path):
-        with open(path, 'r') as fp:
-            self._dwData = json.load(fp)
+        Note:
+            If the file is compressed, the DIEs of all CUs left are decoded at
+            once, in file order, as seeking back to a CU decompresses the file
+            from its start again.
+        """
+        if not self._cuSpans:
+            return
+        i = bisect_right(self._cuOffsets, offset) - 1
+        if i < 0 or self._cuOffsets[i] not in self._cuSpans:
+            return
+        if self._reader.is_compressed():
+            cuOffsets = sorted(self._cuSpans)
+        else:
+            cuOffsets = [self._cuOffsets[i]]
+
+        for cuOffset in cuOffsets:
+            log.debug("Loading DIEs of CU @0d{}".format(cuOffset))
+            self._dieTree.add_dies(self._reader.read_json_array(self._cuSpans.pop(cuOffset)))
+        if not self._cuSpans:
+            self._reader.close()
+            self._reader = None
+        cuOffsets = set(cuOffsets)
+        subDies = [s for s in self._subDies if self._dieTree.get_parent(s) in cuOffsets]
+        self._find_inlined_subroutines(subDies)
+        self._find_local_variables(subDies)
+
+    def _read_data(self, path, functions=None, withLines=True):
+        index = load_debug_index(path)
+        self._reader = SpanReader(path)
+        self._cuSpans = {cu['dieOffset']: cu['span'] for cu in index['CUs']}
+        self._cuOffsets = sorted(self._cuSpans)
+
+        # Only decode CU headers (see _load_cu), of CUs defining requested subprograms
+        if functions is not None:
+            functions = set(functions)
+        dies = []
+        pcRanges = []
+        for cu in index['CUs']:
+            if functions is not None and functions.isdisjoint(cu['subprograms']):
+                continue
+            dies.append(cu['die'])
+            dies += cu['subprogramDies']
+            for die in cu['subprogramDies']:
+                attrs = die['Attributes']
+                if functions is None or attrs.get('DW_AT_name', None) not in functions:
+                    continue
+                if {'DW_AT_low_pc', 'DW_AT_high_pc'} <= set(attrs.keys()):
+                    lo, hi = self._get_pc_range(attrs)
+                    pcRanges.append((lo, hi - 1))
+                else:
+                    pcRanges.append((0, float('inf')))  # range unknown, read all line info
+
+        self._dwData = {
+            'Type': 'DebugInfo',
+            'Data': {
+                'DIEs': dies,
+                'LineInfoEntries': {},
+                'LineInfoMap': {}
+            }
+        }
+        if withLines and functions is not None:
+            # Only the line info of the requested subprograms
+            lineMap = self._reader.read_json_chunks(
+                select_chunks(index['LineInfoMapChunks'], pcRanges), '{}')
+            refs = {int(ref) for ref in lineMap.itervalues()}
+            spans = select_chunks(index['LineInfoEntryChunks'], ((r, r) for r in refs))
+            self._dwData['Data']['LineInfoEntries'] = self._reader.read_json_chunks(spans, '{}')
+            self._dwData['Data']['LineInfoMap'] = lineMap
+        elif withLines:
+            texts = self._reader.read([index['LineInfoEntries'], index['LineInfoMap']])
+            self._dwData['Data']['LineInfoEntries'] = json.loads(texts[0])
+            self._dwData['Data']['LineInfoMap'] = json.loads(texts[1])
 
     def _validate_data(self):
         status = False
@@ -541,3 +940,50 @@ class DwarfData(object):
             status = True
             break
         return status
+
+
+class LineDebugData(LineData):
+    """
+    Debug data consisting of line info and subprogram entry points only,
+    standing in for DwarfData when no DWARF is available (e.g. file/line
+    annotations of OTAWA's cfg.xml, see otawaflows.CFGReader). There are no
+    local variables and no inlined subroutines.
+
+    Subprograms are identified by their entry address, which takes the place
+    of the subprogram DIE offset in all queries.
+
+    Args:
+        subprograms: List of dicts {name, address, file}.
+        lineTable:   LineTable of all instructions.
+    """
+
+    def __init__(self, subprograms, lineTable):
+        super(LineDebugData, self).__init__(lineTable)
+        self._subprograms = {s['address']: {'name': s['name'], 'dieOffset': s['address']}
+                             for s in subprograms}
+        self._files = {s['address']: s['file'] for s in subprograms}
+
+    def get_subprograms(self):
+        """See DwarfData.get_subprograms()."""
+        return self._subprograms
+
+    def get_subprogram_file(self, dieOffset):
+        """Returns the file of the given subprogram as tuple (dir, filename)."""
+        assert dieOffset in self._files, "Invalid subprogram."
+        return os.path.split(self._files[dieOffset])
+
+    def get_inlined_subroutines(self, subDieOffset):
+        assert subDieOffset in self._subprograms
+        return []
+
+    def find_inlined_subroutine(self, subDieOffset, address):
+        assert subDieOffset in self._subprograms
+        return None
+
+    def get_local_variables(self, subDieOffset):
+        assert subDieOffset in self._subprograms
+        return {}
+
+    def get_local_variable_table(self, subDieOffset):
+        assert subDieOffset in self._subprograms
+        return []
@@ -0,0 +1,257 @@
+#
+# Reads symbols and debug info directly from an ELF file (requires pyelftools),
+# producing the same data as the json exporter of elf2flow (see
+# libbincfg/src/flow/JsonFlowExporter.cpp). Instructions and flows are still
+# taken from the flow file.
+#
+import logging
+from bisect import bisect_right
+
+try:
+    from elftools.elf.elffile import ELFFile
+    from elftools.dwarf.dwarf_expr import DWARFExprParser
+    from elftools.dwarf.locationlists import LocationEntry
+except ImportError:
+    ELFFile = None
+
+
+log = logging.getLogger(__name__)
+
+# DIEs exported by elf2flow. Subtrees rooted by other DIEs are skipped.
+VALID_TAGS = {'DW_TAG_subprogram', 'DW_TAG_inlined_subroutine', 'DW_TAG_variable',
+              'DW_TAG_compile_unit', 'DW_TAG_base_type', 'DW_TAG_lexical_block'}
+
+REF_FORMS = {'DW_FORM_ref1', 'DW_FORM_ref2', 'DW_FORM_ref4', 'DW_FORM_ref8',
+             'DW_FORM_ref_udata'}
+GLOBAL_REF_FORMS = {'DW_FORM_ref_addr', 'DW_FORM_ref_sig8', 'DW_FORM_sec_offset'}
+STRING_FORMS = {'DW_FORM_string', 'DW_FORM_strp', 'DW_FORM_line_strp', 'DW_FORM_strx',
+                'DW_FORM_strp_sup', 'DW_FORM_GNU_strp_alt'}
+DATA_FORMS = {'DW_FORM_data1': 8, 'DW_FORM_data2': 16, 'DW_FORM_data4': 32,
+              'DW_FORM_data8': 64}
+BLOCK_FORMS = {'DW_FORM_block1', 'DW_FORM_block2', 'DW_FORM_block4', 'DW_FORM_block'}
+
+
+def is_available():
+    """Returns True if pyelftools could be imported."""
+    return ELFFile is not None
+
+
+class ElfFile(object):
+    """
+    Symbols and debug info of an ELF file.
+
+    Args:
+        path: ELF file containing debug info (DWARF).
+    """
+
+    def __init__(self, path):
+        assert is_available(), "ELF frontend requires pyelftools."
+        self.path = path
+
+    def get_symbols(self, section='.text'):
+        """
+        Returns the symbols of the given section as list of dicts {Addr, Symbol},
+        as found in the SymbolMap of a flow file.
+        """
+        with open(self.path, 'rb') as fp:
+            elf = ELFFile(fp)
+            sectIdx = None
+            for i, sect in enumerate(elf.iter_sections()):
+                if sect.name == section:
+                    sectIdx = i
+                    break
+            assert sectIdx is not None, "No section {} in {}".format(section, self.path)
+
+            symtab = elf.get_section_by_name('.symtab')
+            assert symtab is not None, "No symbol table in {}".format(self.path)
+
+            symbols = {}
+            for sym in symtab.iter_symbols():
+                if sym['st_shndx'] != sectIdx or sym.name == '' or \
+                        sym['st_info']['type'] in ('STT_SECTION', 'STT_FILE'):
+                    continue
+                # Prefer functions over labels at the same address
+                addr = sym['st_value']
+                if addr not in symbols or sym['st_info']['type'] == 'STT_FUNC':
+                    symbols[addr] = sym.name
+        return [{'Addr': a, 'Symbol': s} for a, s in sorted(symbols.iteritems())]
+
+    def get_debug_data(self, insnAddrs):
+        """
+        Returns the debug data of the ELF file in the format of the 'Data'
+        object of a dwarf json file (see dwarf.DwarfData).
+
+        Args:
+            insnAddrs: Instruction addresses, for which LineInfoMap entries
+                       are generated.
+        """
+        with open(self.path, 'rb') as fp:
+            elf = ELFFile(fp)
+            assert elf.has_dwarf_info(), "No debug info in {}".format(self.path)
+            dwInfo = elf.get_dwarf_info()
+
+            data = {
+                'DIEs': [],
+                'LineInfoEntries': {},
+                'LineInfoMap': {},
+                'CompilationUnits': []
+            }
+            lines = {}
+            for cu in dwInfo.iter_CUs():
+                top = cu.get_top_DIE()
+                self._export_die(dwInfo, cu, top, 0, data['DIEs'])
+                # As in elf2flow, a later CU wins for equal addresses
+                lines.update(self._read_lines(dwInfo, cu, top.offset))
+
+            # Map instructions to the line entry containing them
+            lowPcs = sorted(lines.iterkeys())
+            for addr in insnAddrs:
+                i = bisect_right(lowPcs, addr) - 1
+                if i < 0:
+                    continue
+                entry = lines[lowPcs[i]]
+                if addr <= entry['HighPc']:
+                    data['LineInfoMap'][str(addr)] = str(entry['LowPc'])
+
+            data['LineInfoEntries'] = {str(k): v for k, v in lines.iteritems()}
+        return data
+
+    def _export_die(self, dwInfo, cu, die, parentOffset, dies):
+        """Appends die and its children (preorder) to dies, like exportDie() of elf2flow."""
+        if die.tag not in VALID_TAGS:
+            return
+
+        attrs = {}
+        for name, attr in die.attributes.iteritems():
+            if not isinstance(name, str) or not name.startswith('DW_AT_'):
+                continue  # unknown attribute
+            value = self._attr_as_string(dwInfo, cu, name, attr)
+            if value is not None:
+                attrs[name] = value
+
+        dies.append({
+            'Offset': die.offset,
+            'ParentOffset': parentOffset,
+            'Tag': die.tag,
+            'IsValid': True,
+            'Attributes': attrs
+        })
+        for child in die.iter_children():
+            self._export_die(dwInfo, cu, child, die.offset, dies)
+
+    def _attr_as_string(self, dwInfo, cu, name, attr):
+        """
+        Returns the attribute value in the format of elf2flow, or None if the
+        form is not supported there.
+        """
+        if name == 'DW_AT_location':
+            return self._location_as_string(dwInfo, cu, attr)
+        if name == 'DW_AT_ranges':
+            return self._ranges_as_string(dwInfo, cu, attr)
+
+        form = attr.form
+        if form in REF_FORMS:
+            return str(attr.value + cu.cu_offset)
+        if form in GLOBAL_REF_FORMS:
+            return str(attr.value)
+        if form == 'DW_FORM_addr':
+            return str(attr.value)
+        if form in STRING_FORMS:
+            return attr.value
+        if form in DATA_FORMS:
+            bits = DATA_FORMS[form]
+            u = attr.value
+            s = u - (1 << bits) if u & (1 << (bits - 1)) else u
+            return "S_{}_U_{}".format(s, u)
+        if form == 'DW_FORM_sdata':
+            return "S_{}".format(attr.value)
+        if form == 'DW_FORM_udata':
+            return "U_{}".format(attr.value)
+        if form in BLOCK_FORMS:
+            return "".join("{:02x} ".format(b) for b in attr.value)
+        if form == 'DW_FORM_exprloc':
+            return "Found Exprloc FORM." + "".join("{:02x} ".format(b) for b in attr.value)
+        return None
+
+    def _location_as_string(self, dwInfo, cu, attr):
+        """Location expressions as '[op,op,];' per location entry."""
+        parser = DWARFExprParser(cu.structs)
+        if attr.form in ('DW_FORM_exprloc', 'DW_FORM_block1', 'DW_FORM_block2',
+                         'DW_FORM_block4', 'DW_FORM_block'):
+            exprs = [attr.value]
+        else:
+            locList = dwInfo.location_lists().get_location_list_at_offset(attr.value)
+            exprs = [e.loc_expr for e in locList if isinstance(e, LocationEntry)]
+        if not exprs:
+            return "NO_ENTRIES"
+
+        return "".join("[{}];".format("".join(self._op_as_string(op) + ","
+                                              for op in parser.parse_expr(expr)))
+                       for expr in exprs)
+
+    @staticmethod
+    def _op_as_string(op):
+        """Location operation, as DwarfOperator::getOpAsString() of elf2flow."""
+        name = op.op_name
+        if name in ('DW_OP_addr', 'DW_OP_piece', 'DW_OP_fbreg') or \
+                name.startswith('DW_OP_breg') and name != 'DW_OP_bregx':
+            return "{}:{}".format(name, op.args[0])
+        if name.startswith('DW_OP_reg') and name != 'DW_OP_regx' or name.startswith('DW_OP_lit'):
+            return name
+        if name == 'DW_OP_regx':
+            return "{}{}".format(name, op.args[0])
+        if name == 'DW_OP_bregx':
+            return "{}{}:{}".format(name, op.args[0], op.args[1])
+        return "NOT_IMPLEMENTED"
+
+    @staticmethod
+    def _ranges_as_string(dwInfo, cu, attr):
+        """
+        Range list as '[begin,end];' per entry, including base address
+        selections and the end of list entry, as returned by libdwarf.
+        """
+        rangeLists = dwInfo.range_lists()
+        if rangeLists is None:
+            return "NO_ENTRIES"
+        entries = rangeLists.get_range_list_at_offset(attr.value)
+        maxAddr = (1 << (8 * cu['address_size'])) - 1
+        ranges = [(e.begin_offset, e.end_offset) if hasattr(e, 'begin_offset')
+                  else (maxAddr, e.base_address) for e in entries]
+        return "".join("[{},{}];".format(*r) for r in ranges + [(0, 0)])
+
+    @staticmethod
+    def _read_lines(dwInfo, cu, cuOffset):
+        """
+        Returns the line table of cu, keyed by low pc. As in elf2flow, the
+        first row of the CU wins for equal addresses, and high pc is the last
+        address before the next row (or end of sequence).
+        """
+        lines = {}
+        lineProg = dwInfo.line_program_for_CU(cu)
+        if lineProg is None:
+            return lines
+
+        prev = None
+        for entry in lineProg.get_entries():
+            state = entry.state
+            if state is None:
+                continue
+            if prev is not None and state.address != prev['LowPc']:
+                prev['HighPc'] = state.address - 1
+            if state.end_sequence:
+                prev = None
+                continue
+            if state.address in lines:
+                prev = lines[state.address]
+                continue
+
+            prev = {
+                'CU': cuOffset,
+                'LowPc': state.address,
+                'HighPc': state.address,
+                'LineNumber': state.line,
+                'LineOffset': state.column,
+                'Discriminator': state.discriminator
+            }
+            lines[state.address] = prev
+        return lines
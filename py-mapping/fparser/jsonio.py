@@ -0,0 +1,482 @@
+#
+# Streaming readers for the JSON inputs and byte-offset sidecar indices.
+#
+# An index maps function names (main.json), compilation units (debug.json)
+# or (file, subprogram) keys (source csv) to byte spans in the input file, so
+# that single objects can be decoded without reading the rest. Large arrays
+# and objects (instructions, line info) are indexed in chunks of CHUNK_SIZE
+# members, keyed by their address range. Indices are written next to the
+# input as '<input>.idx' on first load and rebuilt when the input changes.
+#
+# All inputs may be compressed (.gz, .bz2, .xz), see open_input().
+#
+import logging
+import json
+import os
+import re
+import gzip
+import bz2
+from bisect import bisect_right
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+
+log = logging.getLogger(__name__)
+
+INDEX_SUFFIX = '.idx'
+INDEX_VERSION = 3
+CHUNK_SIZE = 512
+
+# Extensions of the inputs decompressed on the fly, see open_input()
+COMPRESSED_EXTS = ('.gz', '.bz2', '.xz')
+
+_decoder = json.JSONDecoder()
+
+
+def open_input(path):
+    """
+    Opens an input file for reading, decompressing it on the fly if its name
+    ends with .gz, .bz2 or .xz (the latter requires backports.lzma).
+
+    Note:
+        Compressed files support seek(), but every seek decompresses the file
+        up to the target offset. Byte offsets (e.g. of indices) always refer to
+        the decompressed data.
+    """
+    ext = os.path.splitext(path)[1]
+    if ext == '.gz':
+        return gzip.open(path, 'rb')
+    if ext == '.bz2':
+        return bz2.BZ2File(path, 'r')
+    if ext == '.xz':
+        assert lzma is not None, "Reading .xz files requires backports.lzma."
+        return lzma.LZMAFile(path, 'r')
+    return open(path, 'r')
+
+
+def iter_json_objs(jsonPath, jsonSplit, chunkSize=1 << 20):
+    """
+    Yields the top-level json objects of the given file one at a time.
+
+    The file is read in chunks of chunkSize bytes and each object is decoded
+    as soon as its trailing jsonSplit separator (or EOF) has been read, so
+    memory is bounded by the largest single object rather than the file size.
+
+    Note:
+        Invalid objects are logged and skipped.
+    """
+    for _, _, obj in iter_json_spans(jsonPath, jsonSplit, chunkSize):
+        yield obj
+
+
+def iter_json_spans(jsonPath, jsonSplit, chunkSize=1 << 20):
+    """
+    Same as iter_json_objs, but yields tuples (begin, end, obj) where begin
+    and end are the byte offsets of the object in the file.
+    """
+    decoder = json.JSONDecoder()
+
+    def decode(buf, begin, end):
+        """Decode buf[begin:end], return (obj, objBegin, objEnd) or None."""
+        while begin < end and buf[begin].isspace():
+            begin += 1
+        if begin == end:
+            return None
+        try:
+            obj, objEnd = decoder.raw_decode(buf, begin)
+        except ValueError:
+            obj, objEnd = None, begin
+        if obj is None or buf[objEnd:end].strip() != '':
+            log.error("Encountered an invalid json object.")
+            return None
+        return obj, begin, objEnd
+
+    with open_input(jsonPath) as fpJson:
+        buf = ''
+        bufOffset = 0  # file offset of buf[0]
+        scanFrom = 0
+        while True:
+            chunk = fpJson.read(chunkSize)
+            buf += chunk
+            begin = 0
+            while True:
+                sepIdx = buf.find(jsonSplit, scanFrom)
+                if sepIdx < 0:
+                    break
+                dec = decode(buf, begin, sepIdx)
+                if dec is not None:
+                    yield bufOffset + dec[1], bufOffset + dec[2], dec[0]
+                begin = scanFrom = sepIdx + len(jsonSplit)
+
+            # Drop consumed objects, keep looking for the separator where we stopped
+            buf = buf[begin:]
+            bufOffset += begin
+            scanFrom = max(0, len(buf) - len(jsonSplit) + 1)
+            if not chunk:
+                break
+
+        dec = decode(buf, 0, len(buf))
+        if dec is not None:
+            yield bufOffset + dec[1], bufOffset + dec[2], dec[0]
+
+
+class SpanReader(object):
+    """
+    Reads byte spans [begin, end) of a file through one handle, which is
+    opened on first use and kept until close(). The spans of each call are
+    read in file order, so a compressed file (where a backward seek
+    decompresses it from the start again) is passed at most once per call.
+
+    Note:
+        A reader can be pickled (without its handle). A forked process opens
+        its own handle, as the file position of an inherited one is shared.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fp = None
+        self._pid = None
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._fp is not None and self._pid == os.getpid():
+            self._fp.close()
+        self._fp = None
+
+    def is_compressed(self):
+        """Returns True if the file is decompressed on the fly, see open_input()."""
+        return os.path.splitext(self.path)[1] in COMPRESSED_EXTS
+
+    def iter_spans(self, spans):
+        """Yields (k, text) of the k-th of the given spans, in file order."""
+        if self._fp is None or self._pid != os.getpid():
+            self._fp = open_input(self.path)
+            self._pid = os.getpid()
+        for k in sorted(xrange(len(spans)), key=lambda k: spans[k][0]):
+            begin, end = spans[k]
+            self._fp.seek(begin)
+            yield k, self._fp.read(end - begin)
+
+    def read(self, spans):
+        """Returns the text of each of the given spans."""
+        texts = [None] * len(spans)
+        for k, text in self.iter_spans(spans):
+            texts[k] = text
+        return texts
+
+    def read_json(self, span):
+        """Decodes the json value found at the given span."""
+        return json.loads(self.read([span])[0])
+
+    def read_json_array(self, span):
+        """Decodes a span of comma-separated json values (a slice of an array) as list."""
+        return json.loads('[' + self.read([span])[0] + ']')
+
+    def read_json_chunks(self, spans, brackets='[]'):
+        """
+        Decodes chunks (see select_chunks) of a json array as one list, or of a
+        json object as one dict if brackets is '{}'.
+        """
+        return json.loads(brackets[0] + ','.join(self.read(spans)) + brackets[1])
+
+
+def read_json_span(jsonPath, span):
+    """Decodes the json value found at byte span [begin, end) of the given file."""
+    with SpanReader(jsonPath) as reader:
+        return reader.read_json(span)
+
+
+def read_json_array_span(jsonPath, span):
+    """Decodes a span of comma-separated json values (a slice of an array) as list."""
+    with SpanReader(jsonPath) as reader:
+        return reader.read_json_array(span)
+
+
+def read_spans(path, spans):
+    """Returns the text of each byte span [begin, end) of the given file, opening it once."""
+    with SpanReader(path) as reader:
+        return reader.read(spans)
+
+
+def read_json_chunks(jsonPath, spans, brackets='[]'):
+    """See SpanReader.read_json_chunks()."""
+    with SpanReader(jsonPath) as reader:
+        return reader.read_json_chunks(spans, brackets)
+
+
+def select_chunks(chunks, ranges, neighbours=0):
+    """
+    Returns the spans of the chunks whose key range overlaps one of the given
+    ranges, in file order.
+
+    Args:
+        chunks:     List of chunks [lo, hi, begin, end], as in the indices.
+        ranges:     Iterable of inclusive key (address) ranges (lo, hi).
+        neighbours: Number of adjacent chunks to select on either side of each
+                    selected chunk, e.g. to find the instruction following a
+                    range.
+    """
+    ranges = sorted(ranges)
+    los = [r[0] for r in ranges]
+    maxHis = []  # max hi of ranges[:k+1]
+    for r in ranges:
+        maxHis.append(max(r[1], maxHis[-1]) if maxHis else r[1])
+
+    selected = set()
+    for k, (lo, hi, _, _) in enumerate(chunks):
+        n = bisect_right(los, hi)
+        if n > 0 and maxHis[n - 1] >= lo:
+            selected.update(xrange(max(0, k - neighbours), min(len(chunks), k + neighbours + 1)))
+    return [chunks[k][2:] for k in sorted(selected)]
+
+
+def _find_value(text, key, opening):
+    """Returns the position of the value (starting with opening) of key in text."""
+    m = re.search(r'"{}"\s*:\s*\{}'.format(key, opening), text)
+    assert m is not None, "Invalid json data, missing '{}'.".format(key)
+    return m.end() - 1
+
+
+def _skip_ws(text, pos):
+    while text[pos].isspace():
+        pos += 1
+    return pos
+
+
+def _chunk_members(text, pos, key_of, offset=0):
+    """
+    Splits the members of the json array or object at text[pos] into chunks
+    of CHUNK_SIZE members.
+
+    Args:
+        key_of: Returns the key (e.g. address) of a member, which is the
+                value for arrays and the tuple (name, value) for objects.
+        offset: File offset of text[0].
+
+    Return:
+        List of chunks [lo, hi, begin, end], where lo and hi are the min and
+        max key of the members and [begin, end) the file span of the members
+        (without brackets).
+    """
+    isObject = text[pos] == '{'
+    closing = '}' if isObject else ']'
+    chunks = []
+    n = 0
+    pos = _skip_ws(text, pos + 1)
+    while text[pos] != closing:
+        if isObject:
+            name, end = _decoder.raw_decode(text, pos)
+            end = _skip_ws(text, end)
+            assert text[end] == ':', "Invalid json object."
+            value, end = _decoder.raw_decode(text, _skip_ws(text, end + 1))
+            key = key_of((name, value))
+        else:
+            value, end = _decoder.raw_decode(text, pos)
+            key = key_of(value)
+
+        if n % CHUNK_SIZE == 0:
+            chunks.append([key, key, offset + pos, offset + end])
+        else:
+            chunk = chunks[-1]
+            chunk[0] = min(chunk[0], key)
+            chunk[1] = max(chunk[1], key)
+            chunk[3] = offset + end
+        n += 1
+
+        pos = _skip_ws(text, end)
+        if text[pos] == ',':
+            pos = _skip_ws(text, pos + 1)
+    return chunks
+
+
+def load_flow_index(jsonPath, jsonSplit):
+    """
+    Returns the index of a binary flow file (main.json), building and saving
+    it first if there is no valid sidecar file.
+
+    Return:
+        Dict {'Flows': {name: span}, 'InsnMap': span, 'SymbolMap': span,
+              'InsnSection': section, 'InsnChunks': chunks},
+        where span is [begin, end) in bytes and chunks (see _chunk_members)
+        cover the instructions of the instruction map, keyed by address.
+        Missing objects have span None.
+    """
+    def build():
+        index = {'Flows': {}, 'InsnMap': None, 'SymbolMap': None, 'InsnSection': None,
+                 'InsnChunks': []}
+        for begin, end, jObj in iter_json_spans(jsonPath, jsonSplit):
+            if not isinstance(jObj, dict):
+                continue
+            typ = jObj.get('Type', None)
+            if typ == 'Flow' and 'Name' in jObj:
+                index['Flows'][jObj['Name']] = [begin, end]
+            elif typ in ('InsnMap', 'SymbolMap'):
+                index[typ] = [begin, end]
+                if typ == 'InsnMap':
+                    index['InsnSection'] = jObj.get('Section', None)
+
+        if index['InsnMap'] is not None:
+            begin = index['InsnMap'][0]
+            text = read_spans(jsonPath, [index['InsnMap']])[0]
+            index['InsnChunks'] = _chunk_members(text, _find_value(text, 'Instructions', '['),
+                                                 lambda i: i['Addr'], begin)
+        return index
+
+    return _load_index(jsonPath, build)
+
+
+def load_debug_index(jsonPath):
+    """
+    Returns the index of a dwarf file (debug.json), building and saving it
+    first if there is no valid sidecar file.
+
+    Note:
+        DIEs are exported in preorder, hence the DIEs of one compilation unit
+        form a contiguous block of the 'DIEs' array.
+
+    Return:
+        Dict {'CUs': [{'dieOffset', 'span', 'die', 'subprograms', 'subprogramDies'}],
+              'LineInfoEntries': span, 'LineInfoMap': span,
+              'LineInfoEntryChunks': chunks, 'LineInfoMapChunks': chunks},
+        where 'die' is the CU DIE, 'subprogramDies' are its subprogram child
+        DIEs (the header of the CU) and 'subprograms' lists their names.
+        Chunks (see _chunk_members) of both line info objects are keyed by
+        the address of their members.
+    """
+    def build():
+        with open_input(jsonPath) as fp:
+            text = fp.read()
+
+        index = {'CUs': []}
+        for key in ('LineInfoEntries', 'LineInfoMap'):
+            begin = _find_value(text, key, '{')
+            _, end = _decoder.raw_decode(text, begin)
+            index[key] = [begin, end]
+        index['LineInfoEntryChunks'] = _chunk_members(
+            text, index['LineInfoEntries'][0], lambda m: int(m[0]))
+        index['LineInfoMapChunks'] = _chunk_members(
+            text, index['LineInfoMap'][0], lambda m: int(m[0]))
+
+        cu = None
+        pos = _skip_ws(text, _find_value(text, 'DIEs', '[') + 1)
+        while text[pos] != ']':
+            die, end = _decoder.raw_decode(text, pos)
+            if die['ParentOffset'] == 0:
+                cu = {'dieOffset': die['Offset'], 'span': [pos, end], 'die': die,
+                      'subprograms': [], 'subprogramDies': []}
+                index['CUs'].append(cu)
+            assert cu is not None, "Invalid DIE tree."
+            cu['span'][1] = end
+            if die['ParentOffset'] == cu['dieOffset'] and die['Tag'] == 'DW_TAG_subprogram':
+                cu['subprogramDies'].append(die)
+                name = die['Attributes'].get('DW_AT_name', None)
+                if name is not None:
+                    cu['subprograms'].append(name)
+            pos = _skip_ws(text, end)
+            if text[pos] == ',':
+                pos = _skip_ws(text, pos + 1)
+        return index
+
+    return _load_index(jsonPath, build)
+
+
+def iter_csv_obj_spans(text, objSplit):
+    """
+    Yields (begin, end) of the non-empty objects in text, which are separated
+    by objSplit (same objects as load_csv_objs).
+    """
+    begin = 0
+    while begin <= len(text):
+        end = text.find(objSplit, begin)
+        if end < 0:
+            end = len(text)
+        if end > begin:
+            yield begin, end
+        begin = end + len(objSplit)
+
+
+def index_csv_objs(text, objSplit, get_key):
+    """
+    Returns the header line and the spans of the csv objects in text,
+    validating that all objects share the same header.
+
+    Args:
+        get_key: Returns the key (a list, e.g. [file, subprogram]) of an
+                 object, given the header line and the last line of the object.
+
+    Return:
+        Tuple (header, objects), where objects is a list of key + [begin, end].
+    """
+    hLine = None
+    objs = []
+    for begin, end in iter_csv_obj_spans(text, objSplit):
+        hEnd = text.find('\n', begin, end)
+        assert hEnd >= 0, "Csv object is empty."
+        if hLine is None:
+            hLine = text[begin:hEnd]
+        else:
+            assert hEnd - begin == len(hLine) and text.startswith(hLine, begin), \
+                "Csv objects with different headers."
+        lastLine = text[text.rfind('\n', begin, end) + 1:end]
+        objs.append(list(get_key(hLine, lastLine)) + [begin, end])
+    return hLine, objs
+
+
+def load_csv_index(csvPath, objSplit, get_key):
+    """
+    Returns the index of a source flow file (csv), building and saving it
+    first if there is no valid sidecar file.
+
+    Return:
+        Dict {'Header': header, 'Objects': objects}, see index_csv_objs().
+    """
+    def build():
+        with open_input(csvPath) as fp:
+            text = fp.read()
+        hLine, objs = index_csv_objs(text, objSplit, get_key)
+        return {'Header': hLine, 'Objects': objs}
+
+    return _load_index(csvPath, build)
+
+
+def _load_index(path, build):
+    """Returns the sidecar index of path if it is up to date, else builds and saves one."""
+    idxPath = path + INDEX_SUFFIX
+    st = os.stat(path)
+    stamp = {'Version': INDEX_VERSION, 'Size': st.st_size, 'MTime': st.st_mtime}
+
+    try:
+        with open(idxPath, 'r') as fp:
+            idx = json.load(fp)
+        if all(idx.get(k, None) == v for k, v in stamp.iteritems()):
+            return idx['Index']
+        log.info("Index {} is outdated, rebuilding.".format(idxPath))
+    except (IOError, ValueError):
+        pass
+
+    log.info("Building index for {}".format(path))
+    index = build()
+    stamp['Index'] = index
+    try:
+        with open(idxPath, 'w') as fp:
+            json.dump(stamp, fp)
+    except (IOError, OSError) as e:
+        log.warning("Could not write index file {}: {}".format(idxPath, e))
+    return index
@@ -7,6 +7,7 @@ import xml.etree.ElementTree as XET
 import os
 import logging
 import networkx as nx
+import dwarf as dw
 
 
 log = logging.getLogger(__name__)
@@ -54,6 +55,7 @@ class CFGReader(object):
         self._calls = {}  # dict: tuple(Flow id,bbid) -> Flow id
         self._origid2flow = {}  # dict: OTAWA id -> Flow
         self._origid2bb = {}  # dict: OTAWA id -> BasicBlock
+        self._insnLines = {}  # dict: insn address -> (file, line)
         self._xml_root = None
 
         if filename is not None:
@@ -85,6 +87,34 @@ class CFGReader(object):
     def getFlows(self):
         return [f for num, f in self._origid2flow.iteritems()]
 
+    def get_debug_data(self):
+        """
+        Returns the file/line annotations of the instructions as
+        dwarf.LineDebugData, which can be used in place of dwarf.DwarfData.
+
+        Consecutive instructions on the same line form one line entry (no
+        columns or discriminators), each file counts as a CU.
+        """
+        files = {}
+        entries = {}
+        lineMap = {}
+        prev = None
+        for addr in sorted(self._insnLines):
+            fil, line = self._insnLines[addr]
+            cu = files.setdefault(fil, len(files))
+            if prev is not None and prev['CU'] == cu and prev['LineNumber'] == line:
+                prev['HighPc'] = addr
+            else:
+                prev = {'CU': cu, 'LowPc': addr, 'HighPc': addr, 'LineNumber': line,
+                        'LineOffset': 0, 'Discriminator': 0}
+                entries[str(addr)] = prev
+            lineMap[str(addr)] = str(prev['LowPc'])
+
+        subprograms = [{'name': f.name, 'address': f.address, 'file': f.file}
+                       for f in self.getFlows() if f.file is not None]
+        log.info("Line info of {} instructions in {} files".format(len(lineMap), len(files)))
+        return dw.LineDebugData(subprograms, dw.LineTable(entries, lineMap))
+
     def _resolve_calls(self):
         """re-assign all IDs to be numbers, instead of strings"""
         log.info("Resolving calls...")
@@ -143,6 +173,8 @@ class CFGReader(object):
             if raw is not None:
                 asm.append(raw.text)
             line = int(insn.get('line', 0))
+            if insn.get('file') is not None and line > 0:
+                self._insnLines[addr] = (insn.get('file'), line)
             if numInsn == 0:
                 BL = line
                 EL = line
@@ -380,9 +380,21 @@ class ICache(Cache):
                 return LBlock(bbobj, addr=addr, block=self.blockof(addr),
                               cset=self.lbsets[self.setof(addr)])
 
+            # cache-line span of the BB, from the block summary of the flow
+            addrSpan = bFlow.get_block_summary(binbb.ID).addrSpan
+            if addrSpan is None:
+                return
+            if self.blockof(addrSpan[0]) == self.blockof(addrSpan[1]):
+                # within one cache line: a single l-block at the first insn
+                instaddr = next(bFlow.iter_insn_addresses(binbb.ID))
+                lb = make_lblock(bbb, instaddr)
+                bbb.lblocks.append(lb)
+                self.lbsets[self.setof(instaddr)].lblocks.add(lb)
+                return
+
             # iterate over insn and create l-blocks. XXX: important: in instruction order
             last_set = None
-            for instaddr, inst in bFlow.instructions(binbb.ID):
+            for instaddr in bFlow.iter_insn_addresses(binbb.ID):
                 # XXX: this assumes no unaligned access for instructions, which is true on ARM
                 cur_set = self.setof(instaddr)
                 if cur_set != last_set:  # l-blocks change together with cache set
@@ -1,6 +1,10 @@
 import logging
+import logging.handlers
+import multiprocessing
 import coloredlogs
 import argparse
+import gc
+import os
 import os.path
 import tempfile
 import sys
@@ -19,6 +23,44 @@ lvl = 'DEBUG'
 coloredlogs.install(level=lvl, fmt='[ %(levelname)s ] <%(name)s> %(message)s')
 log = logging.getLogger(__file__)
 
+# State shared with pool workers, set before forking (see main)
+_worker_ctx = None
+
+# Max. number of log records a pool task buffers, see _TaskLogHandler
+LOG_BUFFER_SIZE = 4096
+
+
+class _TaskLogHandler(logging.handlers.BufferingHandler):
+    """
+    Buffers the log records of one pool task and emits them at once to the
+    given handlers, so that the log of parallel jobs stays readable. A full
+    buffer is emitted early, which bounds its size.
+
+    Args:
+        handlers: Handlers to emit to (those of the root logger).
+        lock:     Lock shared by all workers, held while emitting.
+    """
+
+    def __init__(self, handlers, lock, capacity=LOG_BUFFER_SIZE):
+        logging.handlers.BufferingHandler.__init__(self, capacity)
+        self._targets = handlers
+        self._outputLock = lock
+        if handlers:
+            # Records no handler would emit are not buffered
+            self.setLevel(min(h.level for h in handlers))
+
+    def flush(self):
+        self.acquire()
+        try:
+            with self._outputLock:
+                for record in self.buffer:
+                    for h in self._targets:
+                        if record.levelno >= h.level:
+                            h.handle(record)
+            self.buffer = []
+        finally:
+            self.release()
+
 
 def _get_last_precise_map(final_map):
     """search for the last precise mapping step in the pipeline"""
@@ -233,10 +275,109 @@ def do_render_mapping(bFlow, sFlow, hierarchical_map, annot_file):
                                'constraint', 'begin', 'end', 'min', 'max', 'time', 'calls'))
 
 
+def map_pair(exe, args, annot_file, i):
+    """
+    Maps the i-th flow pair of exe and writes its reports.
+
+    With args.incremental, the pair is skipped if its fingerprint matches the
+    one stored with its outputs by a previous run.
+
+    Return:
+        Tuple (name, mapped, stats, reused), where stats is either None or a
+        tuple (graphs, total, mapped) of the last precise map.
+    """
+    annot_func = None
+    name = exe.get_flow_pair_name(i)
+    if annot_file is not None and name in annot_file:
+        annot_func = annot_file[name]
+
+    fingerprint = None
+    if args.incremental:
+        options = [args.mapper, args.hom_order, args.trust_dbg_info, annot_func]
+        fingerprint = exe.get_flow_pair_fingerprint(i, options)
+        prev = report.read_fingerprint(name)
+        if prev is not None and prev[0] == fingerprint:
+            log.info("Function '{}' unchanged, reusing previous mapping.".format(name))
+            stats = tuple(prev[1]) if prev[1] is not None else None
+            return name, True, stats, True
+        report.remove_fingerprint(name)
+
+    bFlow, sFlow = exe.get_flow_pair(i)
+    log.debug("Mapping {} ({}) to {} ({}).".format
+              (bFlow.name, bFlow.file, sFlow.name, sFlow.file))
+    if args.render_graphs:
+        do_render_flows(bFlow=bFlow, sFlow=sFlow)
+
+    ##########
+    # mapping
+    ##########
+    stats = None
+    try:
+        full_map, rpt = do_mapping(bFlow=bFlow, sFlow=sFlow, annot_func=annot_func,
+                                   hom_order=args.hom_order, mapper_name=args.mapper,
+                                   do_render=args.render_graphs, trust_dbg=args.trust_dbg_info)
+        precise_map = _get_last_precise_map(full_map)
+        pstats = precise_map.calc_statistics()
+        if pstats is not None:
+            stats = (pstats.data.get('graphs', 0), pstats.data.get('total', 0),
+                     pstats.data.get('mapped', 0))
+    except AssertionError:
+        full_map = rpt = None
+        log.error("Failed to match flow {}.".format(bFlow.name), exc_info=True)
+        # exit(2)
+
+    for cache, (hits, misses) in sorted(bFlow.get_line_cache_stats().items()):
+        if hits + misses > 0:
+            log.info("Function '{}': {} cache hit rate {:.2f}% of {} lookups".format
+                     (name, cache, (100. * hits) / (hits + misses), hits + misses))
+
+    ##########
+    # outputs
+    ##########
+    # writes the mapping CSV and JSON reports
+    if full_map:
+        report.write(bFlow=bFlow, sFlow=sFlow, reportdata=rpt, mapping=full_map)
+        if fingerprint is not None:
+            report.write_fingerprint(bFlow.name, fingerprint, stats)
+
+        if args.render_graphs:
+            full_map.name = bFlow.name
+            try:
+                do_render_mapping(bFlow=bFlow, sFlow=sFlow,
+                                  annot_file=annot_file, hierarchical_map=full_map)
+            except AssertionError:
+                log.warning("Error during rendering of mapping {}".format(full_map.name))
+                import traceback
+                traceback.print_exc()
+
+    return bFlow.name, full_map is not None, stats, False
+
+
+def _map_pair_worker(i):
+    """Pool worker for map_pair, the log records of a function are emitted together."""
+    ctx = _worker_ctx
+    root = logging.getLogger()
+    handlers = root.handlers
+    buf = _TaskLogHandler(handlers, ctx['log_lock'])
+    root.handlers = [buf]
+    try:
+        return map_pair(ctx['exe'], ctx['args'], ctx['annot_file'], i)
+    finally:
+        root.handlers = handlers
+        buf.close()
+
+
 def main(args):
+    global _worker_ctx
+
     # Load binary and source flow graphs
-    exe = fparser.Executable(args.bin_json, args.dwarf_json, args.src_csv, args.optime_csv,
-                             simplify=(not args.no_simplify))
+    exe = fparser.load_executable(args.cache_dir, args.bin_json, args.dwarf_json, args.src_csv,
+                                  args.optime_csv, simplify=(not args.no_simplify),
+                                  lazy=args.lazy, functions=args.functions, elfPath=args.elf,
+                                  columnarPath=args.columnar,
+                                  lineCacheSize=args.line_cache_size,
+                                  otawaXmlPath=args.otawa_cfg,
+                                  incremental=args.incremental)
     log.debug("Optime_csv={}".format(args.optime_csv))
 
     ##########################
@@ -254,65 +395,63 @@ def main(args):
     #########################
     time_all_begin = time.time()
     funcs_all = set()
-    funcs_mapped = dict()
+    funcs_mapped = set()
     n_tot = n_grp = n_prec = 0
-    for bFlow, sFlow in exe.get_flow_pairs():
-        funcs_all.add(bFlow.name)
-        log.debug("Mapping {} ({}) to {} ({}).".format
-                  (bFlow.name, bFlow.file, sFlow.name, sFlow.file))
-        if args.render_graphs:
-            do_render_flows(bFlow=bFlow, sFlow=sFlow)
-
-        annot_func = None
-        if annot_file is not None and bFlow.name in annot_file:
-            annot_func = annot_file[bFlow.name]
+    n_reused = 0
+    pool = None
+    tablesPath = None
+    try:
+        if args.jobs > 1:
+            # Map instruction and line tables from a file, workers share its pages
+            if exe.columnarPath is None:
+                fd, tablesPath = tempfile.mkstemp(suffix='.col')
+                os.close(fd)
+                exe.share_tables(tablesPath)
+
+            # Workers are forked and inherit exe, nothing is pickled but the results.
+            # After this collection, inherited objects are in the oldest generation.
+            # Workers collect it only once the objects they added outnumber a
+            # quarter of it, so inherited pages are rarely touched (and copied).
+            _worker_ctx = dict(exe=exe, args=args, annot_file=annot_file,
+                               log_lock=multiprocessing.Lock())
+            gc.collect()
+            pool = multiprocessing.Pool(args.jobs)
+            results = pool.imap(_map_pair_worker, xrange(len(exe.flowPairs)))
+        else:
+            results = (map_pair(exe, args, annot_file, i) for i in xrange(len(exe.flowPairs)))
 
-        ##########
-        # mapping
-        ##########
-        try:
-            full_map, rpt = do_mapping(bFlow=bFlow, sFlow=sFlow, annot_func=annot_func,
-                                       hom_order=args.hom_order, mapper_name=args.mapper,
-                                       do_render=args.render_graphs, trust_dbg=args.trust_dbg_info)
-            funcs_mapped[bFlow.name] = full_map
-            precise_map = _get_last_precise_map(full_map)
-            stats = precise_map.calc_statistics()
+        for name, mapped, stats, reused in results:
+            funcs_all.add(name)
+            n_reused += reused
+            if mapped:
+                funcs_mapped.add(name)
             if stats is not None:
-                n_grp += stats.data.get('graphs', 0)
-                n_tot += stats.data.get('total', 0)
-                n_prec += stats.data.get('mapped', 0)
-        except AssertionError:
-            full_map = rpt = None
-            log.error("Failed to match flow {}.".format(bFlow.name), exc_info=True)
-            # exit(2)
-
-        ##########
-        # outputs
-        ##########
-        # writes the mapping CSV and JSON reports
-        if full_map:
-            report.write(bFlow=bFlow, sFlow=sFlow, reportdata=rpt, mapping=full_map)
-
-            if args.render_graphs:
-                full_map.name = bFlow.name
-                try:
-                    do_render_mapping(bFlow=bFlow, sFlow=sFlow,
-                                      annot_file=annot_file, hierarchical_map=full_map)
-                except AssertionError:
-                    log.warning("Error during rendering of mapping {}".format(full_map.name))
-                    import traceback
-                    traceback.print_exc()
+                n_grp += stats[0]
+                n_tot += stats[1]
+                n_prec += stats[2]
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+            pool = None
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if tablesPath is not None:
+            os.remove(tablesPath)
 
     #####################
     # Overall Statistics
     #####################
-    funcs_unmapped = funcs_all.difference(set(funcs_mapped.keys()))
+    funcs_unmapped = funcs_all.difference(funcs_mapped)
     time_all_end = time.time()
     percent_precise = (100.*n_prec)/n_tot if n_tot > 0 else 100.
     log.info("Statistics: {} subgraphs with {} nodes, {:.2f}% precise".format
              (n_grp, n_tot, percent_precise))
     log.info("Mapped {} out of {} functions in {:.2f} seconds".format
              (len(funcs_mapped), len(funcs_all), time_all_end - time_all_begin))
+    if args.incremental:
+        log.info("Reused mappings of {} unchanged functions".format(n_reused))
     if len(funcs_unmapped) > 0:
         log.warning("Unmapped functions: {}".format(", ".join(sorted(list(funcs_unmapped)))))
     # --
@@ -348,21 +487,53 @@ if __name__ == '__main__':
                         help='Do not simplify CFGs (usually improves matching)')
     parser.add_argument('--annot-file', type=check_file, default=None,
                         help='Annotation file containing loop cycle counts for low level loops.')
+    parser.add_argument('--lazy', default=False, action='store_true',
+                        help='Build each flow pair right before it is mapped (lower peak memory)')
+    parser.add_argument('--functions', type=lambda s: [f for f in s.split(',') if f], default=None,
+                        help='Comma-separated list of functions to map (only these are decoded)')
+    parser.add_argument('--elf', type=check_file, default=None,
+                        help='Read symbols and DWARF directly from this ELF file instead of '
+                        '--dwarf-json (requires pyelftools)')
+    parser.add_argument('--otawa-cfg', type=check_file, default=None,
+                        help='Use the file/line info of this OTAWA cfg.xml (dumpcfg -x) instead '
+                        'of --dwarf-json (line info only, no variables or inlining)')
+    parser.add_argument('--columnar', default=None,
+                        help='Map instructions and line tables from this columnar file, which is '
+                        'written from the json files if missing or outdated (not with --elf)')
+    parser.add_argument('--line-cache-size', type=int, default=fparser.cf.LINE_CACHE_SIZE,
+                        help='Number of line info queries cached per binary flow (0 disables)')
+    parser.add_argument('--cache-dir', type=check_dir, default=None,
+                        help='Directory for caching parsed inputs across runs')
+    parser.add_argument('--incremental', default=False, action='store_true',
+                        help='Skip functions whose inputs did not change since the last run '
+                        'into the same temp dir, reuse their outputs')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of functions to map in parallel (worker processes)')
     parser.add_argument('--trust-dbg-info', default=False, action='store_true',
                         help='Use column info for mapping (not safe, not always better!)')
     
-    required = parser.add_argument_group('required arguments')
+    required = parser.add_argument_group('required arguments (json and csv inputs may be '
+                                          'compressed: .gz, .bz2, .xz)')
 
     required.add_argument('--bin-json',   type=check_file, required=True,
                           help='path to JSON file containing binary flows')
-    required.add_argument('--dwarf-json', type=check_file, required=True,
-                          help='path to JSON file containing DWARF information')
+    required.add_argument('--dwarf-json', type=check_file, default=None,
+                          help='path to JSON file containing DWARF information (not required '
+                          'with --elf or --otawa-cfg)')
     required.add_argument('--src-csv',    type=check_file, required=True,
                           help='path to CSV file containing source flows')
     required.add_argument('--optime-csv', type=check_file, required=True,
                           help='path to CSV file containing opcode time info')
     
     pargs = parser.parse_args()
+    if pargs.dwarf_json is None and pargs.elf is None and pargs.otawa_cfg is None:
+        parser.error('one of the arguments --dwarf-json --elf --otawa-cfg is required')
+    if pargs.otawa_cfg is not None and (pargs.dwarf_json is not None or pargs.elf is not None):
+        parser.error('argument --otawa-cfg: not allowed with arguments --dwarf-json --elf')
+    if pargs.columnar is not None and pargs.elf is not None:
+        parser.error('argument --columnar: not allowed with argument --elf')
+    if pargs.columnar is not None and pargs.dwarf_json is None:
+        parser.error('argument --columnar: requires argument --dwarf-json')
 
     # Update temp dir if set
     if pargs.temp_dir is not None:
@@ -74,15 +74,14 @@ class HomomorphismMapper(AbstractMapper):
                     log.debug("Unique dwlines:")
                     for dwl_i, node in nodes_unq_dwlines.items():
                         log.debug("Found in node {}, dwl={}".format
-                                  (node, self.bFlow._dwData._dwData['LineInfoEntries'][str(dwl_i)]))
+                                  (node, self.bFlow._dwData.get_line_entry(dwl_i)))
                     log.debug("")
 
                 # verbose_unique()
 
                 # LUT
                 allDwLines = dict()
-                for n in nodes_b:
-                    dwLines = self.bFlow._dwData.get_dw_lines(self.bFlow.get_addr_ranges(n))
+                for dwLines in bDwLines.itervalues():
                     allDwLines.update(dwLines)
 
                 # generate precise (line+col/discr; known to be unreliable with gcc)
@@ -108,7 +107,7 @@ class HomomorphismMapper(AbstractMapper):
 
             def add_refs_by_location():
                 """for one bin-BB 'n', append potential src-equivalents to set p_b"""
-                dwLines = self.bFlow._dwData.get_dw_lines(self.bFlow.get_addr_ranges(n))
+                dwLines = bDwLines[n]
                 for key, dwLine in dwLines.items():
                     mapped_source_block = dw2src_map_precise.get(key, None)
                     if mapped_source_block is None:
@@ -135,6 +134,8 @@ class HomomorphismMapper(AbstractMapper):
                 # FIXME: implement matching by accessed variables
                 pass
 
+            # dwarf lines of all bin-BBs, resolved in one pass
+            bDwLines, _ = self.bFlow.resolve_dw_lines(nodes_b)
             # get potential maps: addr -> src-BBs
             dw2src_map_precise, dw2src_map_fallback = get_sblocks_matching_dwarflines()
             # generate self-sorting list of potential src nodes for each bin node
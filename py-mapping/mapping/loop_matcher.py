@@ -41,23 +41,28 @@ def match(bFlow, sFlow, extLoopInfo=None, do_render=False):
                             for n in lInfo._lTree.nodes if n != lInfo._rootId]
             sorted_plist = sorted(sorted_plist, reverse=True, key=lambda tup: tup[0])
 
-            dwUnqMap = {}
-            dwLinesAll = {}
-            blockKeys = {}
-            processedKeys = set()
+            # Get loop nodes
+            loopNodes = []
             for _, n in sorted_plist:
-                # log.debug("Finding unique dwLines for loop header {}...".format(n))
-                # Get loop nodes
                 ln = {n}
                 bn = lInfo.get_body_nodes(n)
                 if bn is not None:
                     ln = ln.union(bn)
+                loopNodes.append((n, ln))
+
+            # Resolve dwarf lines of all loop blocks at once
+            blockLines, _ = bFlow.resolve_dw_lines(set().union(*[ln for _, ln in loopNodes]))
 
+            dwUnqMap = {}
+            dwLinesAll = {}
+            blockKeys = {}
+            processedKeys = set()
+            for n, ln in loopNodes:
+                # log.debug("Finding unique dwLines for loop header {}...".format(n))
                 new_keys_all = set()
                 for b in ln:
                     # log.debug("Processing block {}...".format(b))
-                    ranges = bFlow.get_addr_ranges(b)
-                    dwLines = bFlow._dwData.get_dw_lines(ranges)
+                    dwLines = blockLines[b]
                     dwLinesAll.update(dwLines)
                     blockKeys[b] = set(dwLines.keys())
 
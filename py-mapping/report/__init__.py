@@ -77,7 +77,9 @@ def write_mapping_annotations(fname_or_file, outmap, cache_model=None):
     # write CSV
     ############
     out_string = "# Source_BB; Line_Col; [BinaryBB]+; ExecTime [, [fcall]+]; CacheModelFunc\n"
-    for n_s, list_n_b in global_mapping_dict.items():
+    # sorted, so that the output does not depend on dict order (e.g., of unpickled flows)
+    for n_s, list_n_b in sorted(global_mapping_dict.items()):
+        list_n_b.sort()
         lcd_beg = sFlow.get_line_info(n_s)['begin']
         total_time = 0
         f_calls = []
@@ -139,3 +141,39 @@ def write_mapping(outmap, bFlow, sFlow):
 def write(bFlow, sFlow, reportdata, mapping):
     write_report(reportdata, bFlow.name)
     write_mapping(outmap=mapping, bFlow=bFlow, sFlow=sFlow)
+
+
+def _fingerprint_path(name):
+    return os.path.join(tempfile.tempdir, "mapping_" + name + ".fp.json")
+
+
+def write_fingerprint(name, fingerprint, stats):
+    """
+    Stores the fingerprint of a mapped function pair next to its mapping,
+    along with the statistics of the mapping.
+    """
+    with open(_fingerprint_path(name), 'w') as f:
+        json.dump({'Fingerprint': fingerprint, 'Stats': stats}, f)
+
+
+def read_fingerprint(name):
+    """
+    Returns (fingerprint, stats) stored by write_fingerprint, or None if there
+    is none or the mapping outputs of the function are missing.
+    """
+    filename = os.path.join(tempfile.tempdir, "mapping_" + name)
+    if not all(os.path.isfile(filename + ext) for ext in (".csv", ".pickle")):
+        return None
+    try:
+        with open(_fingerprint_path(name), 'r') as f:
+            fp = json.load(f)
+        return fp['Fingerprint'], fp['Stats']
+    except (IOError, ValueError, KeyError):
+        return None
+
+
+def remove_fingerprint(name):
+    try:
+        os.remove(_fingerprint_path(name))
+    except OSError:
+        pass
@@ -13,12 +13,13 @@ log = logging.getLogger()
 dwData = dwarf.DwarfData('./test/benchmarks/maxleaf/debug.json')
 
 # Render subprogram tree
-subprogTreeNodes = [node for node in dwData._dieTree.nodes if dwData._dieTree.nodes[node]['tag'] in
+dieTree = dwData._dieTree.to_digraph()
+subprogTreeNodes = [node for node in dieTree.nodes if dieTree.nodes[node]['tag'] in
                     ['DW_TAG_compile_unit', 'DW_TAG_subprogram', 'DW_TAG_inlined_subroutine',
                      'DW_TAG_lexical_block']]
 subprogTreeNodes += [0]
 finalNodes = [0]
-subprogTree = dwData._dieTree.subgraph(subprogTreeNodes)
+subprogTree = dieTree.subgraph(subprogTreeNodes)
 
 for node in subprogTree.nodes:
     die = subprogTree.nodes[node]
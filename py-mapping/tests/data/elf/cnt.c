@@ -0,0 +1,21 @@
+int Seed;
+int RandomInteger(void);
+
+int Initialize(int *Array)
+{
+    int Index;
+    for (Index = 0; Index < 4; Index++)
+        Array[Index] = RandomInteger();
+    return 0;
+}
+
+int main(void)
+{
+    int Array[4];
+    return Initialize(Array);
+}
+
+int Unused(int x)
+{
+    return x + 1;
+}
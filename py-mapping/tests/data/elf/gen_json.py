@@ -0,0 +1,213 @@
+"""
+Derives the elf2flow json (symbols, DIEs, line info) of an ELF from binutils output,
+independently of elf_frontend. Python 3, run as: python3 gen_json.py cnt.elf > cnt.json
+
+cnt.elf was built with gcc 12 and binutils 2.40:
+    gcc -O0 -gdwarf-4 -fno-asynchronous-unwind-tables -fno-pie -no-pie -nostdlib -static \
+        -ffunction-sections -fdebug-prefix-map=$PWD=. -Wl,--gc-sections -Wl,--build-id=none \
+        -Wl,-e,main -Wl,-N -o cnt.elf cnt.c lib.c
+    objcopy -R .comment -R .debug_frame cnt.elf
+The functions removed by --gc-sections leave line sequences at the same addresses in both
+CUs, which elf2flow resolves in favor of the later CU.
+"""
+import json
+import re
+import subprocess
+import sys
+
+VALID = {'DW_TAG_subprogram', 'DW_TAG_inlined_subroutine', 'DW_TAG_variable',
+         'DW_TAG_compile_unit', 'DW_TAG_base_type', 'DW_TAG_lexical_block'}
+BITS = {'DW_FORM_data1': 8, 'DW_FORM_data2': 16, 'DW_FORM_data4': 32, 'DW_FORM_data8': 64}
+
+
+def run(*args):
+    return subprocess.run(args, check=True, capture_output=True, text=True).stdout
+
+
+path = sys.argv[1]
+
+# symbols of .text (functions)
+syms = {}
+for l in run('nm', path).splitlines():
+    a, t, n = l.split()
+    if t in 'Tt':
+        syms[int(a, 16)] = n
+symbols = [{'Addr': a, 'Symbol': n} for a, n in sorted(syms.items())]
+
+# instructions
+insns = []
+for l in run('objdump', '-d', '--no-show-raw-insn', path).splitlines():
+    m = re.match(r'\s+([0-9a-f]+):\t(\S+)', l)
+    if m:
+        insns.append(int(m.group(1), 16))
+
+# abbrevs: offset -> code -> (tag, [(attr, form)])
+abbrevs = {}
+cur = None
+for l in run('readelf', '-wa', path).splitlines():
+    m = re.match(r'\s+Number TAG \((0x[0-9a-f]+|\d+)\)', l)
+    if m:
+        tab = abbrevs.setdefault(int(m.group(1), 0), {})
+        continue
+    m = re.match(r'\s+(\d+)\s+(DW_TAG_\w+)', l)
+    if m:
+        cur = tab[int(m.group(1))] = (m.group(2), [])
+        continue
+    m = re.match(r'\s+(DW_AT_\w+)\s+(DW_FORM_\w+)', l)
+    if m:
+        cur[1].append((m.group(1), m.group(2)))
+
+# range lists: offset -> string
+ranges = {}
+for l in run('readelf', '-wR', path).splitlines():
+    m = re.match(r'\s+([0-9a-f]{8}) (?:([0-9a-f]{16}) ([0-9a-f]{16})|<End of list>)', l)
+    if m:
+        off = int(m.group(1), 16)
+        r = (int(m.group(2), 16), int(m.group(3), 16)) if m.group(2) else (0, 0)
+        ranges[off] = ranges.get(off, '') + '[{},{}];'.format(*r)
+
+
+def op_str(op):
+    name, _, arg = op.partition(':')
+    arg = arg.strip()
+    if name == 'DW_OP_addr':
+        return '{}:{}'.format(name, int(arg, 16))
+    if name in ('DW_OP_fbreg', 'DW_OP_piece') or name.startswith('DW_OP_breg'):
+        return '{}:{}'.format(name, int(arg.split()[0]))
+    if name.startswith('DW_OP_reg') or name.startswith('DW_OP_lit'):
+        return name
+    return 'NOT_IMPLEMENTED'
+
+
+def value(attr, form, text):
+    if form == 'DW_FORM_flag_present':
+        return None
+    if form == 'DW_FORM_strp':
+        return text.split('): ', 1)[1]
+    if form == 'DW_FORM_string':
+        return text
+    if form in BITS:
+        u = int(text.split()[0], 0)
+        s = u - (1 << BITS[form]) if u & (1 << (BITS[form] - 1)) else u
+        return 'S_{}_U_{}'.format(s, u)
+    if form == 'DW_FORM_ref4':
+        return str(int(text.strip('<>'), 16))
+    if form == 'DW_FORM_addr':
+        return str(int(text, 16))
+    if form == 'DW_FORM_sec_offset':
+        if attr == 'DW_AT_ranges':
+            return ranges[int(text, 16)]
+        return str(int(text, 0))
+    if form == 'DW_FORM_exprloc':
+        raw, _, ops = text.partition('\t')
+        if attr == 'DW_AT_location':
+            return '[' + ''.join(op_str(o) + ',' for o in ops.strip('()').split('; ')) + '];'
+        return 'Found Exprloc FORM.' + ''.join(b.zfill(2) + ' '
+                                               for b in raw.split(': ')[1].split())
+    raise ValueError(form)
+
+
+# DIEs
+dies = []
+stack = []  # (depth, offset, exported)
+abbrevOff = 0
+die = None
+for l in run('readelf', '-wi', path).splitlines():
+    m = re.match(r'\s+Abbrev Offset: (0x[0-9a-f]+|\d+)', l)
+    if m:
+        abbrevOff = int(m.group(1), 0)
+        continue
+    m = re.match(r'\s*<(\d+)><([0-9a-f]+)>: Abbrev Number: (\d+)', l)
+    if m:
+        depth, off, code = int(m.group(1)), int(m.group(2), 16), int(m.group(3))
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        die = None
+        if code == 0:
+            continue
+        tag, specs = abbrevs[abbrevOff][code]
+        parentOk = not stack or stack[-1][2]
+        exported = parentOk and tag in VALID
+        stack.append((depth, off, exported))
+        if exported:
+            die = {'Offset': off, 'ParentOffset': stack[-2][1] if len(stack) > 1 else 0,
+                   'Tag': tag, 'IsValid': True, 'Attributes': {}}
+            die['_specs'] = list(specs)
+            dies.append(die)
+        continue
+    m = re.match(r'\s+<[0-9a-f]+>\s+(DW_AT_\w+)\s*: (.*)$', l)
+    if m and die is not None:
+        attr, form = die['_specs'].pop(0)
+        assert attr == m.group(1), (attr, l)
+        v = value(attr, form, m.group(2))
+        if v is not None:
+            die['Attributes'][attr] = v
+for d in dies:
+    assert not d.pop('_specs')
+
+# line tables as addDwarfLines() of elf2flow: per CU, first row wins
+cuOffsets = [d['Offset'] for d in dies if d['Tag'] == 'DW_TAG_compile_unit']
+cuLines = []
+rows = None
+for l in run('readelf', '--debug-dump=rawline', path).splitlines():
+    if 'Line Number Statements:' in l:
+        rows = []
+        cuLines.append(rows)
+        addr, line, col, disc = 0, 1, 0, 0
+        continue
+    if rows is None:
+        continue
+    m = re.search(r'Set column to (\d+)', l)
+    if m:
+        col = int(m.group(1))
+    m = re.search(r'set Discriminator to (\d+)', l)
+    if m:
+        disc = int(m.group(1))
+    m = re.search(r'(?:to|set Address to) (0x[0-9a-f]+)', l)
+    if m:
+        addr = int(m.group(1), 16)
+    m = re.search(r'Line by -?\d+ to (\d+)', l)
+    if m:
+        line = int(m.group(1))
+    if 'Special opcode' in l or l.strip().endswith('Copy'):
+        rows.append((addr, line, col, disc, False))
+        disc = 0
+    if 'End of Sequence' in l:
+        rows.append((addr, line, col, disc, True))
+        addr, line, col, disc = 0, 1, 0, 0
+
+entries = {}
+perCu = []
+for cu, rows in zip(cuOffsets, cuLines):
+    lines = {}
+    prev = None
+    ended = True
+    for addr, line, col, disc, end in rows:
+        if end:
+            prev['HighPc'] = addr - 1
+            ended = True
+            continue
+        if addr not in lines:
+            lines[addr] = {'CU': cu, 'LowPc': addr, 'HighPc': 0, 'LineNumber': line,
+                           'LineOffset': col, 'Discriminator': disc}
+        if not ended:
+            prev['HighPc'] = addr - 1
+        ended = False
+        prev = lines[addr]
+    perCu.append(lines)
+    for a, e in lines.items():
+        entries[str(a)] = e
+
+# LineInfoMap: the line of the CU whose pc ranges contain the instruction
+lineMap = {}
+for a in insns:
+    for lines in perCu:
+        lows = sorted(l for l in lines if l <= a)
+        if lows and a <= lines[lows[-1]]['HighPc'] and lines[lows[-1]]['HighPc'] >= lows[-1]:
+            lineMap[str(a)] = str(lows[-1])
+            break
+
+json.dump({'Type': 'DebugInfo', 'Symbols': symbols, 'Insns': insns,
+           'Data': {'DIEs': dies, 'LineInfoEntries': entries, 'LineInfoMap': lineMap,
+                    'CompilationUnits': []}}, sys.stdout, indent=1, sort_keys=True)
+print()
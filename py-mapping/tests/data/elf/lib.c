@@ -0,0 +1,19 @@
+extern int Seed;
+
+static inline __attribute__((always_inline)) int Step(int s)
+{
+    int t = s * 133;
+    return (t + 81) % 8095;
+}
+
+int RandomInteger(void)
+{
+    Seed = Step(Seed);
+    return Seed;
+}
+
+int LibUnused(int x)
+{
+    int y = x * 3;
+    return y - 1;
+}
@@ -0,0 +1,171 @@
+"""
+Writes a small executable (binary flows, dwarf data, source flows) in the
+input formats of main.py, for tests.
+
+Functions of cu 'cnt.c': InitSeed and Initialize (a loop nest calling
+RandomInteger), both paired with a source flow. RandomInteger has no debug
+info. CU 'lib.c' holds LibFunc, which has a binary flow but no source flow.
+"""
+import json
+import os
+
+
+OPTIME_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'avr-spec.csv')
+
+LIB_CU = 100
+CSV_HEADER = '#BB.index;BB.type;BB.label;File;Subprogram;Line.Begin;Col.Begin;Line.End;' \
+             'Col.End;Exec.Count;Exec.Time.Per;function.call.type;function.call.callees;' \
+             'Successors;VarWrite;VarRead;Code'
+CSV_OBJS = [
+    ['0;exit;;cnt.c;InitSeed;78;1;78;1;0;0;0;;;;;""',
+     '1;node;;cnt.c;InitSeed;76;4;77;12;0;0;0;;0;Seed;;" Seed = 0; return 0;;"',
+     '2;entry;;cnt.c;InitSeed;75;2;75;2;0;0;0;;1;;;""'],
+    ['0;exit;;cnt.c;Initialize;70;1;70;1;0;0;0;;;;;""',
+     '1;node;;cnt.c;Initialize;69;4;69;12;0;0;0;;0;;;" return 0;;"',
+     '2;node;;cnt.c;Initialize;65;47;65;59;0;0;0;;7;OuterIndex;OuterIndex;" OuterIndex++;"',
+     '3;node;;cnt.c;Initialize;66;50;66;62;0;0;0;;5;InnerIndex;InnerIndex;" InnerIndex++;"',
+     '4;node;;cnt.c;Initialize;67;10;67;57;0;0;1;RandomInteger;3;Array,InnerIndex,OuterIndex;;'
+     '" RandomInteger(); Array[OuterIndex][InnerIndex] = [B4.1];"',
+     '5;node;;cnt.c;Initialize;66;28;66;48;0;0;0;;4,2;;InnerIndex;" InnerIndex < 10;"',
+     '6;node;;cnt.c;Initialize;66;12;66;26;0;0;0;;5;InnerIndex;;" InnerIndex = 0;"',
+     '7;node;;cnt.c;Initialize;65;25;65;45;0;0;0;;6,1;;OuterIndex;" OuterIndex < 10;"',
+     '8;node;;cnt.c;Initialize;63;4;65;23;0;0;0;;7;OuterIndex;;'
+     '" register int OuterIndex;; register int InnerIndex;; OuterIndex = 0;"',
+     '9;entry;;cnt.c;Initialize;62;2;62;2;0;0;0;;8;;;""'],
+    ['0;exit;;cnt.c;main;36;1;36;1;0;0;0;;;;;""',
+     '1;node;;cnt.c;main;31;4;35;12;0;0;1;InitSeed,Test;0;Array;Array;'
+     '" InitSeed(); Test(Array); return 1;;"',
+     '2;entry;;cnt.c;main;30;2;30;2;0;0;0;;1;;;""'],
+]
+
+MNEMS = {0: ('LDI', ['r24', '0x00']), 2: ('STD', ['Y+3', 'r24']), 4: ('STD', ['Y+4', 'r24']),
+         6: ('RET', []), 16: ('LDI', ['r24', '0x00']), 18: ('STD', ['Y+1', 'r24']),
+         20: ('STD', ['Y+2', 'r25']), 22: ('LDD', ['r24', 'Y+1']), 24: ('CPI', ['r24', '0x0A']),
+         26: ('BRGE', ['.+28']), 28: ('LDI', ['r24', '0x00']), 30: ('STD', ['Y+3', 'r24']),
+         32: ('LDD', ['r24', 'Y+3']), 34: ('CPI', ['r24', '0x0A']), 36: ('BRGE', ['.+12']),
+         38: ('NOP', []), 40: ('NOP', []), 42: ('CALL', ['0x3c']), 44: ('LDD', ['r24', 'Y+3']),
+         46: ('SUBI', ['r24', '0xFF']), 48: ('STD', ['Y+3', 'r24']), 50: ('LDD', ['r24', 'Y+1']),
+         52: ('STD', ['Y+1', 'r24']), 54: ('LDI', ['r24', '0x00']), 56: ('RET', []),
+         58: ('NOP', []), 60: ('LDI', ['r24', '0x01']), 62: ('RET', []),
+         64: ('STD', ['Y+1', 'r24']), 66: ('RET', [])}
+
+LINES = {0: 76, 2: 76, 4: 77, 6: 78, 16: 63, 18: 63, 20: 65, 22: 65, 24: 65, 26: 65, 28: 66,
+         30: 66, 32: 66, 34: 66, 36: 66, 38: 67, 40: 67, 42: 67, 44: 66, 46: 66, 48: 66, 50: 65,
+         52: 65, 54: 69, 56: 70, 64: 3, 66: 4}
+COLS = {20: 25, 22: 25, 24: 25, 26: 25, 28: 12, 30: 12, 32: 28, 34: 28, 36: 28, 44: 50, 46: 50,
+        48: 50, 50: 47, 52: 47}
+
+
+def _block(ident, typ, ranges=None):
+    block = {'ID': ident, 'BlockType': typ}
+    if ranges is not None:
+        block['AddrRanges'] = ranges
+    return block
+
+
+def binary_objs(mnems=None):
+    """Returns the top-level objects of the binary flow file."""
+    mnems = MNEMS if mnems is None else mnems
+    flows = [
+        {'Type': 'Flow', 'Name': 'InitSeed',
+         'BasicBlocks': [_block(-1, 'Entry'), _block(-2, 'Exit'), _block(0, 'Normal', [[0, 6]])],
+         'Edges': [[-1, 0], [0, -2]]},
+        {'Type': 'Flow', 'Name': 'Initialize',
+         'BasicBlocks': [_block(-1, 'Entry'), _block(-2, 'Exit'),
+                         _block(16, 'Normal', [[16, 20]]), _block(22, 'Normal', [[22, 26]]),
+                         _block(28, 'Normal', [[28, 30]]), _block(32, 'Normal', [[32, 36]]),
+                         _block(38, 'Normal', [[38, 40]]), _block(-3, 'FunctionCall', [42, 42]),
+                         _block(44, 'Normal', [[44, 48]]), _block(50, 'Normal', [[50, 52]]),
+                         _block(54, 'Normal', [[54, 56]])],
+         'Edges': [[-1, 16], [16, 22], [22, 28], [28, 32], [32, 38], [38, -3], [-3, 44],
+                   [44, 32], [32, 50], [50, 22], [22, 54], [54, -2]]},
+        {'Type': 'Flow', 'Name': 'RandomInteger',
+         'BasicBlocks': [_block(-1, 'Entry'), _block(-2, 'Exit'), _block(60, 'Normal', [[60, 62]])],
+         'Edges': [[-1, 60], [60, -2]]},
+        {'Type': 'Flow', 'Name': 'LibFunc',
+         'BasicBlocks': [_block(-1, 'Entry'), _block(-2, 'Exit'), _block(64, 'Normal', [[64, 66]])],
+         'Edges': [[-1, 64], [64, -2]]},
+    ]
+    insns = [{'Addr': a, 'Mnem': m, 'Op': o, 'Target': ([60] if m == 'CALL' else [])}
+             for a, (m, o) in sorted(mnems.iteritems())]
+    syms = [{'Addr': 0, 'Symbol': 'InitSeed'}, {'Addr': 16, 'Symbol': 'Initialize'},
+            {'Addr': 60, 'Symbol': 'RandomInteger'}, {'Addr': 64, 'Symbol': 'LibFunc'}]
+    return flows + [{'Type': 'InsnMap', 'Section': '.text', 'Instructions': insns},
+                    {'Type': 'SymbolMap', 'Section': '.text', 'Symbols': syms}]
+
+
+def line_data():
+    """Returns (LineInfoEntries, LineInfoMap)."""
+    entries = {}
+    lineMap = {}
+    prev = low = None
+    for a in sorted(LINES):
+        key = (LINES[a], COLS.get(a, 4))
+        if key != prev:
+            low = a
+            entries[str(a)] = {'CU': 11 if a < 64 else LIB_CU, 'LowPc': a, 'HighPc': a + 2,
+                               'LineNumber': LINES[a], 'LineOffset': COLS.get(a, 4),
+                               'Discriminator': 0}
+            prev = key
+        else:
+            entries[str(low)]['HighPc'] = a + 2
+        lineMap[str(a)] = str(low)
+    return entries, lineMap
+
+
+def debug_obj():
+    """Returns the dwarf file object."""
+    def die(offset, parent, tag, **attrs):
+        return {'Offset': offset, 'ParentOffset': parent, 'Tag': tag, 'IsValid': True,
+                'Attributes': attrs}
+
+    dies = [
+        die(11, 0, 'DW_TAG_compile_unit', DW_AT_name='cnt.c', DW_AT_comp_dir='/tmp'),
+        die(20, 11, 'DW_TAG_base_type', DW_AT_name='int', DW_AT_byte_size='S_1_U_1'),
+        die(30, 11, 'DW_TAG_subprogram', DW_AT_name='InitSeed', DW_AT_low_pc='0',
+            DW_AT_high_pc='S_8_U_8'),
+        die(40, 11, 'DW_TAG_subprogram', DW_AT_name='Initialize', DW_AT_low_pc='16',
+            DW_AT_high_pc='S_42_U_42'),
+        die(45, 40, 'DW_TAG_variable', DW_AT_name='OuterIndex',
+            DW_AT_location='[DW_OP_breg28:1,];', DW_AT_type='20'),
+        die(50, 40, 'DW_TAG_variable', DW_AT_name='InnerIndex',
+            DW_AT_location='[DW_OP_breg28:3,];', DW_AT_type='20'),
+        die(60, 0, 'DW_TAG_compile_unit', DW_AT_name='libc.c'),
+        die(70, 60, 'DW_TAG_subprogram', DW_AT_name='RandomInteger', DW_AT_low_pc='60'),
+        die(LIB_CU, 0, 'DW_TAG_compile_unit', DW_AT_name='lib.c', DW_AT_comp_dir='/tmp'),
+        die(110, LIB_CU, 'DW_TAG_base_type', DW_AT_name='int', DW_AT_byte_size='S_1_U_1'),
+        die(120, LIB_CU, 'DW_TAG_subprogram', DW_AT_name='LibFunc', DW_AT_low_pc='64',
+            DW_AT_high_pc='S_4_U_4'),
+        die(130, 120, 'DW_TAG_variable', DW_AT_name='x', DW_AT_location='[DW_OP_breg28:1,];',
+            DW_AT_type='110'),
+    ]
+    entries, lineMap = line_data()
+    return {'Type': 'DebugInfo', 'Data': {'DIEs': dies, 'LineInfoEntries': entries,
+                                          'LineInfoMap': lineMap, 'CompilationUnits': []}}
+
+
+def write_inputs(dirPath, mnems=None, csvObjs=None):
+    """
+    Writes main.json, debug.json and src.csv to dirPath.
+
+    Args:
+        mnems: Optional instructions {addr: (mnemonic, operands)}, replacing MNEMS.
+        csvObjs: Optional source flows (lists of csv lines), replacing CSV_OBJS.
+
+    Return:
+        Dict of the paths, keyed by 'bin', 'dwarf', 'csv' and 'optime'.
+    """
+    paths = {'bin': os.path.join(dirPath, 'main.json'),
+             'dwarf': os.path.join(dirPath, 'debug.json'),
+             'csv': os.path.join(dirPath, 'src.csv'),
+             'optime': OPTIME_CSV}
+    with open(paths['bin'], 'w') as fp:
+        for obj in binary_objs(mnems):
+            fp.write(json.dumps(obj, indent=2) + '\n\n')
+    with open(paths['dwarf'], 'w') as fp:
+        fp.write(json.dumps(debug_obj(), indent=2) + '\n\n')
+    with open(paths['csv'], 'w') as fp:
+        fp.write('\n\n'.join('\n'.join([CSV_HEADER] + o) for o in (csvObjs or CSV_OBJS)) +
+                 '\n\n')
+    return paths
@@ -0,0 +1,108 @@
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import fparser
+from fparser import columnar
+from fparser import disassembly as da
+from fparser import dwarf
+from tests import fixture
+
+
+def insn_map():
+    return next(o for o in fixture.binary_objs() if o['Type'] == 'InsnMap')['Instructions']
+
+
+def dump_insns(insns):
+    """Returns all instructions of insns as {addr: (mnem, mnemId, operands, targets)}."""
+    addrs = insns.get_addresses()
+    return {a: (i['Mnem'], i.get('MnemId'), i['Operands'], i['Target'])
+            for a, i in insns.iter_instructions((addrs[0], addrs[-1]))}
+
+
+class ColumnarTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'tables.col')
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.dir)
+
+    def test_instructions(self):
+        timing = da.OpTimingTable(fixture.OPTIME_CSV)
+        insns = da.Instructions(insn_map(), timing)
+        columnar.write(self.path, insn_map(), dwarf.LineTable(*fixture.line_data()))
+        mapped = columnar.MappedInstructions(columnar.ColumnarFile(self.path), timing)
+
+        self.assertEqual(len(insns), len(mapped))
+        self.assertEqual(list(insns.get_addresses()), list(mapped.get_addresses()))
+        self.assertEqual(dump_insns(insns), dump_insns(mapped))
+        for a in xrange(-1, 70):
+            self.assertEqual(insns.get_next_insn_address(a), mapped.get_next_insn_address(a))
+            self.assertEqual(insns.get_span((a, a + 7)), mapped.get_span((a, a + 7)))
+        self.assertEqual(list(insns.iter_mnemonic_ids((16, 56))),
+                         list(mapped.iter_mnemonic_ids((16, 56))))
+
+    def test_line_table(self):
+        lineTable = dwarf.LineTable(*fixture.line_data())
+        columnar.write(self.path, insn_map(), lineTable)
+        mapped = columnar.MappedLineTable(columnar.ColumnarFile(self.path))
+
+        arrays = lineTable.get_arrays()
+        for name, values in mapped.get_arrays().iteritems():
+            self.assertEqual(list(arrays[name]), list(values), name)
+        for lo in xrange(0, 70, 2):
+            self.assertEqual(lineTable.get_refs(lo, lo + 10), mapped.get_refs(lo, lo + 10))
+            self.assertEqual(lineTable.get_lcds(lo, lo + 10), mapped.get_lcds(lo, lo + 10))
+            self.assertEqual(lineTable.get_entry(lo), mapped.get_entry(lo))
+        ranges = {0: [(0, 6)], 1: [(16, 26), (50, 52)], 2: [(20, 40)]}
+        self.assertEqual(lineTable.resolve_refs(ranges), mapped.resolve_refs(ranges))
+
+    def test_version_mismatch(self):
+        columnar.write(self.path, insn_map(), dwarf.LineTable(*fixture.line_data()))
+        with open(self.path, 'r+b') as fp:
+            fp.write(columnar.HEADER.pack(columnar.MAGIC, columnar.VERSION + 1, 0))
+        self.assertRaises(AssertionError, columnar.ColumnarFile, self.path)
+
+    def test_stale_file(self):
+        paths = fixture.write_inputs(self.dir)
+
+        def load():
+            return fparser.Executable(paths['bin'], paths['dwarf'], paths['csv'], paths['optime'],
+                                      columnarPath=self.path)
+
+        def mtime():
+            return os.stat(self.path).st_mtime
+
+        exe = load()
+        self.assertIsInstance(exe.instructions, columnar.MappedInstructions)
+        self.assertEqual('LDI', exe.instructions.get_instruction(0)['Mnem'])
+        os.utime(self.path, (1, 1))
+        load()
+        self.assertEqual(1, mtime())  # stamp matches, file reused
+
+        # Inputs changed, the file is rebuilt from them
+        mnems = dict(fixture.MNEMS)
+        mnems[0] = ('CLR', ['r24'])
+        paths = fixture.write_inputs(self.dir, mnems)
+        exe = load()
+        self.assertNotEqual(1, mtime())
+        self.assertEqual('CLR', exe.instructions.get_instruction(0)['Mnem'])
+
+        # Unsupported version and truncated files are rebuilt as well
+        for data in (columnar.HEADER.pack(columnar.MAGIC, columnar.VERSION + 1, 0), 'VCOL'):
+            with open(self.path, 'wb') as fp:
+                fp.write(data)
+            exe = load()
+            self.assertEqual('CLR', exe.instructions.get_instruction(0)['Mnem'])
+            self.assertEqual(struct.pack('<4sI', columnar.MAGIC, columnar.VERSION),
+                             open(self.path, 'rb').read(8))
+
+
+if __name__ == '__main__':
+    unittest.main()
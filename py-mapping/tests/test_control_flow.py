@@ -0,0 +1,227 @@
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+import fparser
+from fparser import control_flow as cf
+from fparser import disassembly as da
+from genarch import caches
+from tests import fixture
+
+# Direct-mapped, 4 sets of 4 byte lines
+ICACHE_XML = """<?xml version="1.0"?>
+<cache-config>
+  <icache>
+    <replace>LRU</replace><block_bits>2</block_bits><row_bits>2</row_bits>
+    <way_bits>0</way_bits><miss_penalty>10</miss_penalty>
+  </icache>
+</cache-config>
+"""
+
+
+class LruCacheTest(unittest.TestCase):
+
+    def test_eviction(self):
+        cache = cf.LruCache(2)
+        calls = []
+
+        def compute(k):
+            return lambda: calls.append(k) or k * 10
+
+        self.assertEqual(10, cache.get(1, compute(1)))
+        self.assertEqual(20, cache.get(2, compute(2)))
+        self.assertEqual(10, cache.get(1, compute(1)))  # hit, 1 is most recent
+        self.assertEqual(30, cache.get(3, compute(3)))  # evicts 2
+        self.assertEqual(20, cache.get(2, compute(2)))
+        self.assertEqual([1, 2, 3, 2], calls)
+        self.assertEqual((1, 4), (cache.hits, cache.misses))
+        self.assertEqual(2, len(cache))
+
+        cache.discard(2)
+        cache.get(2, compute(2))
+        self.assertEqual([1, 2, 3, 2, 2], calls)
+
+    def test_disabled(self):
+        cache = cf.LruCache(0)
+        self.assertEqual(1, cache.get('a', lambda: 1))
+        self.assertEqual(2, cache.get('a', lambda: 2))
+        self.assertEqual(0, len(cache))
+
+    def test_get_many(self):
+        cache = cf.LruCache(3)
+        calls = []
+
+        def compute(keys):
+            calls.append(sorted(keys))
+            return {k: k * 10 for k in keys}
+
+        self.assertEqual({1: 10, 2: 20}, cache.get_many([1, 2, 1], compute))
+        self.assertEqual({2: 20, 3: 30, 4: 40}, cache.get_many([2, 3, 4], compute))  # evicts 1
+        self.assertEqual(10, cache.get(1, lambda: 10))
+        self.assertEqual([[1, 2], [3, 4]], calls)
+        self.assertEqual((1, 5), (cache.hits, cache.misses))
+        self.assertEqual([3, 4, 1], list(cache._entries))
+
+
+class BinaryControlFlowTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.dir = tempfile.mkdtemp()
+        self.paths = fixture.write_inputs(self.dir)
+        self.exe = fparser.Executable(self.paths['bin'], self.paths['dwarf'], self.paths['csv'],
+                                      self.paths['optime'], lazy=True)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.dir)
+
+    def test_resolve_dw_lines(self):
+        i = next(i for i in xrange(len(self.exe.flowPairs))
+                 if self.exe.get_flow_pair_name(i) == 'Initialize')
+        bFlow, _ = self.exe.get_flow_pair(i)
+        blocks = list(bFlow.nodes())
+        expected = self.exe.dwarfData.resolve_dw_lines({b: bFlow.get_addr_ranges(b)
+                                                        for b in blocks})
+        self.assertEqual(expected, bFlow.resolve_dw_lines(blocks))
+        hits, misses = bFlow.get_line_cache_stats()['dwLines']
+        self.assertEqual(0, hits)
+
+        # Answered from the cache, shared with get_dw_lines()
+        self.assertEqual(expected, bFlow.resolve_dw_lines(blocks))
+        self.assertEqual(expected[0][blocks[0]], bFlow.get_dw_lines(blocks[0]))
+        nKeys = len({tuple(bFlow.get_addr_ranges(b)) for b in blocks})
+        self.assertEqual((hits + nKeys + 1, misses),
+                         bFlow.get_line_cache_stats()['dwLines'])
+
+    def test_contract_straight_paths(self):
+        paths = self.paths
+        flows = {}
+        for simplify in (False, True):
+            exe = fparser.Executable(paths['bin'], paths['dwarf'], paths['csv'],
+                                     paths['optime'], simplify=simplify)
+            i = next(i for i in xrange(len(exe.flowPairs))
+                     if exe.get_flow_pair_name(i) == 'Initialize')
+            flows[simplify] = exe.get_flow_pair(i)
+        bFlow, sFlow = flows[True]
+
+        def addrs(flow):
+            return sorted(r for b in flow.nodes() for r in flow.get_addr_ranges(b))
+
+        self.assertEqual(addrs(flows[False][0]), addrs(bFlow))
+        self.assertLess(len(bFlow), len(flows[False][0]))
+        for u, v in bFlow.digraph.edges:
+            if u == bFlow.entryId() or 'FunctionCall' in (bFlow.get_block_type(u),
+                                                           bFlow.get_block_type(v)):
+                continue
+            self.assertFalse(bFlow.digraph.out_degree(u) == 1 and bFlow.digraph.in_degree(v) == 1,
+                             "Edge {} -> {} was not contracted".format(u, v))
+
+        # The source flows of the fixture have no chains
+        self.assertEqual(sorted(flows[False][1].digraph.edges), sorted(sFlow.digraph.edges))
+
+    def binary_flows(self):
+        return [self.exe.get_flow_pair(i)[0] for i in xrange(len(self.exe.flowPairs))]
+
+    def test_block_times(self):
+        timing = da.OpTimingTable(self.paths['optime'])
+        for bFlow in self.binary_flows():
+            for b in bFlow.get_blocks():
+                # The former per-block loop over the instructions
+                minTime = maxTime = 0
+                for _, inst in bFlow.instructions(b):
+                    mnemId = timing.intern(inst['Mnem'])
+                    minTime += timing.minTimes[mnemId]
+                    maxTime += timing.maxTimes[mnemId]
+                self.assertEqual(maxTime, bFlow.get_block_time(b))
+                self.assertEqual(minTime, bFlow.get_block_min_time(b))
+                summary = bFlow.get_block_summary(b)
+                self.assertEqual((set(), []), (summary.missingTimes, summary.blacklisted))
+                addrs = [a for a, _ in bFlow.instructions(b)]
+                self.assertEqual(addrs, list(bFlow.iter_insn_addresses(b)))
+                self.assertEqual((min(addrs), max(addrs)) if addrs else None, summary.addrSpan)
+        initialize = next(f for f in self.binary_flows() if f.name == 'Initialize')
+        self.assertEqual(4, initialize.get_block_min_time(22))  # LDD, CPI, BRGE
+        self.assertEqual(5, initialize.get_block_time(22))
+
+    def test_icache_lblocks(self):
+        configPath = os.path.join(self.dir, 'cache.xml')
+        with open(configPath, 'w') as fp:
+            fp.write(ICACHE_XML)
+        icache = caches.ICache(configPath)
+        flows = self.binary_flows()
+        for bFlow in flows:
+            bFlow.basicblocks = [caches.BasicBlock(b, bFlow) for b in bFlow.get_blocks()]
+        icache.compute_lbsets(flows)
+
+        for bFlow in flows:
+            for bb in bFlow.basicblocks:
+                # The former walk over all instructions, one l-block per change of cache set
+                expected = []
+                lastSet = None
+                for addr, _ in bFlow.instructions(bb.ID):
+                    if icache.setof(addr) != lastSet:
+                        lastSet = icache.setof(addr)
+                        expected.append((addr, icache.blockof(addr), lastSet))
+                self.assertEqual(expected, [(lb.addr, lb.block, lb.cset.ID) for lb in bb.lblocks],
+                                 "{}.{}".format(bFlow.name, bb.ID))
+                for lb in bb.lblocks:
+                    self.assertIn(lb, icache.get_lbsets()[lb.cset.ID].lblocks)
+        initialize = next(f for f in flows if f.name == 'Initialize')
+        self.assertEqual([(16, 16), (20, 20)],  # 16..20 crosses a line
+                         [(lb.addr, lb.block) for bb in initialize.basicblocks if bb.ID == 16
+                          for lb in bb.lblocks])
+
+
+class SourceControlFlowTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.dir = tempfile.mkdtemp()
+        self.tempdir = tempfile.tempdir
+        import main
+        self.main = main
+        self.args = argparse.Namespace(mapper='ctrldep', hom_order='predominated-first',
+                                       trust_dbg_info=False, render_graphs=False,
+                                       incremental=False)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        tempfile.tempdir = self.tempdir
+        shutil.rmtree(self.dir)
+
+    def map_initialize(self, name, csvObjs=None):
+        """Maps Initialize, returns its source flow and mapping report."""
+        tempfile.tempdir = os.path.join(self.dir, name)
+        os.mkdir(tempfile.tempdir)
+        paths = fixture.write_inputs(tempfile.tempdir, csvObjs=csvObjs)
+        exe = fparser.Executable(paths['bin'], paths['dwarf'], paths['csv'], paths['optime'],
+                                 simplify=True)
+        i = next(i for i in xrange(len(exe.flowPairs))
+                 if exe.get_flow_pair_name(i) == 'Initialize')
+        self.assertTrue(self.main.map_pair(exe, self.args, None, i)[1])
+        with open(os.path.join(tempfile.tempdir, 'mapping_Initialize.csv')) as fp:
+            return exe.get_flow_pair(i)[1], fp.read()
+
+    def test_contract_straight_paths(self):
+        # Block 8 of Initialize split in two, 8 -> 10 -> 7
+        csvObjs = [list(o) for o in fixture.CSV_OBJS]
+        init = csvObjs[1]
+        init[-2] = '8;node;;cnt.c;Initialize;63;4;65;10;0;0;0;;10;;;' \
+                   '" register int OuterIndex;; register int InnerIndex;;"'
+        init.insert(-1, '10;node;;cnt.c;Initialize;65;12;65;23;0;0;0;;7;OuterIndex;;'
+                        '" OuterIndex = 0;"')
+
+        sFlow, expected = self.map_initialize('joined')
+        split, mapping = self.map_initialize('split', csvObjs)
+        self.assertEqual(expected, mapping)
+        self.assertEqual(sorted(sFlow.digraph.edges), sorted(split.digraph.edges))
+        for n in sFlow.nodes():
+            self.assertEqual(sFlow.get_line_info(n), split.get_line_info(n))
+            self.assertEqual(sFlow._get_csv_block(n), split._get_csv_block(n))
+
+
+if __name__ == '__main__':
+    unittest.main()
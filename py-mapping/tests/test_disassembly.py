@@ -0,0 +1,270 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from fparser import disassembly as da
+from tests import fixture
+
+# Two address ranges [0, 6] and [10, 14] and a single instruction at 20
+INSNS = [
+    {'Addr': 0, 'Mnem': 'LDI', 'Op': ['r24', '0x01'], 'Target': []},
+    {'Addr': 2, 'Mnem': 'RCALL', 'Op': ['.+8'], 'Target': [10]},
+    {'Addr': 4, 'Mnem': 'LDI', 'Op': ['r25', '0x01'], 'Target': []},
+    {'Addr': 6, 'Mnem': 'RET', 'Op': [], 'Target': []},
+    {'Addr': 10, 'Mnem': 'STD', 'Op': ['Y+1', 'r24'], 'Target': []},
+    {'Addr': 12, 'Mnem': 'BRNE', 'Op': ['.-4'], 'Target': [10, 14]},
+    {'Addr': 14, 'Mnem': 'RET', 'Op': [], 'Target': []},
+    {'Addr': 20, 'Mnem': 'NOP', 'Op': [], 'Target': []},
+]
+ADDRS = [i['Addr'] for i in INSNS]
+
+
+def byte_owners(stackOffsets):
+    """Byte map of the former variable scan, filled in ascending offset order."""
+    owners = {}
+    for o in sorted(stackOffsets):
+        owners.update({b: o for b in xrange(o, o + stackOffsets[o])})
+    return owners
+
+
+def parse_op_times(csvPath):
+    """The former parser of the timing CSV: {mnemonic: (min, max)}."""
+    opTimes = {}
+    with open(csvPath, 'r') as fp:
+        for line in fp:
+            if line[0] == '#':
+                continue
+            lCols = line.split(';')
+            opTimes[lCols[0]] = (int(lCols[1]), int(lCols[2]))
+    return opTimes
+
+
+class OpTimingTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_csv(self, text):
+        path = os.path.join(self.dir, 'optime.csv')
+        with open(path, 'w') as fp:
+            fp.write(text)
+        return path
+
+    def test_parse(self):
+        timing = da.OpTimingTable(self.write_csv(
+            '# mnemonic;min;max\nLDI;1;1\nBRNE;1;2\nSTD;2;2\nSTD;3;4\n'))
+        self.assertEqual(['LDI', 'BRNE', 'STD'], timing.mnemonics)
+        brne = timing.intern('BRNE')
+        self.assertEqual((1, 2), (timing.minTimes[brne], timing.maxTimes[brne]))
+        std = timing.intern('STD')
+        self.assertEqual((3, 4), (timing.minTimes[std], timing.maxTimes[std]))  # last row wins
+        self.assertEqual(3, len(timing.mnemonics))
+
+    def test_missing(self):
+        timing = da.OpTimingTable(self.write_csv('LDI;1;1\nNOP;1;1\n'))
+        ldi = timing.intern('LDI')
+        spm = timing.intern('SPM')
+        self.assertEqual(spm, timing.intern('SPM'))
+        self.assertEqual(da.OpTimingTable.MISSING, timing.maxTimes[spm])
+        self.assertEqual(da.OpTimingTable.MISSING, timing.minTimes[spm])
+        cli = timing.intern('CLI')
+        self.assertEqual(['CLI', 'SPM'], timing.get_missing([spm, ldi, cli]))
+        self.assertEqual([], timing.get_missing([ldi]))
+
+    def test_invalid(self):
+        self.assertRaises(AssertionError, da.OpTimingTable, self.write_csv('LDI;1\n'))
+
+    def test_spec(self):
+        timing = da.OpTimingTable(fixture.OPTIME_CSV)
+        opTimes = parse_op_times(fixture.OPTIME_CSV)
+        self.assertEqual(len(opTimes), len(timing.mnemonics))
+        for mnem, times in opTimes.iteritems():
+            mnemId = timing.intern(mnem)
+            self.assertEqual(times, (timing.minTimes[mnemId], timing.maxTimes[mnemId]))
+
+
+class FrameVariablesTest(unittest.TestCase):
+
+    def test_lookup(self):
+        frame = da.FrameVariables({1: 2, 3: 1, 6: 2})
+        self.assertEqual([None, 1, 1, 3, None, None, 6, 6, None],
+                         [frame.lookup(o) for o in xrange(9)])
+        self.assertEqual(3, len(frame))
+
+    def test_overlap(self):
+        # Struct at 1 (4 bytes) with a member declared at 2, array at 8
+        frame = da.FrameVariables({1: 4, 2: 1, 8: 4, 9: 2})
+        self.assertEqual([None, 1, 2, 1, 1, None, None, None, 8, 9, 9, 8, None],
+                         [frame.lookup(o) for o in xrange(13)])
+        self.assertEqual([1, 2, 1], frame.group([1, 2, 3, 4], partialOk=True))
+
+    def test_random(self):
+        rnd = random.Random(3)
+        for _ in xrange(200):
+            stackOffsets = {rnd.randint(0, 30): rnd.randint(1, 6)
+                            for _ in xrange(rnd.randint(0, 8))}
+            frame = da.FrameVariables(stackOffsets)
+            owners = byte_owners(stackOffsets)
+            self.assertEqual([owners.get(o, None) for o in xrange(-1, 40)],
+                             [frame.lookup(o) for o in xrange(-1, 40)])
+
+
+class InstructionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timing = da.OpTimingTable(fixture.OPTIME_CSV)
+        self.insns = da.Instructions(list(reversed(INSNS)), self.timing)
+
+    def test_next_insn_address(self):
+        # Used to return the value dict of the next instruction
+        self.assertEqual(4, self.insns.get_next_insn_address(2))
+        self.assertEqual(10, self.insns.get_next_insn_address(6))  # gap
+        self.assertEqual(10, self.insns.get_next_insn_address(7))  # not in the table
+        self.assertEqual(0, self.insns.get_next_insn_address(-1))
+        self.assertIsNone(self.insns.get_next_insn_address(20))  # last
+        self.assertIsNone(self.insns.get_next_insn_address(21))
+        for a in xrange(-1, 22):
+            following = [b for b in ADDRS if b > a]
+            self.assertEqual(following[0] if following else None,
+                             self.insns.get_next_insn_address(a))
+
+    def test_prev_insn_address(self):
+        self.assertIsNone(self.insns.get_prev_insn_address(0))  # first
+        self.assertEqual(6, self.insns.get_prev_insn_address(10))  # gap
+        self.assertEqual(14, self.insns.get_prev_insn_address(17))
+        self.assertEqual(20, self.insns.get_prev_insn_address(30))
+        for a in xrange(-1, 22):
+            preceding = [b for b in ADDRS if b < a]
+            self.assertEqual(preceding[-1] if preceding else None,
+                             self.insns.get_prev_insn_address(a))
+
+    def test_spans(self):
+        self.assertEqual(len(INSNS), len(self.insns))
+        self.assertEqual(ADDRS, list(self.insns.get_addresses()))
+        self.assertEqual((0, 4), self.insns.get_span((0, 9)))
+        self.assertEqual((4, 4), self.insns.get_span((7, 9)))  # within a gap
+        self.assertEqual((3, 5), self.insns.get_span((5, 11)))  # across a gap
+        self.assertEqual((8, 8), self.insns.get_span((21, 30)))  # past the end
+        self.assertEqual([], self.insns.get_instructions((15, 19)))
+        self.assertEqual(['RET', 'STD'], list(self.insns.iter_mnemonics((5, 11))))
+        self.assertEqual([self.timing.intern('NOP')],
+                         list(self.insns.iter_mnemonic_ids((15, 25))))
+
+    def test_views(self):
+        for a, view in self.insns.iter_instructions((0, 20)):
+            insn = INSNS[ADDRS.index(a)]
+            self.assertEqual(insn['Mnem'], view['Mnem'])
+            self.assertEqual(self.timing.intern(insn['Mnem']), view['MnemId'])
+            self.assertEqual(insn['Op'], view['Operands'])
+            self.assertEqual(insn['Target'], view['Target'])
+            self.assertRaises(KeyError, view.__getitem__, 'Op')
+            self.assertIsNone(view.get('Op'))
+        self.assertEqual([10, 14], self.insns.get_instruction(12)['Target'])
+        self.assertRaises(KeyError, self.insns.get_instruction, 8)
+        self.assertRaises(KeyError, self.insns.get_instruction, 21)
+
+        # Without a timing table there are no mnemonic ids
+        view = da.Instructions(INSNS).get_instruction(0)
+        self.assertEqual('LDI', view['Mnem'])
+        self.assertIsNone(view.get('MnemId'))
+
+
+def scan_block(insns, ranges, timing, blacklist, stackOffsets):
+    """
+    The former per-block passes: unsupported insns, times and variable
+    accesses (of one byte variables, which need no grouping).
+    """
+    owners = byte_owners(stackOffsets)
+    minTime = maxTime = 0
+    missing = set()
+    hits = []
+    addrs = []
+    reads = []
+    writes = []
+    for r in ranges:
+        for a, i in insns.iter_instructions(r):
+            addrs.append(a)
+            if i['Mnem'] in blacklist:
+                hits.append(i['Mnem'])
+            mnemId = timing.intern(i['Mnem'])
+            if timing.maxTimes[mnemId] == da.OpTimingTable.MISSING:
+                missing.add(mnemId)
+            else:
+                minTime += timing.minTimes[mnemId]
+                maxTime += timing.maxTimes[mnemId]
+            ops = i['Operands']
+            if len(ops) == 2:
+                for k, op in ((0, ops[0]), (1, ops[1])):
+                    if op.startswith('Y+') and int(op[2:]) in owners:
+                        (writes if k == 0 else reads).append(owners[int(op[2:])])
+                        break
+    return minTime, maxTime, missing, hits, addrs, reads, writes
+
+
+class SummarizeBlocksTest(unittest.TestCase):
+
+    def setUp(self):
+        # BRNE without timing info
+        self.dir = tempfile.mkdtemp()
+        self.csvPath = os.path.join(self.dir, 'optime.csv')
+        with open(self.csvPath, 'w') as fp:
+            fp.write('# mnemonic;min;max\nLDI;1;1\nRCALL;3;3\nRET;4;5\nSTD;2;2\nNOP;1;1\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check(self, insns, timing, blockRanges, stackOffsets):
+        summaries = insns.summarize_blocks(blockRanges, da.FrameVariables(stackOffsets),
+                                           timing=timing, blacklist=('RET',))
+        self.assertEqual(set(blockRanges), set(summaries))
+        for b, ranges in blockRanges.iteritems():
+            minTime, maxTime, missing, hits, addrs, reads, writes = \
+                scan_block(insns, ranges, timing, ('RET',), stackOffsets)
+            s = summaries[b]
+            self.assertEqual((minTime, maxTime), (s.minTime, s.maxTime), (b, ranges))
+            self.assertEqual(missing, s.missingTimes)
+            self.assertEqual(hits, s.blacklisted)
+            self.assertEqual((min(addrs), max(addrs)) if addrs else None, s.addrSpan)
+            self.assertEqual(addrs, [a for lo, hi in s.insnSpans
+                                     for a in insns.get_addresses()[lo:hi]])
+            self.assertEqual((reads, writes), (s.varReads, s.varWrites))
+
+    def test_blocks(self):
+        timing = da.OpTimingTable(self.csvPath)
+        insns = da.Instructions(INSNS, timing)
+        blocks = {0: [(0, 4)], 1: [(6, 6), (10, 14)], 2: [(12, 20)], 3: [(7, 9)]}
+        summaries = insns.summarize_blocks(blocks, da.FrameVariables({1: 1}), timing=timing,
+                                           blacklist=('RET',))
+        self.assertEqual((5, 5), (summaries[0].minTime, summaries[0].maxTime))
+        self.assertEqual((10, 12, ['RET', 'RET']), (summaries[1].minTime, summaries[1].maxTime,
+                                                    summaries[1].blacklisted))
+        self.assertEqual(['BRNE'], timing.get_missing(summaries[2].missingTimes))
+        self.assertEqual((5, 6, 1), (summaries[2].minTime, summaries[2].maxTime,
+                                     len(summaries[2].missingTimes)))
+        self.assertEqual(([], [1]), (summaries[1].varReads, summaries[1].varWrites))
+        self.assertEqual((None, [(4, 4)]), (summaries[3].addrSpan, summaries[3].insnSpans))
+        self.check(insns, timing, blocks, {1: 1})
+
+    def test_random(self):
+        rnd = random.Random(5)
+        for shared in (True, False):
+            timing = da.OpTimingTable(self.csvPath)
+            # Mnemonic ids are interned in the table only if it is shared
+            insns = da.Instructions(INSNS, timing if shared else None)
+            for _ in xrange(50):
+                blockRanges = {}
+                for b in xrange(rnd.randint(1, 6)):
+                    ranges = []
+                    for _ in xrange(rnd.randint(1, 3)):
+                        lo = rnd.randint(-2, 22)
+                        ranges.append((lo, lo + rnd.randint(0, 8)))
+                    blockRanges[b] = ranges
+                self.check(insns, timing, blockRanges, {1: 1, 3: 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
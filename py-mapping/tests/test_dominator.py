@@ -0,0 +1,89 @@
+import random
+import unittest
+import networkx as nx
+from flow import dominator
+from flow.csr import CsrGraph, immediate_dominators
+
+
+def random_flow(rnd, n):
+    """Returns a random digraph with n nodes (non-contiguous ids), its first node is the entry."""
+    g = nx.DiGraph()
+    g.add_nodes_from(rnd.sample(xrange(1000), n))
+    nodes = list(g.nodes)
+    for _ in xrange(rnd.randint(n, 3 * n)):
+        g.add_edge(rnd.choice(nodes), rnd.choice(nodes))
+    return g, nodes[0]
+
+
+def dominates(g, entry, a, b):
+    """a dom b, iff b (reachable from entry) cannot be reached from entry without passing a."""
+    if a == b or a == entry:
+        return True
+    h = g.copy()
+    h.remove_node(a)
+    return not nx.has_path(h, entry, b)
+
+
+class ImmediateDominatorsTest(unittest.TestCase):
+
+    def test_same_as_networkx(self):
+        rnd = random.Random(1)
+        for _ in xrange(200):
+            g, entry = random_flow(rnd, rnd.randint(2, 40))
+            csr = CsrGraph(g)
+            expected = nx.immediate_dominators(g, entry)
+            actual = immediate_dominators(csr, entry)
+            self.assertEqual(expected, actual)
+            self.assertEqual(expected.items(), actual.items())  # same order
+
+            expected = nx.immediate_dominators(g.reverse(), entry)
+            actual = immediate_dominators(csr.reverse(), entry)
+            self.assertEqual(expected.items(), actual.items())
+
+    def test_csr_structure(self):
+        rnd = random.Random(2)
+        g, _ = random_flow(rnd, 30)
+        csr = CsrGraph(g)
+        self.assertEqual(list(g.nodes), csr.nodes)
+        self.assertEqual(list(g.edges), csr.edges)
+        rev = g.reverse()
+        for n in g.nodes:
+            self.assertEqual(list(g.successors(n)), list(csr.successors(n)))
+            self.assertEqual(list(rev.successors(n)), list(csr.reverse().successors(n)))
+            self.assertEqual(set(g.predecessors(n)), set(csr.predecessors(n)))
+            self.assertEqual(g.in_degree(n), csr.in_degree(n))
+            self.assertEqual(g.out_degree(n), csr.out_degree(n))
+
+
+class DominatorTreeTest(unittest.TestCase):
+
+    def test_dominance(self):
+        rnd = random.Random(3)
+        for _ in xrange(30):
+            g, entry = random_flow(rnd, rnd.randint(2, 15))
+            g = g.subgraph(nx.descendants(g, entry) | {entry}).copy()
+            if len(g) < 2:
+                continue
+            for tree in (dominator.PreDominatorTree(g, entry),
+                         dominator.PreDominatorTree(CsrGraph(g), entry)):
+                for a in g:
+                    for b in g:
+                        self.assertEqual(dominates(g, entry, a, b), tree.test_dominance(a, b),
+                                         "{} dom {}".format(a, b))
+
+    def test_postdominator_numbering_unchanged(self):
+        rnd = random.Random(4)
+        for _ in xrange(50):
+            g, entry = random_flow(rnd, rnd.randint(2, 40))
+            nxTree = nx.DiGraph()
+            for n, d in nx.immediate_dominators(g.reverse(), entry).items():
+                if n != entry:
+                    nxTree.add_edge(d, n)
+            tree = dominator.PostDominatorTree(g, entry)
+            self.assertEqual(list(nxTree.edges), list(tree.get_tree().edges))
+            numbers = [tree.get_preorder_number(n) for n in tree.get_tree()]
+            self.assertEqual(sorted(numbers), range(len(numbers)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,216 @@
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from fparser import dwarf
+from tests import fixture
+
+
+def random_line_data(rnd, n):
+    """Returns (LineInfoEntries, LineInfoMap) of n instructions in random line entries."""
+    entries = {}
+    lineMap = {}
+    addr = 0
+    low = None
+    for _ in xrange(n):
+        if low is None or rnd.random() < 0.3:
+            low = addr
+            entries[str(low)] = {'CU': 11, 'LowPc': low, 'HighPc': low, 'Discriminator': 0,
+                                 'LineNumber': rnd.randint(1, 50), 'LineOffset': rnd.randint(0, 9)}
+        entries[str(low)]['HighPc'] = addr + 1
+        if rnd.random() < 0.9:  # some instructions have no line info
+            lineMap[str(addr)] = str(low)
+        addr += rnd.choice((2, 2, 4))
+    return entries, lineMap
+
+
+def scan_refs(lineMap, lo, hi):
+    """Line entry refs of [lo, hi] by a linear scan of the map, in address order."""
+    return [int(lineMap[str(a)]) for a in sorted(int(k) for k in lineMap) if lo <= a <= hi]
+
+
+class LineTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rnd = random.Random(1)
+        self.entries, self.lineMap = random_line_data(self.rnd, 300)
+        self.table = dwarf.LineTable(self.entries, self.lineMap)
+        self.maxAddr = max(int(a) for a in self.lineMap)
+
+    def random_range(self):
+        lo = self.rnd.randint(-2, self.maxAddr + 2)
+        return lo, lo + self.rnd.randint(0, 40)
+
+    def test_point_lookups(self):
+        for a in xrange(-2, self.maxAddr + 3):
+            if str(a) in self.lineMap:
+                entry = self.entries[self.lineMap[str(a)]]
+                self.assertEqual(int(self.lineMap[str(a)]), self.table.get_ref(a))
+                self.assertEqual((entry['LineNumber'], entry['LineOffset'], 0),
+                                 self.table.get_lcd(a))
+            else:
+                self.assertRaises(KeyError, self.table.get_ref, a)
+
+    def test_range_lookups(self):
+        for _ in xrange(200):
+            lo, hi = self.random_range()
+            refs = scan_refs(self.lineMap, lo, hi)
+            self.assertEqual(refs, self.table.get_refs(lo, hi))
+            self.assertEqual([(self.entries[str(r)]['LineNumber'],
+                               self.entries[str(r)]['LineOffset'], 0) for r in refs],
+                             self.table.get_lcds(lo, hi))
+
+    def test_resolve_refs(self):
+        blocks = {b: [self.random_range() for _ in xrange(self.rnd.randint(1, 3))]
+                  for b in xrange(40)}
+        resolved = self.table.resolve_refs(blocks)
+        for b, ranges in blocks.iteritems():
+            self.assertEqual({r for lo, hi in ranges for r in scan_refs(self.lineMap, lo, hi)},
+                             resolved[b])
+
+    def test_entries(self):
+        for k, entry in self.entries.iteritems():
+            self.assertEqual(entry, self.table.get_entry(int(k)))
+        self.assertIsNone(self.table.get_entry(self.maxAddr + 100))
+
+    def test_int_values(self):
+        # Values are ints, not longs (which would show as 12L in reports and keys)
+        a = min(int(k) for k in self.lineMap)
+        ref = self.table.get_ref(a)
+        values = [ref] + list(self.table.get_lcd(a)) + self.table.get_entry(ref).values() + \
+            self.table.get_refs(a, a + 20) + list(self.table.resolve_refs({0: [(a, a + 20)]})[0])
+        self.assertEqual([int] * len(values), [type(v) for v in values])
+
+
+class DieTreeTest(unittest.TestCase):
+
+    def test_tree(self):
+        dies = [{'Offset': 1, 'ParentOffset': 0, 'Tag': 'cu', 'Attributes': {'n': 1}},
+                {'Offset': 2, 'ParentOffset': 1, 'Tag': 'sub', 'Attributes': {}},
+                {'Offset': 3, 'ParentOffset': 2, 'Tag': 'var', 'Attributes': {}},
+                {'Offset': 4, 'ParentOffset': 1, 'Tag': 'sub', 'Attributes': {}}]
+        tree = dwarf.DieTree(dies[:2])
+        tree.add_dies(dies[2:])
+        self.assertEqual([1], tree.get_children(0))
+        self.assertEqual([2, 4], tree.get_children(1))
+        self.assertEqual([2, 3, 4], tree.get_descendants(1))
+        self.assertEqual(2, tree.get_parent(3))
+        self.assertIsNone(tree.get_parent(0))
+        self.assertEqual([2, 4], tree.get_dies_with_tag('sub'))
+        self.assertEqual({'n': 1}, tree.get_attrs(1))
+        self.assertRaises(AssertionError, tree.add_dies,
+                          [{'Offset': 9, 'ParentOffset': 8, 'Tag': 'x', 'Attributes': {}}])
+
+
+def die(offset, parent, tag, **attrs):
+    return {'Offset': offset, 'ParentOffset': parent, 'Tag': tag, 'IsValid': True,
+            'Attributes': attrs}
+
+
+# Step is inlined into main (directly, and within a lexical block) and into
+# LibFunc of another CU. Outer is inlined into main as well.
+INLINE_DIES = [
+    die(11, 0, 'DW_TAG_compile_unit', DW_AT_name='cnt.c', DW_AT_comp_dir='/tmp'),
+    die(20, 11, 'DW_TAG_subprogram', DW_AT_name='Step', DW_AT_inline='S_3_U_3'),
+    die(30, 11, 'DW_TAG_subprogram', DW_AT_name='Outer', DW_AT_inline='S_3_U_3'),
+    die(40, 11, 'DW_TAG_subprogram', DW_AT_name='main', DW_AT_low_pc='16',
+        DW_AT_high_pc='S_48_U_48'),
+    die(45, 40, 'DW_TAG_inlined_subroutine', DW_AT_abstract_origin='20', DW_AT_low_pc='18',
+        DW_AT_high_pc='S_4_U_4'),
+    die(50, 40, 'DW_TAG_lexical_block', DW_AT_low_pc='28', DW_AT_high_pc='S_12_U_12'),
+    die(55, 50, 'DW_TAG_inlined_subroutine', DW_AT_abstract_origin='20', DW_AT_low_pc='30',
+        DW_AT_high_pc='36'),
+    die(65, 40, 'DW_TAG_inlined_subroutine', DW_AT_abstract_origin='30', DW_AT_low_pc='44',
+        DW_AT_high_pc='S_8_U_8'),
+    die(70, 11, 'DW_TAG_subprogram', DW_AT_name='Init', DW_AT_low_pc='0',
+        DW_AT_high_pc='S_8_U_8'),
+    die(100, 0, 'DW_TAG_compile_unit', DW_AT_name='lib.c', DW_AT_comp_dir='/tmp'),
+    die(110, 100, 'DW_TAG_subprogram', DW_AT_name='LibFunc', DW_AT_low_pc='64',
+        DW_AT_high_pc='S_4_U_4'),
+    die(115, 110, 'DW_TAG_inlined_subroutine', DW_AT_abstract_origin='20', DW_AT_low_pc='64',
+        DW_AT_high_pc='S_2_U_2'),
+]
+
+
+def walk_inlined_subroutines(tree, subDies):
+    """The former recursive walk: {subprogram: [{dieOffset, low_pc, high_pc}]}."""
+    inlSubs = {}
+
+    def surrounding_sub(d):
+        n = tree.get_parent(d)
+        while n:
+            if tree.get_tag(n) in dwarf.SUBROUTINE:
+                return n
+            n = tree.get_parent(n)
+
+    def find_children(subt, root):
+        for ch in tree.get_children(subt):
+            if tree.get_tag(ch) == 'DW_TAG_inlined_subroutine':
+                if tree.get_tag(surrounding_sub(ch)) == 'DW_TAG_inlined_subroutine':
+                    raise NotImplementedError("nested inlining")
+                attrs = tree.get_attrs(ch)
+                lo = int(attrs['DW_AT_low_pc'])
+                hi = attrs['DW_AT_high_pc']
+                hi = lo + int(hi.split('_U_')[1]) if hi[0] == 'S' else int(hi)
+                inlSubs.setdefault(root, []).append({'dieOffset': ch, 'low_pc': lo,
+                                                     'high_pc': hi})
+            find_children(ch, root)
+
+    for s in subDies:
+        find_children(s, s)
+    return inlSubs
+
+
+class InlinedSubroutinesTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.dir)
+
+    def dwarf_data(self, dies, lazy=False):
+        entries, lineMap = fixture.line_data()
+        data = {'DIEs': dies, 'LineInfoEntries': entries, 'LineInfoMap': lineMap}
+        if not lazy:
+            return dwarf.DwarfData(None, data=data)
+        # DIEs of each CU are only read on first use
+        path = os.path.join(self.dir, 'debug.json')
+        with open(path, 'w') as fp:
+            json.dump({'Type': 'DebugInfo', 'Data': data}, fp)
+        return dwarf.DwarfData(path)
+
+    def test_walk(self):
+        expected = walk_inlined_subroutines(dwarf.DieTree(INLINE_DIES), [20, 30, 40, 70, 110])
+        self.assertEqual([45, 55, 65], [i['dieOffset'] for i in expected[40]])
+        self.assertEqual([115], [i['dieOffset'] for i in expected[110]])
+        for lazy in (False, True):
+            dwData = self.dwarf_data(INLINE_DIES, lazy)
+            self.assertEqual([20, 30, 40, 70, 110], sorted(dwData._subDies))
+            for s in dwData._subDies:
+                inls = expected.get(s, [])
+                self.assertEqual(inls, dwData.get_inlined_subroutines(s))
+                for a in xrange(-1, 80):
+                    covering = [i for i in inls if i['low_pc'] <= a < i['high_pc']]
+                    self.assertEqual(covering[0] if covering else None,
+                                     dwData.find_inlined_subroutine(s, a), (s, a, lazy))
+
+    def test_nested(self):
+        # Step inlined into the inlined instance of Outer
+        dies = INLINE_DIES + [die(66, 65, 'DW_TAG_inlined_subroutine', DW_AT_abstract_origin='20',
+                                  DW_AT_low_pc='46', DW_AT_high_pc='S_2_U_2')]
+        dies.sort(key=lambda d: d['Offset'])
+        self.assertRaises(NotImplementedError, self.dwarf_data, dies)
+        lazyData = self.dwarf_data(dies, lazy=True)
+        self.assertRaises(NotImplementedError, lazyData.get_inlined_subroutines, 40)
+        tree = dwarf.DieTree(dies)
+        self.assertRaises(NotImplementedError, walk_inlined_subroutines, tree, [40])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import logging
+import os
+import unittest
+from fparser import dwarf
+from fparser import elf_frontend
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data', 'elf')
+LIB_CU = 284
+
+
+@unittest.skipUnless(elf_frontend.is_available(), "requires pyelftools")
+class ElfFileTest(unittest.TestCase):
+    """
+    Compares the ELF frontend with the json of elf2flow for data/elf/cnt.elf. The json was
+    derived from binutils output by data/elf/gen_json.py.
+    """
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        with open(os.path.join(DATA_DIR, 'cnt.json')) as fp:
+            self.expected = json.load(fp)
+        self.elf = elf_frontend.ElfFile(os.path.join(DATA_DIR, 'cnt.elf'))
+        self.data = self.elf.get_debug_data(self.expected['Insns'])
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_symbols(self):
+        self.assertEqual(self.expected['Symbols'], self.elf.get_symbols())
+
+    def test_dies(self):
+        expected = self.expected['Data']['DIEs']
+        self.assertEqual([d['Offset'] for d in expected], [d['Offset'] for d in self.data['DIEs']])
+        for exp, die in zip(expected, self.data['DIEs']):
+            self.assertEqual(exp, die)
+
+    def test_line_info(self):
+        expected = self.expected['Data']
+        self.assertEqual(expected['LineInfoEntries'], self.data['LineInfoEntries'])
+        self.assertEqual(expected['LineInfoMap'], self.data['LineInfoMap'])
+        self.assertEqual(set(str(a) for a in self.expected['Insns']),
+                         set(self.data['LineInfoMap']))
+
+    def test_duplicate_addresses(self):
+        # Both CUs have line sequences at 0 and 7 (of functions removed by the linker), the
+        # later CU wins with its own extents.
+        entries = self.data['LineInfoEntries']
+        self.assertEqual((LIB_CU, 0, 6, 16), tuple(entries['0'][k] for k in
+                                                   ('CU', 'LowPc', 'HighPc', 'LineNumber')))
+        self.assertEqual((LIB_CU, 7, 18, 17), tuple(entries['7'][k] for k in
+                                                    ('CU', 'LowPc', 'HighPc', 'LineNumber')))
+
+    def test_dwarf_data(self):
+        fromJson = dwarf.DwarfData(None, data=self.expected['Data'])
+        fromElf = dwarf.DwarfData(None, data=self.data)
+        subs = fromJson.get_subprograms()
+        self.assertEqual(subs, fromElf.get_subprograms())
+        self.assertEqual(set(['Initialize', 'main', 'RandomInteger', 'LibUnused']),
+                         set(s['name'] for s in subs.itervalues()))
+        # Function extents, up to the next symbol
+        starts = [s['Addr'] for s in self.expected['Symbols']]
+        ends = dict(zip(starts, [a - 1 for a in starts[1:]] + [self.expected['Insns'][-1]]))
+        for addr, sub in subs.iteritems():
+            dieOffset = sub['dieOffset']
+            self.assertEqual(fromJson.get_subprogram_file(dieOffset),
+                             fromElf.get_subprogram_file(dieOffset))
+            self.assertEqual(fromJson.get_inlined_subroutines(dieOffset),
+                             fromElf.get_inlined_subroutines(dieOffset))
+            self.assertEqual(fromJson.get_local_variables(dieOffset),
+                             fromElf.get_local_variables(dieOffset))
+            ranges = [(addr, ends.get(addr, addr))]
+            self.assertEqual(fromJson.get_dw_lines(ranges), fromElf.get_dw_lines(ranges))
+        self.assertEqual(1, len(fromElf.get_inlined_subroutines(
+            next(s['dieOffset'] for s in subs.itervalues() if s['name'] == 'RandomInteger'))))
+
+
+if __name__ == '__main__':
+    unittest.main()
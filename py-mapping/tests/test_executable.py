@@ -0,0 +1,232 @@
+import gzip
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+import fparser
+from fparser import jsonio
+from tests import fixture
+
+
+def load(paths, **kwargs):
+    return fparser.Executable(paths['bin'], paths['dwarf'], paths['csv'], paths['optime'],
+                              simplify=True, **kwargs)
+
+
+class ExecutableTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.cwd = os.getcwd()
+        self.dir = tempfile.mkdtemp()
+        os.chdir(self.dir)  # for files of missing timing info
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir)
+
+    def pair_index(self, exe, name):
+        return next(i for i in xrange(len(exe.flowPairs)) if exe.get_flow_pair_name(i) == name)
+
+    def test_missing_times_lazy(self):
+        mnems = dict(fixture.MNEMS)
+        mnems[38] = ('NOSUCHOP', [])
+        paths = fixture.write_inputs(self.dir, mnems)
+        self.assertRaises(AssertionError, load, paths)
+
+        exe = load(paths, lazy=True)
+        bFlow, _ = exe.get_flow_pair(self.pair_index(exe, 'InitSeed'))
+        self.assertEqual('InitSeed', bFlow.name)
+        self.assertRaises(AssertionError, exe.get_flow_pair, self.pair_index(exe, 'Initialize'))
+
+    def test_unpaired_cu_not_loaded(self):
+        paths = fixture.write_inputs(self.dir)
+        for lazy in (True, False):
+            exe = load(paths, lazy=lazy)
+            self.assertIn('LibFunc', [r.name for r in exe.bFlowRecords])
+            self.assertIn(fixture.LIB_CU, exe.dwarfData._cuSpans)
+            for i in xrange(len(exe.flowPairs)):
+                exe.get_flow_pair(i)
+            self.assertIn(fixture.LIB_CU, exe.dwarfData._cuSpans)
+            self.assertNotIn(11, exe.dwarfData._cuSpans)
+
+    def test_functions(self):
+        chunkSize = jsonio.CHUNK_SIZE
+        jsonio.CHUNK_SIZE = 4  # for the indices built by the first load
+        try:
+            paths = fixture.write_inputs(self.dir)
+            exe = load(paths, functions=['InitSeed'], incremental=True)
+        finally:
+            jsonio.CHUNK_SIZE = chunkSize
+        self.assertTrue(os.path.isfile(paths['csv'] + jsonio.INDEX_SUFFIX))
+        self.assertEqual(['InitSeed'], [exe.get_flow_pair_name(i)
+                                        for i in xrange(len(exe.flowPairs))])
+        # Instructions of InitSeed and the next chunk only
+        self.assertEqual([0, 2, 4, 6, 16, 18, 20, 22], list(exe.instructions.get_addresses()))
+
+        full = load(paths, incremental=True)
+        i = self.pair_index(full, 'InitSeed')
+        self.assertEqual(full.get_flow_pair_fingerprint(i), exe.get_flow_pair_fingerprint(0))
+        bFlow, sFlow = exe.get_flow_pair(0)
+        fullBFlow, fullSFlow = full.get_flow_pair(i)
+        self.assertEqual(sorted(fullBFlow.digraph.edges), sorted(bFlow.digraph.edges))
+        self.assertEqual(fullBFlow.resolve_dw_lines(fullBFlow.nodes()),
+                         bFlow.resolve_dw_lines(bFlow.nodes()))
+        self.assertEqual(sorted(fullSFlow.digraph.edges), sorted(sFlow.digraph.edges))
+
+    def test_compressed_inputs(self):
+        paths = fixture.write_inputs(self.dir)
+        gzPaths = dict(paths)
+        for key in ('bin', 'dwarf'):
+            gzPaths[key] = paths[key] + '.gz'
+            with open(paths[key], 'rb') as src:
+                with gzip.open(gzPaths[key], 'wb') as dst:
+                    dst.write(src.read())
+        load(gzPaths, functions=['InitSeed'])  # builds the indices
+
+        def dump(exe):
+            pairs = {}
+            for i in xrange(len(exe.flowPairs)):
+                bFlow, sFlow = exe.get_flow_pair(i)
+                pairs[exe.get_flow_pair_name(i)] = (
+                    sorted(bFlow.digraph.edges), sorted(sFlow.digraph.edges),
+                    bFlow.resolve_dw_lines(bFlow.nodes()))
+            return pairs
+
+        opened = []
+        openInput = jsonio.open_input
+
+        def open_input(path):
+            opened.append(path)
+            return openInput(path)
+
+        for kwargs in ({}, {'lazy': True}, {'functions': ['InitSeed', 'Initialize']}):
+            jsonio.open_input = open_input
+            try:
+                del opened[:]
+                pairs = dump(load(gzPaths, **kwargs))
+            finally:
+                jsonio.open_input = openInput
+            self.assertEqual(dump(load(paths, **kwargs)), pairs, kwargs)
+            # The binary file is read through one handle, the dwarf file through one more for
+            # the DIEs of all CUs left
+            self.assertEqual(1, opened.count(gzPaths['bin']), kwargs)
+            self.assertLessEqual(opened.count(gzPaths['dwarf']), 2, kwargs)
+
+
+class LoadExecutableTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.dir = tempfile.mkdtemp()
+        self.cacheDir = os.path.join(self.dir, 'cache')
+        os.mkdir(self.cacheDir)
+        self.paths = fixture.write_inputs(self.dir)
+        self.paths['optime'] = os.path.join(self.dir, 'optime.csv')
+        shutil.copy(fixture.OPTIME_CSV, self.paths['optime'])
+
+        # Count the executables built
+        self.init = fparser.Executable.__init__
+        self.built = 0
+
+        def init(exe, *args, **kwargs):
+            self.built += 1
+            self.init(exe, *args, **kwargs)
+        fparser.Executable.__init__ = init
+
+    def tearDown(self):
+        fparser.Executable.__init__ = self.init
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.dir)
+
+    def load(self, **kwargs):
+        paths = self.paths
+        return fparser.load_executable(self.cacheDir, paths['bin'], paths['dwarf'],
+                                       paths['csv'], paths['optime'], **kwargs)
+
+    def entries(self):
+        return sorted(os.listdir(self.cacheDir))
+
+    def test_hit(self):
+        exe = self.load(simplify=True)
+        self.assertEqual(1, self.built)
+        self.assertEqual(1, len(self.entries()))
+
+        cached = self.load(simplify=True)
+        self.assertEqual(1, self.built)
+        self.assertEqual(1, len(self.entries()))
+        self.assertEqual([exe.get_flow_pair_name(i) for i in xrange(len(exe.flowPairs))],
+                         [cached.get_flow_pair_name(i) for i in xrange(len(cached.flowPairs))])
+        self.assertEqual(list(exe.instructions.get_addresses()),
+                         list(cached.instructions.get_addresses()))
+        bFlow, sFlow = cached.get_flow_pair(0)
+        self.assertEqual(sorted(exe.get_flow_pair(0)[0].digraph.edges),
+                         sorted(bFlow.digraph.edges))
+
+        # Other arguments are other entries
+        self.load(simplify=False)
+        self.assertEqual(2, self.built)
+        self.assertEqual(2, len(self.entries()))
+
+    def test_invalidation(self):
+        self.load()
+        entries = self.entries()
+
+        def check_rebuilt(what):
+            built = self.built
+            self.load()
+            self.assertEqual(built + 1, self.built, what)
+            self.assertEqual(len(entries) + 1, len(self.entries()), what)
+            entries[:] = self.entries()
+
+        mnems = dict(fixture.MNEMS)
+        mnems[38] = ('CLR', ['r24'])
+        fixture.write_inputs(self.dir, mnems)  # the other files are written as before
+        check_rebuilt('bin')
+
+        with open(self.paths['dwarf'], 'w') as fp:
+            json.dump(fixture.debug_obj(), fp)
+        check_rebuilt('dwarf')
+
+        csvObjs = [list(o) for o in fixture.CSV_OBJS]
+        csvObjs[0][1] = csvObjs[0][1].replace('Seed = 0', 'Seed = 1')
+        with open(self.paths['csv'], 'w') as fp:
+            fp.write('\n\n'.join('\n'.join([fixture.CSV_HEADER] + o) for o in csvObjs) +
+                     '\n\n')
+        check_rebuilt('csv')
+
+        with open(self.paths['optime'], 'a') as fp:
+            fp.write('# changed\n')
+        check_rebuilt('optime')
+
+        # A damaged entry is rebuilt in place
+        built = self.built
+        for name in self.entries():
+            with open(os.path.join(self.cacheDir, name), 'wb') as fp:
+                fp.write('damaged')
+        self.load()
+        self.assertEqual(built + 1, self.built)
+        self.assertEqual(entries, self.entries())
+        self.load()
+        self.assertEqual(built + 1, self.built)
+
+    def test_unpicklable(self):
+        dump = fparser.pickle.dump
+
+        def fail(*args):
+            raise fparser.pickle.PicklingError("Not picklable.")
+        fparser.pickle.dump = fail
+        try:
+            exe = self.load()
+        finally:
+            fparser.pickle.dump = dump
+        self.assertEqual(1, self.built)
+        self.assertIsInstance(exe, fparser.Executable)
+        self.assertEqual([], self.entries())  # no partial entry is left behind
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import argparse
+import logging
+import shutil
+import tempfile
+import unittest
+import fparser
+from tests import fixture
+
+
+def load(paths, **kwargs):
+    return fparser.Executable(paths['bin'], paths['dwarf'], paths['csv'], paths['optime'],
+                              simplify=True, incremental=True, **kwargs)
+
+
+def fingerprints(exe, options=None):
+    return {exe.get_flow_pair_name(i): exe.get_flow_pair_fingerprint(i, options)
+            for i in xrange(len(exe.flowPairs))}
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.dir)
+
+    def test_stable(self):
+        paths = fixture.write_inputs(self.dir)
+        fps = fingerprints(load(paths))
+        self.assertEqual(['InitSeed', 'Initialize'], sorted(fps))
+        self.assertEqual(fps, fingerprints(load(paths)))
+        self.assertEqual(fps, fingerprints(load(paths, lazy=True)))
+
+    def test_invalidation(self):
+        paths = fixture.write_inputs(self.dir)
+        fps = fingerprints(load(paths))
+
+        # Instruction of Initialize changed
+        mnems = dict(fixture.MNEMS)
+        mnems[38] = ('LDI', ['r24', '0x01'])
+        paths = fixture.write_inputs(self.dir, mnems)
+        changed = fingerprints(load(paths))
+        self.assertEqual(fps['InitSeed'], changed['InitSeed'])
+        self.assertNotEqual(fps['Initialize'], changed['Initialize'])
+
+        # Options
+        paths = fixture.write_inputs(self.dir)
+        self.assertNotEqual(fps['InitSeed'],
+                            fingerprints(load(paths), ['x'])['InitSeed'])
+
+    def test_on_demand(self):
+        paths = fixture.write_inputs(self.dir)
+        exe = load(paths)
+        self.assertEqual({}, exe._pairDigests)
+        fingerprints(exe)
+        self.assertEqual(len(exe.flowPairs), len(exe._pairDigests))
+
+        # Json objects are dropped once built, unless in incremental mode
+        exe = fparser.Executable(paths['bin'], paths['dwarf'], paths['csv'], paths['optime'])
+        self.assertTrue(all(r.jsonObj is None for r in exe.bFlowRecords))
+        self.assertRaises(AssertionError, exe.get_flow_pair_fingerprint, 0)
+
+
+class IncrementalMappingTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.dir = tempfile.mkdtemp()
+        self.tempdir = tempfile.tempdir
+        tempfile.tempdir = self.dir
+        import main
+        self.main = main
+        self.args = argparse.Namespace(mapper='ctrldep', hom_order='predominated-first',
+                                       trust_dbg_info=False, render_graphs=False,
+                                       incremental=True)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        tempfile.tempdir = self.tempdir
+        shutil.rmtree(self.dir)
+
+    def map_all(self, exe):
+        """Returns {name: reused}."""
+        return {r[0]: r[3] for r in (self.main.map_pair(exe, self.args, None, i)
+                                     for i in xrange(len(exe.flowPairs)))}
+
+    def test_reuse(self):
+        paths = fixture.write_inputs(self.dir)
+        self.assertEqual({'InitSeed': False, 'Initialize': False},
+                         self.map_all(load(paths)))
+        self.assertEqual({'InitSeed': True, 'Initialize': True},
+                         self.map_all(load(paths)))
+
+        mnems = dict(fixture.MNEMS)
+        mnems[38] = ('LDI', ['r24', '0x01'])
+        paths = fixture.write_inputs(self.dir, mnems)
+        self.assertEqual({'InitSeed': True, 'Initialize': False},
+                         self.map_all(load(paths, lazy=True)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import gzip
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from fparser import jsonio
+from tests import fixture
+
+
+class JsonIoTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.dir = tempfile.mkdtemp()
+        self.paths = fixture.write_inputs(self.dir)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.dir)
+
+    def test_iter_json_objs(self):
+        objs = list(jsonio.iter_json_objs(self.paths['bin'], '\n\n', chunkSize=64))
+        self.assertEqual(fixture.binary_objs(), objs)
+
+    def test_flow_index(self):
+        index = jsonio.load_flow_index(self.paths['bin'], '\n\n')
+        self.assertTrue(os.path.isfile(self.paths['bin'] + jsonio.INDEX_SUFFIX))
+        for obj in fixture.binary_objs():
+            if obj['Type'] == 'Flow':
+                span = index['Flows'][obj['Name']]
+            else:
+                span = index[obj['Type']]
+            self.assertEqual(obj, jsonio.read_json_span(self.paths['bin'], span))
+        # Saved index is reused
+        self.assertEqual(index, jsonio.load_flow_index(self.paths['bin'], '\n\n'))
+
+    def test_debug_index(self):
+        index = jsonio.load_debug_index(self.paths['dwarf'])
+        data = fixture.debug_obj()['Data']
+        for key in ('LineInfoEntries', 'LineInfoMap'):
+            self.assertEqual(data[key], jsonio.read_json_span(self.paths['dwarf'], index[key]))
+        dies = []
+        for cu in index['CUs']:
+            dies += jsonio.read_json_array_span(self.paths['dwarf'], cu['span'])
+        self.assertEqual(data['DIEs'], dies)
+        self.assertEqual([['InitSeed', 'Initialize'], ['RandomInteger'], ['LibFunc']],
+                         [cu['subprograms'] for cu in index['CUs']])
+
+    def test_chunks(self):
+        chunkSize = jsonio.CHUNK_SIZE
+        jsonio.CHUNK_SIZE = 4
+        try:
+            index = jsonio.load_flow_index(self.paths['bin'], '\n\n')
+            dIndex = jsonio.load_debug_index(self.paths['dwarf'])
+        finally:
+            jsonio.CHUNK_SIZE = chunkSize
+
+        insns = fixture.binary_objs()[-2]['Instructions']
+        chunks = index['InsnChunks']
+        self.assertEqual((len(insns) + 3) // 4, len(chunks))
+        self.assertEqual(insns, jsonio.read_json_chunks(self.paths['bin'],
+                                                        [c[2:] for c in chunks]))
+        self.assertEqual([[0, 6], [16, 22]], [c[:2] for c in chunks[:2]])
+
+        data = fixture.debug_obj()['Data']
+        for key, chunkKey in (('LineInfoEntries', 'LineInfoEntryChunks'),
+                              ('LineInfoMap', 'LineInfoMapChunks')):
+            chunks = dIndex[chunkKey]
+            self.assertEqual(data[key], jsonio.read_json_chunks(
+                self.paths['dwarf'], [c[2:] for c in chunks], '{}'))
+            for lo, hi, begin, end in chunks:
+                keys = jsonio.read_json_chunks(self.paths['dwarf'], [[begin, end]], '{}')
+                self.assertEqual((lo, hi), (min(map(int, keys)), max(map(int, keys))))
+
+    def test_select_chunks(self):
+        chunks = [[0, 6, 0, 10], [16, 22, 11, 20], [24, 30, 21, 30], [32, 38, 31, 40]]
+        self.assertEqual([[0, 10]], jsonio.select_chunks(chunks, [(0, 6)]))
+        self.assertEqual([[0, 10], [11, 20]], jsonio.select_chunks(chunks, [(0, 6)], 1))
+        self.assertEqual([[11, 20], [21, 30], [31, 40]],
+                         jsonio.select_chunks(chunks, [(38, 38), (20, 26)]))
+        self.assertEqual([], jsonio.select_chunks(chunks, [(7, 15), (40, 50)]))
+        # Ranges covering others
+        self.assertEqual([[0, 10], [11, 20], [21, 30]],
+                         jsonio.select_chunks(chunks, [(0, 30), (2, 3)]))
+
+    def test_csv_index(self):
+        def get_key(hLine, lastLine):
+            self.assertEqual(fixture.CSV_HEADER, hLine)
+            fields = lastLine.split(';')
+            return fields[3], fields[4]
+
+        index = jsonio.load_csv_index(self.paths['csv'], '\n\n', get_key)
+        self.assertEqual(fixture.CSV_HEADER, index['Header'])
+        self.assertEqual([['cnt.c', 'InitSeed'], ['cnt.c', 'Initialize'], ['cnt.c', 'main']],
+                         [o[:2] for o in index['Objects']])
+        texts = jsonio.read_spans(self.paths['csv'], [o[2:] for o in index['Objects']])
+        self.assertEqual(['\n'.join([fixture.CSV_HEADER] + o) for o in fixture.CSV_OBJS], texts)
+
+    def test_compressed_input(self):
+        gzPath = self.paths['bin'] + '.gz'
+        with open(self.paths['bin'], 'rb') as src:
+            with gzip.open(gzPath, 'wb') as dst:
+                dst.write(src.read())
+        self.assertEqual(fixture.binary_objs(), list(jsonio.iter_json_objs(gzPath, '\n\n')))
+        index = jsonio.load_flow_index(gzPath, '\n\n')
+        self.assertEqual(fixture.binary_objs()[1],
+                         jsonio.read_json_span(gzPath, index['Flows']['Initialize']))
+
+    def test_span_reader(self):
+        gzPath = self.paths['bin'] + '.gz'
+        with open(self.paths['bin'], 'rb') as src:
+            with gzip.open(gzPath, 'wb') as dst:
+                dst.write(src.read())
+        index = jsonio.load_flow_index(gzPath, '\n\n')
+        objs = fixture.binary_objs()
+        spans = [index['Flows']['RandomInteger'], index['SymbolMap'], index['Flows']['InitSeed']]
+
+        opened = []
+        openInput = jsonio.open_input
+
+        def open_input(path):
+            opened.append(path)
+            return openInput(path)
+
+        jsonio.open_input = open_input
+        try:
+            reader = jsonio.SpanReader(gzPath)
+            self.assertTrue(reader.is_compressed())
+            self.assertEqual([2, 0, 1], [k for k, _ in reader.iter_spans(spans)])  # file order
+            self.assertEqual([objs[2], objs[-1], objs[0]],
+                             [json.loads(t) for t in reader.read(spans)])
+            self.assertEqual(objs[1], reader.read_json(index['Flows']['Initialize']))
+            self.assertEqual([gzPath], opened)
+
+            # Pickled without its handle
+            reader = pickle.loads(pickle.dumps(reader))
+            self.assertIsNone(reader._fp)
+            self.assertEqual(objs[-1], reader.read_json(index['SymbolMap']))
+            reader.close()
+        finally:
+            jsonio.open_input = openInput
+        self.assertEqual([gzPath] * 2, opened)
+
+    def test_outdated_index(self):
+        jsonio.load_flow_index(self.paths['bin'], '\n\n')
+        objs = fixture.binary_objs()
+        with open(self.paths['bin'], 'w') as fp:
+            for obj in reversed(objs):
+                fp.write(json.dumps(obj) + '\n\n')
+        os.utime(self.paths['bin'], (0, 0))
+        index = jsonio.load_flow_index(self.paths['bin'], '\n\n')
+        self.assertEqual(objs[0], jsonio.read_json_span(self.paths['bin'],
+                                                        index['Flows']['InitSeed']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import argparse
+import logging
+import logging.handlers
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+from tests import fixture
+
+
+class MainTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.dir = tempfile.mkdtemp()
+        self.tempdir = tempfile.tempdir
+        tempfile.tempdir = self.dir
+        import main
+        self.main = main
+        self.mapPair = main.map_pair
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        tempfile.tempdir = self.tempdir
+        self.main.map_pair = self.mapPair
+        shutil.rmtree(self.dir)
+
+    def test_shared_tables_removed_on_error(self):
+        paths = fixture.write_inputs(self.dir)
+        args = argparse.Namespace(cache_dir=None, bin_json=paths['bin'],
+                                  dwarf_json=paths['dwarf'], src_csv=paths['csv'],
+                                  optime_csv=paths['optime'], no_simplify=False, lazy=False,
+                                  functions=None, elf=None, columnar=None,
+                                  line_cache_size=16, otawa_cfg=None, incremental=False,
+                                  annot_file=None, jobs=2)
+
+        def fail(*args):
+            raise ValueError("Mapping failed.")
+
+        self.main.map_pair = fail  # inherited by the forked workers
+        self.assertRaises(ValueError, self.main.main, args)
+        self.assertEqual([], [f for f in os.listdir(self.dir) if f.endswith('.col')])
+
+    def run_main(self, name, jobs):
+        """Runs main with outputs to a directory of its own, returns (result, log, outputs)."""
+        tempfile.tempdir = os.path.join(self.dir, name)
+        os.mkdir(tempfile.tempdir)
+        paths = fixture.write_inputs(tempfile.tempdir)
+        args = argparse.Namespace(cache_dir=None, bin_json=paths['bin'],
+                                  dwarf_json=paths['dwarf'], src_csv=paths['csv'],
+                                  optime_csv=paths['optime'], no_simplify=False, lazy=False,
+                                  functions=None, elf=None, columnar=None,
+                                  line_cache_size=16, otawa_cfg=None, incremental=False,
+                                  annot_file=None, jobs=jobs, mapper='ctrldep',
+                                  hom_order='predominated-first', trust_dbg_info=False,
+                                  render_graphs=False)
+
+        # Records of the parent process only, functions are mapped by workers if jobs > 1
+        records = logging.handlers.BufferingHandler(1000)
+        root = logging.getLogger()
+        handlers = root.handlers
+        root.handlers = [records]
+        logging.disable(logging.NOTSET)
+        try:
+            result = self.main.main(args)
+        finally:
+            logging.disable(logging.CRITICAL)
+            root.handlers = handlers
+        log = [r.getMessage() for r in records.buffer if r.name == self.main.log.name and
+               r.getMessage().startswith(('Statistics', 'Unmapped'))]
+
+        outputs = {}
+        for f in sorted(os.listdir(tempfile.tempdir)):
+            if f.endswith('.csv') and f.startswith('mapping_') or f.endswith('.json') and \
+                    f not in ('main.json', 'debug.json'):
+                with open(os.path.join(tempfile.tempdir, f)) as fp:
+                    outputs[f] = re.sub(r' at 0x[0-9a-f]+', '', fp.read())  # object reprs
+        return result, log, outputs
+
+    def test_task_log_handler(self):
+        target = logging.handlers.BufferingHandler(100)
+        target.setLevel(logging.INFO)
+        buf = self.main._TaskLogHandler([target], threading.Lock(), capacity=2)
+        log = logging.getLogger('test_task_log_handler')
+        log.propagate = False
+        log.addHandler(buf)
+        logging.disable(logging.NOTSET)
+        try:
+            log.setLevel(logging.DEBUG)
+            log.debug("not buffered")
+            log.info("1")
+            self.assertEqual([], target.buffer)
+            log.warning("2")  # full, emitted early
+            log.info("3")
+            self.assertEqual(["1", "2"], [r.getMessage() for r in target.buffer])
+            buf.close()
+            self.assertEqual(["1", "2", "3"], [r.getMessage() for r in target.buffer])
+        finally:
+            log.removeHandler(buf)
+            logging.disable(logging.CRITICAL)
+
+    def test_jobs(self):
+        serial = self.run_main('serial', 1)
+        parallel = self.run_main('parallel', 2)
+        self.assertEqual(0, serial[0])
+        self.assertIn('Statistics: 4 subgraphs with 14 nodes, 57.14% precise', serial[1])
+        self.assertIn('mapping_Initialize.csv', serial[2])
+        self.assertEqual(serial, parallel)
+        self.assertEqual([], [f for f in os.listdir(self.dir) if f.endswith('.col')])
+
+
+if __name__ == '__main__':
+    unittest.main()
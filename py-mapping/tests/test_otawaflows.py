@@ -0,0 +1,91 @@
+import logging
+import unittest
+from fparser import otawaflows
+
+# main (2 blocks, calls Step) in src/cnt.c, Step in src/lib.c. The instruction
+# at 0x8010 has no line info.
+CFG_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<cfg-collection>
+  <cfg id="_0" address="_0" label="main" number="0">
+    <entry id="_0-0"/>
+    <bb id="_0-1" address="00008000" size="12" number="1">
+      <inst address="00008000" file="src/cnt.c" line="30"><asm>push {fp, lr}</asm></inst>
+      <inst address="00008004" file="src/cnt.c" line="30"><asm>add fp, sp, #4</asm></inst>
+      <inst address="00008008" file="src/cnt.c" line="31"><asm>bl 8100</asm></inst>
+    </bb>
+    <bb id="_0-2" address="0000800c" size="12" number="2">
+      <inst address="0000800c" file="src/cnt.c" line="31"><asm>mov r3, r0</asm></inst>
+      <inst address="00008010"><asm>nop</asm></inst>
+      <inst address="00008014" file="src/cnt.c" line="33"><asm>pop {fp, pc}</asm></inst>
+    </bb>
+    <exit id="_0-3"/>
+    <edge kind="virtual" source="_0-0" target="_0-1"/>
+    <edge kind="call" source="_0-1" called="_1"/>
+    <edge kind="not-taken" source="_0-1" target="_0-2"/>
+    <edge kind="virtual" source="_0-2" target="_0-3"/>
+  </cfg>
+  <cfg id="_1" address="_1" label="Step" number="1">
+    <entry id="_1-0"/>
+    <bb id="_1-1" address="00008100" size="12" number="1">
+      <inst address="00008100" file="src/lib.c" line="5"><asm>mov r3, #133</asm></inst>
+      <inst address="00008104" file="src/lib.c" line="6"><asm>mul r0, r0, r3</asm></inst>
+      <inst address="00008108" file="src/lib.c" line="6"><asm>bx lr</asm></inst>
+    </bb>
+    <exit id="_1-2"/>
+    <edge kind="virtual" source="_1-0" target="_1-1"/>
+    <edge kind="virtual" source="_1-1" target="_1-2"/>
+  </cfg>
+</cfg-collection>
+"""
+
+
+class CFGReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.reader = otawaflows.CFGReader(fromString=CFG_XML)
+        self.debugData = self.reader.get_debug_data()
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def block_lines(self, flow):
+        """Returns {block number: sorted (CU, LowPc, HighPc, line)} of the blocks of flow."""
+        lines = {}
+        for bb, attrs in flow.digraph.nodes(data=True):
+            if 'addrs' not in attrs:
+                continue  # entry or exit
+            dwLines = self.debugData.get_dw_lines([(attrs['addr0'], attrs['addr1'])])
+            lines[bb] = sorted((e['CU'], e['LowPc'], e['HighPc'], e['LineNumber'])
+                               for e in dwLines.itervalues())
+        return lines
+
+    def test_block_lines(self):
+        flows = {f.name: f for f in self.reader.getFlows()}
+        # Consecutive instructions on a line share an entry, also across blocks
+        self.assertEqual({1: [(0, 0x8000, 0x8004, 30), (0, 0x8008, 0x800c, 31)],
+                          2: [(0, 0x8008, 0x800c, 31), (0, 0x8014, 0x8014, 33)]},
+                         self.block_lines(flows['main']))
+        self.assertEqual({1: [(1, 0x8100, 0x8100, 5), (1, 0x8104, 0x8108, 6)]},
+                         self.block_lines(flows['Step']))
+
+    def test_line_table(self):
+        lineTable = self.debugData.get_line_table()
+        self.assertEqual([0x8000, 0x8000, 0x8008, 0x8008, 0x8014],
+                         lineTable.get_refs(0x8000, 0x80ff))
+        self.assertRaises(KeyError, lineTable.get_ref, 0x8010)
+        self.assertEqual((6, 0, 0), lineTable.get_lcd(0x8108))
+
+    def test_subprograms(self):
+        subs = self.debugData.get_subprograms()
+        self.assertEqual({0x8000: {'name': 'main', 'dieOffset': 0x8000},
+                          0x8100: {'name': 'Step', 'dieOffset': 0x8100}}, subs)
+        self.assertEqual(('src', 'lib.c'), self.debugData.get_subprogram_file(0x8100))
+        self.assertEqual([], self.debugData.get_inlined_subroutines(0x8000))
+        self.assertIsNone(self.debugData.find_inlined_subroutine(0x8000, 0x8004))
+        self.assertEqual({}, self.debugData.get_local_variables(0x8000))
+        self.assertRaises(AssertionError, self.debugData.get_subprogram_file, 0x8004)
+
+
+if __name__ == '__main__':
+    unittest.main()